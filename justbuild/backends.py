@@ -0,0 +1,111 @@
+"""OpenAI-compatible LLM backends: the hosted API or a local server
+
+A backend bundles where the chat completions endpoint lives, which model to ask,
+how long to wait and how hard it can be pushed. Local servers (llama.cpp, vLLM,
+Ollama) speak the same API as OpenAI, so they only differ in these settings.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple, Union
+
+if TYPE_CHECKING:  # openai is slow to import, only load it when building a client
+    from openai import AsyncOpenAI, OpenAI
+
+# Local servers do not meter requests or tokens, only their own parallelism
+UNMETERED = 1_000_000
+
+
+@dataclass(frozen=True)
+class LLMBackend:
+    name: str
+    base_url: Optional[str] = None  # None for the OpenAI API
+    model_name: str = "gpt-3.5-turbo"
+    # Environment variable holding the API key, None for servers without auth
+    api_key_env: Optional[str] = "OPENAI_API_KEY"
+    timeout: float = 60.0  # Seconds for a whole request
+    connect_timeout: float = 5.0
+    max_concurrent_requests: int = 16
+    requests_per_minute: int = 3_500
+    tokens_per_minute: int = 60_000
+    # USD per million tokens, what `--max-cost` is checked against
+    prompt_token_cost: float = 0.5
+    completion_token_cost: float = 1.5
+
+
+BACKENDS: Dict[str, LLMBackend] = {
+    "openai": LLMBackend("openai"),
+    # `ollama serve`, one model loaded at a time, OLLAMA_NUM_PARALLEL defaults to 4
+    "ollama": LLMBackend(
+        "ollama",
+        base_url="http://localhost:11434/v1",
+        model_name="llama3.1",
+        api_key_env=None,
+        timeout=120.0,
+        max_concurrent_requests=4,
+        requests_per_minute=UNMETERED,
+        tokens_per_minute=UNMETERED,
+        prompt_token_cost=0.0,
+        completion_token_cost=0.0,
+    ),
+    # `llama-server -m model.gguf`, a single slot unless started with `-np`
+    "llamacpp": LLMBackend(
+        "llamacpp",
+        base_url="http://localhost:8080/v1",
+        model_name="default",
+        api_key_env=None,
+        timeout=120.0,
+        max_concurrent_requests=1,
+        requests_per_minute=UNMETERED,
+        tokens_per_minute=UNMETERED,
+        prompt_token_cost=0.0,
+        completion_token_cost=0.0,
+    ),
+    # `vllm serve <model>`, batches many concurrent requests
+    "vllm": LLMBackend(
+        "vllm",
+        base_url="http://localhost:8000/v1",
+        model_name="meta-llama/Llama-3.1-8B-Instruct",
+        api_key_env=None,
+        timeout=60.0,
+        max_concurrent_requests=64,
+        requests_per_minute=UNMETERED,
+        tokens_per_minute=UNMETERED,
+        prompt_token_cost=0.0,
+        completion_token_cost=0.0,
+    ),
+}
+
+
+def register_backend(backend: LLMBackend) -> LLMBackend:
+    """Add (or replace) a backend that `Config.create(backend=...)` can name"""
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(backend: Union[str, LLMBackend]) -> LLMBackend:
+    if isinstance(backend, LLMBackend):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown LLM backend: {backend!r}, expected one of {sorted(BACKENDS)}"
+        )
+    return BACKENDS[backend]
+
+
+def create_clients(
+    base_url: Optional[str],
+    api_key: str,
+    timeout: float,
+    connect_timeout: float,
+) -> Tuple["OpenAI", "AsyncOpenAI"]:
+    """Sync and async clients for an OpenAI-compatible endpoint"""
+    from openai import AsyncOpenAI, OpenAI, Timeout
+
+    timeouts = Timeout(timeout, connect=connect_timeout)
+    return (
+        OpenAI(api_key=api_key, base_url=base_url, timeout=timeouts),
+        # Retries are handled by LLMModel with a shared backoff
+        AsyncOpenAI(
+            api_key=api_key, base_url=base_url, timeout=timeouts, max_retries=0
+        ),
+    )
@@ -0,0 +1,226 @@
+"""Benchmarks for the codediff pipeline: `python -m justbuild.bench --help`"""
+
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from justbuild import __version__
+from justbuild.bench.corpus import synthetic_files, synthetic_pair
+from justbuild.bench.fake_openai import FakeOpenAIServer
+from justbuild.codediff.diff_engine import diff_code
+from justbuild.codediff.features import build_feature_table, build_features, line_flags
+from justbuild.codediff.git_diff_calculations import parse_git_diff
+from justbuild.codediff.git_wrappers import run_git_diff, stream_git_diff
+from justbuild.codediff.merging import _merge_code, build_inputs
+from justbuild.codediff.models import GreedyModel
+from justbuild.config import Config
+
+STAGES = [
+    "run_git_diff",
+    "parse_git_diff",
+    "stream_git_diff",
+    "diff_code",
+    "build_features",
+    "build_feature_table",
+    "build_inputs",
+    "GreedyModel.predict",
+    "GreedyModel.predict_batch",
+    "_merge_code",
+    "LLMModel.predict",
+]
+
+
+def _timed(timings: Dict[str, float], stage: str, fn: Callable, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+
+def _llm_config(server: FakeOpenAIServer) -> Config:
+    from openai import OpenAI
+
+    return Config(
+        client=OpenAI(api_key="fake", base_url=server.base_url),
+        cache_enabled=False,
+    )
+
+
+def time_pipeline(
+    pairs: List[Tuple[str, str]], llm_config: Optional[Config] = None
+) -> Dict[str, float]:
+    """Seconds spent in each stage of the merge pipeline, summed over the files"""
+    from justbuild.codediff.models_llm import LLMModel
+
+    timings: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for k, (old_code, new_code) in enumerate(pairs):
+            old_file, new_file = Path(tmp) / f"old_{k}.py", Path(tmp) / f"new_{k}.py"
+            old_file.write_text(old_code)
+            new_file.write_text(new_code)
+
+            raw_diff = _timed(timings, "run_git_diff", run_git_diff, old_file, new_file)
+            diffs = _timed(timings, "parse_git_diff", parse_git_diff, raw_diff)
+            _timed(
+                timings,
+                "stream_git_diff",
+                lambda: parse_git_diff(stream_git_diff(old_file, new_file)),
+            )
+            _timed(timings, "diff_code", diff_code, old_code, new_code)
+            _timed(timings, "build_features", build_features, diffs)
+            table = _timed(timings, "build_feature_table", build_feature_table, diffs)
+            inputs = _timed(timings, "build_inputs", build_inputs, diffs)
+            predictions = _timed(
+                timings, "GreedyModel.predict", GreedyModel().predict, inputs
+            )
+            _timed(
+                timings,
+                "GreedyModel.predict_batch",
+                GreedyModel().predict_batch,
+                table,
+            )
+            outputs = {p["_id"]: {"final": p} for p in predictions}
+            _timed(timings, "_merge_code", _merge_code, new_code, inputs, outputs)
+
+            if llm_config is not None:
+                candidates = [
+                    i
+                    for i, p in zip(inputs, predictions)
+                    if p["confidence"] < 0.9 or p["is_code_omission"]
+                ]
+                model = LLMModel(config=llm_config)
+                _timed(timings, "LLMModel.predict", model.predict, candidates, diffs)
+    return timings
+
+
+def line_flags_throughput(n_lines: int = 100_000, repeat: int = 3) -> float:
+    """Lines per second through the per-line comment/placeholder/keyword flags"""
+    lines = synthetic_pair(n_lines)[1].splitlines()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            line_flags([line])
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def _peak(fn: Callable, *args) -> Tuple[object, int]:
+    tracemalloc.start()
+    try:
+        return fn(*args), tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_memory(n_lines: int = 100_000) -> Dict[str, int]:
+    """Peak traced bytes while diffing a `n_lines` file and building its inputs"""
+    old_code, new_code = synthetic_pair(n_lines)
+    peaks = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        old_file, new_file = Path(tmp) / "old.py", Path(tmp) / "new.py"
+        old_file.write_text(old_code)
+        new_file.write_text(new_code)
+        _, peaks["parse_git_diff"] = _peak(
+            lambda: parse_git_diff(run_git_diff(old_file, new_file))
+        )
+        diffs, peaks["stream_git_diff"] = _peak(
+            lambda: parse_git_diff(stream_git_diff(old_file, new_file))
+        )
+    _, peaks["build_inputs"] = _peak(
+        lambda: (build_feature_table(diffs), build_inputs(diffs))
+    )
+    return peaks
+
+
+def run_case(
+    name: str,
+    pairs: List[Tuple[str, str]],
+    repeat: int = 3,
+    llm_config: Optional[Config] = None,
+) -> dict:
+    """Best-of-`repeat` stage timings for one corpus"""
+    runs = [time_pipeline(pairs, llm_config=llm_config) for _ in range(repeat)]
+    stages = {
+        stage: min(run[stage] for run in runs) for stage in STAGES if stage in runs[0]
+    }
+    return {
+        "case": name,
+        "files": len(pairs),
+        "lines": sum(old.count("\n") for old, _ in pairs),
+        "stages": stages,
+        "total": sum(stages.values()),
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def run_benchmarks(
+    sizes: List[int],
+    file_counts: List[int],
+    lines_per_file: int = 200,
+    repeat: int = 3,
+    llm: bool = False,
+    llm_latency: float = 0.0,
+) -> dict:
+    """Time every stage on large single files (`sizes`) and many-file corpora"""
+    cases = [(f"lines={n}", [synthetic_pair(n)]) for n in sizes]
+    cases += [(f"files={n}", synthetic_files(n, lines_per_file)) for n in file_counts]
+
+    results = []
+    if llm:
+        with FakeOpenAIServer(latency=llm_latency) as server:
+            config = _llm_config(server)
+            for name, pairs in cases:
+                results.append(run_case(name, pairs, repeat, llm_config=config))
+    else:
+        for name, pairs in cases:
+            results.append(run_case(name, pairs, repeat))
+
+    return {
+        "version": __version__,
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "line_flags_per_sec": line_flags_throughput(repeat=repeat),
+        "peak_memory_bytes": peak_memory(),
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict) -> List[dict]:
+    """Per case and stage, the ratio current/baseline (below 1.0 is faster)"""
+    baseline_cases = {r["case"]: r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = baseline_cases.get(result["case"])
+        if before is None:
+            continue
+        before_stages = {**before["stages"], "total": before["total"]}
+        for stage, seconds in {**result["stages"], "total": result["total"]}.items():
+            if before_stages.get(stage):
+                rows.append(
+                    {
+                        "case": result["case"],
+                        "stage": stage,
+                        "baseline": before_stages[stage],
+                        "current": seconds,
+                        "ratio": seconds / before_stages[stage],
+                    }
+                )
+    return rows
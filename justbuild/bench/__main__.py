@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+from typing import List
+
+import typer
+
+from justbuild.bench import compare, run_benchmarks
+
+app = typer.Typer(name="bench", help="Benchmark the codediff pipeline stage by stage")
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+@app.command()
+def main(
+    sizes: str = typer.Option(
+        "1000,10000,100000,200000", help="Comma-separated line counts of single files"
+    ),
+    files: str = typer.Option(
+        "1,10,100,1000", help="Comma-separated file counts of many-file corpora"
+    ),
+    lines_per_file: int = typer.Option(200, help="Lines per file in many-file corpora"),
+    repeat: int = typer.Option(3, help="Best-of-N timing repeats"),
+    llm: bool = typer.Option(
+        False, help="Also time the LLM path on a local fake server"
+    ),
+    llm_latency: float = typer.Option(0.0, help="Fake server latency per request (s)"),
+    output: Path = typer.Option(None, help="Write the JSON results to this file"),
+    baseline: Path = typer.Option(None, help="JSON results to compare against"),
+):
+    """
+    Time run_git_diff, parse_git_diff, build_features, build_inputs, the models and
+    _merge_code on synthetic corpora and emit JSON results.
+    """
+    results = run_benchmarks(
+        _ints(sizes),
+        _ints(files),
+        lines_per_file=lines_per_file,
+        repeat=repeat,
+        llm=llm,
+        llm_latency=llm_latency,
+    )
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+    if baseline:
+        results["comparison"] = compare(json.loads(baseline.read_text()), results)
+    typer.echo(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,54 @@
+import random
+from typing import List, Tuple
+
+PLACEHOLDERS = [
+    "    # ... (rest of the previous code remains the same)",
+    "    # Code Was Here",
+    "    # ... (This method remains unchanged)",
+]
+
+
+def _function(name: str, body_lines: int, rng: random.Random) -> List[str]:
+    lines = [f"def {name}(data):"]
+    for k in range(body_lines - 2):
+        lines.append(f"    value_{k} = data.get('{name}_{k}', {rng.randint(0, 999)})")
+    lines.append("    return data")
+    return lines
+
+
+def synthetic_pair(
+    n_lines: int,
+    placeholder_rate: float = 0.1,
+    edit_rate: float = 0.1,
+    body_lines: int = 10,
+    seed: int = 0,
+) -> Tuple[str, str]:
+    """Old/new versions of a python file of roughly `n_lines` lines
+
+    In the new version about `placeholder_rate` of the function bodies are replaced
+    by a placeholder comment (the omissions to revert) and `edit_rate` of them get
+    a genuine one-line edit (changes to keep).
+    """
+    rng = random.Random(seed)
+    old_lines, new_lines = [], []
+    n_functions = max(1, n_lines // (body_lines + 1))
+    for f in range(n_functions):
+        function = _function(f"function_{f}", body_lines, rng)
+        roll = rng.random()
+        if roll < placeholder_rate:
+            changed = function[:1] + [rng.choice(PLACEHOLDERS)] + function[-1:]
+        elif roll < placeholder_rate + edit_rate:
+            changed = list(function)
+            changed[1] = changed[1].replace("data.get", "data.pop")
+        else:
+            changed = function
+        old_lines.extend(function + [""])
+        new_lines.extend(changed + [""])
+    return "\n".join(old_lines) + "\n", "\n".join(new_lines) + "\n"
+
+
+def synthetic_files(
+    n_files: int, n_lines: int, seed: int = 0, **kwargs
+) -> List[Tuple[str, str]]:
+    """`n_files` independent old/new pairs of `n_lines` lines each"""
+    return [synthetic_pair(n_lines, seed=seed + i, **kwargs) for i in range(n_files)]
@@ -0,0 +1,142 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+def _answer(messages: list) -> str:
+    """'yes' for diffs containing an ellipsis, JSON answers for batched prompts"""
+    user_message = messages[-1]["content"]
+    if "JSON object" not in messages[0]["content"]:
+        return "yes" if "..." in user_message else "no"
+    diffs = re.split(r"^Diff (\d+):$", user_message, flags=re.MULTILINE)[1:]
+    return json.dumps(
+        {
+            n: "yes" if "..." in diff else "no"
+            for n, diff in zip(diffs[::2], diffs[1::2])
+        }
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.model = request.get("model")
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(
+                self.server.max_in_flight, self.server.in_flight
+            )
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            self._reply(request)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def _reply(self, request: dict):
+        content = _answer(request.get("messages", []))
+        logprobs = None
+        if request.get("logprobs"):
+            other = "no" if content == "yes" else "yes"
+            top = [
+                {"token": content, "logprob": -0.05, "bytes": None},
+                {"token": other, "logprob": -3.0, "bytes": None},
+            ]
+            logprobs = {
+                "content": [
+                    {
+                        "token": content,
+                        "logprob": -0.05,
+                        "bytes": None,
+                        "top_logprobs": top,
+                    }
+                ]
+            }
+        prompt_tokens = sum(len(m["content"]) for m in request["messages"]) // 4
+        body = json.dumps(
+            {
+                "id": f"chatcmpl-fake-{self.server.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                        "logprobs": logprobs,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": 1,
+                    "total_tokens": prompt_tokens + 1,
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    requests = 0
+    latency = 0.0
+    model: Optional[str] = None  # Of the last request
+    in_flight = 0
+    max_in_flight = 0
+
+
+class FakeOpenAIServer:
+    """Local OpenAI-compatible chat completions endpoint for benchmarks and tests
+
+    >>> with FakeOpenAIServer() as server:
+    ...     client = OpenAI(api_key="fake", base_url=server.base_url)
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._server: Optional[_Server] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    @property
+    def model(self) -> Optional[str]:
+        """The model the last request asked for"""
+        return self._server.model
+
+    @property
+    def max_in_flight(self) -> int:
+        """The most requests the server was answering at the same time"""
+        return self._server.max_in_flight
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.latency = self.latency
+        self._server.lock = threading.Lock()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,14 +1,7 @@
 import typer
-import typer
-from justbuild import (
-    __version__ as version,
-    __description__ as short_description,
-    lfg_cli,
-)
-from justbuild.config import load_config
-from justbuild.ui import show_full_banner
 
-config = load_config()
+from justbuild import lfg_cli
+
 app = typer.Typer(name="justbuild", help="💬 Chat Assisted Programming 💻")
 
 app.add_typer(
@@ -19,4 +12,6 @@ app.add_typer(
 @app.callback(invoke_without_command=True)
 def banner(ctx: typer.Context):
     if ctx.invoked_subcommand is None:
+        from justbuild.ui import show_full_banner
+
         show_full_banner("justbuild")
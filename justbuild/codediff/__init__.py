@@ -1,3 +1,11 @@
-from .merging import merge, merge_all, merge_code
+__all__ = ["merge_all", "merge_code", "merge", "merge_pasted"]
 
-__all__ = ["merge_all", "merge_code", "merge"]
+
+def __getattr__(name):
+    # Loaded on first use: merging pulls in openai, rich and tqdm, which would
+    # otherwise be imported by anything touching `justbuild.codediff.*`
+    if name in __all__:
+        from justbuild.codediff import merging
+
+        return getattr(merging, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,228 @@
+import bisect
+import difflib
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from justbuild.codediff.git_diff_calculations import CodeDiff, CodeDiffs, iter_git_diff
+from justbuild.codediff.git_wrappers import stream_git_diff
+
+DIFF_BACKENDS = ("git", "python")
+DEFAULT_CONTEXT_LINES = 3  # Same as `git diff`
+# Changed ranges up to this many (old lines x new lines) go straight to difflib,
+# which matches git more often (e.g. on moved blocks) but is quadratic beyond
+PATIENCE_MIN_CELLS = 1_000_000
+
+
+def _split_lines(code: str) -> List[str]:
+    """Split code the way `git diff` sees it: on '\\n', ignoring the final newline"""
+    if not code:
+        return []
+    lines = code.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def _hunk_start(start: int, count: int) -> int:
+    # Unified diff convention: empty ranges point at the line *before* the hunk
+    return start + 1 if count else start
+
+
+def _unique_anchors(
+    a: List[str], b: List[str], alo: int, ahi: int, blo: int, bhi: int
+) -> List[Tuple[int, int]]:
+    """Longest increasing run of lines that occur exactly once in both ranges"""
+    counts_a = Counter(a[alo:ahi])
+    counts_b = Counter(b[blo:bhi])
+    index_b = {b[j]: j for j in range(blo, bhi) if counts_b[b[j]] == 1}
+    pairs = [
+        (i, index_b[a[i]])
+        for i in range(alo, ahi)
+        if counts_a[a[i]] == 1 and a[i] in index_b
+    ]
+
+    # Patience sorting: longest increasing subsequence of the b positions
+    tails: List[int] = []  # b position ending the best run of each length
+    tail_pairs: List[int] = []  # index into pairs of that run end
+    previous = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        length = bisect.bisect_left(tails, j)
+        if length == len(tails):
+            tails.append(j)
+            tail_pairs.append(k)
+        else:
+            tails[length] = j
+            tail_pairs[length] = k
+        previous[k] = tail_pairs[length - 1] if length else -1
+
+    anchors = []
+    k = tail_pairs[-1] if tail_pairs else -1
+    while k >= 0:
+        anchors.append(pairs[k])
+        k = previous[k]
+    return anchors[::-1]
+
+
+class _PatienceMatcher(difflib.SequenceMatcher):
+    """SequenceMatcher whose matching blocks come from a patience diff
+
+    Lines that are unique on both sides anchor the diff, and only the (small) gaps
+    between anchors go through difflib, which is quadratic on large inputs. Ranges
+    under `PATIENCE_MIN_CELLS` are matched by difflib alone, as before.
+    """
+
+    def get_matching_blocks(self):
+        if self.matching_blocks is not None:
+            return self.matching_blocks
+        a, b = self.a, self.b
+        blocks = []
+        ranges = [(0, len(a), 0, len(b))]
+        while ranges:
+            alo, ahi, blo, bhi = ranges.pop()
+            # Common prefix and suffix
+            start = 0
+            while alo + start < ahi and blo + start < bhi:
+                if a[alo + start] != b[blo + start]:
+                    break
+                start += 1
+            if start:
+                blocks.append((alo, blo, start))
+                alo, blo = alo + start, blo + start
+            end = 0
+            while alo < ahi - end and blo < bhi - end:
+                if a[ahi - end - 1] != b[bhi - end - 1]:
+                    break
+                end += 1
+            if end:
+                blocks.append((ahi - end, bhi - end, end))
+                ahi, bhi = ahi - end, bhi - end
+            if alo == ahi or blo == bhi:
+                continue
+
+            anchors = []
+            if (ahi - alo) * (bhi - blo) >= PATIENCE_MIN_CELLS:
+                anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+            if not anchors:
+                matcher = difflib.SequenceMatcher(
+                    None, a[alo:ahi], b[blo:bhi], autojunk=False
+                )
+                blocks.extend(
+                    (alo + i, blo + j, n)
+                    for i, j, n in matcher.get_matching_blocks()
+                    if n
+                )
+                continue
+            for i, j in anchors:
+                ranges.append((alo, i, blo, j))
+                blocks.append((i, j, 1))
+                alo, blo = i + 1, j + 1
+            ranges.append((alo, ahi, blo, bhi))
+
+        # Merge adjacent blocks, as difflib does
+        merged = []
+        for i, j, n in sorted(blocks):
+            if (
+                merged
+                and merged[-1][0] + merged[-1][2] == i
+                and merged[-1][1] + merged[-1][2] == j
+            ):
+                merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+            else:
+                merged.append((i, j, n))
+        merged.append((len(a), len(b), 0))
+        self.matching_blocks = [difflib.Match(*block) for block in merged]
+        return self.matching_blocks
+
+
+def diff_code(
+    old_code: str,
+    new_code: str,
+    old_file: str = "a/old",
+    new_file: str = "b/new",
+    context: int = DEFAULT_CONTEXT_LINES,
+) -> CodeDiffs:
+    """Pure-python equivalent of `parse_git_diff(git diff --no-index old new)`
+
+    Builds the CodeDiffs directly from two in-memory strings, without forking git
+    or writing temporary files.
+    """
+    old_lines = _split_lines(old_code)
+    new_lines = _split_lines(new_code)
+    matcher = _PatienceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    code_diffs = CodeDiffs(old_file=old_file, new_file=new_file, changes=[])
+    buffer: List[str] = []
+    for group in matcher.get_grouped_opcodes(context):
+        old_start, old_end = group[0][1], group[-1][2]
+        new_start, new_end = group[0][3], group[-1][4]
+        old_count = old_end - old_start
+        new_count = new_end - new_start
+        diff = CodeDiff(
+            lineno=_hunk_start(new_start, new_count),
+            old_start=_hunk_start(old_start, old_count),
+            old_count=old_count,
+            new_start=_hunk_start(new_start, new_count),
+            new_count=new_count,
+            lines=buffer,
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in old_lines[i1:i2]:
+                    diff.append(" " + line)
+                continue
+            # 'replace' is rendered as all deletions followed by all additions
+            if tag in ("delete", "replace"):
+                for line in old_lines[i1:i2]:
+                    diff.append("-" + line)
+            if tag in ("insert", "replace"):
+                for line in new_lines[j1:j2]:
+                    diff.append("+" + line)
+        code_diffs.changes.append(diff)
+    return code_diffs
+
+
+def iter_code_diffs(
+    old_file: Optional[Union[str, Path]],
+    new_file: Union[str, Path],
+    code_diffs: CodeDiffs,
+    backend: str = "git",
+) -> Iterator[CodeDiff]:
+    """Diff two files on disk with the selected backend, yielding hunk by hunk
+
+    The file names and hunks are recorded on `code_diffs` as they are yielded. With
+    git, each hunk is yielded as soon as it is read from the `git diff` pipe.
+
+    The 'python' backend falls back to git for staged changes (old_file=None)
+    since the previous version of the file only lives in the git index.
+    """
+    if backend not in DIFF_BACKENDS:
+        raise ValueError(
+            f"Unknown diff backend: {backend}, expected one of {DIFF_BACKENDS}"
+        )
+    if backend == "git" or old_file is None:
+        yield from iter_git_diff(stream_git_diff(old_file, new_file), code_diffs)
+        return
+    python_diffs = diff_code(
+        Path(old_file).read_text(),
+        Path(new_file).read_text(),
+        old_file=f"a/{old_file}",
+        new_file=f"b/{new_file}",
+    )
+    code_diffs.old_file = python_diffs.old_file
+    code_diffs.new_file = python_diffs.new_file
+    for diff in python_diffs.changes:
+        code_diffs.changes.append(diff)
+        yield diff
+
+
+def get_code_diffs(
+    old_file: Optional[Union[str, Path]],
+    new_file: Union[str, Path],
+    backend: str = "git",
+) -> CodeDiffs:
+    """Diff two files on disk with the selected backend"""
+    code_diffs = CodeDiffs(old_file="", new_file="", changes=[])
+    for _ in iter_code_diffs(old_file, new_file, code_diffs, backend=backend):
+        pass
+    return code_diffs
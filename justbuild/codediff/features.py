@@ -1,100 +1,182 @@
 import re
-from functools import lru_cache
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
-from justbuild.codediff.git_diff_calculations import CodeDiff
+from justbuild.codediff.git_diff_calculations import CodeDiff, CodeDiffs, DiffSegment
+
+COMMENT_PATTERNS = [
+    r"^\s*#",  # Python, Ruby, Perl, Shell, Makefile
+    r"^\s*//",  # C, C++, Java, JavaScript, Go, Rust, Swift
+    r"^\s*/\*",  # C, C++, Java, JavaScript, CSS (multi-line start)
+    r"^\*/\s*$",  # Multi-line comment end
+    r"^\s*\{/\*",  # TypeScript, JavaScript (alternative multi-line)
+    r"^\s*--",  # SQL, Lua, Haskell
+    r"^\s*%",  # Matlab, LaTeX, Prolog
+    r"^\s*;",  # Assembly, Lisp, Clojure
+    r"^\s*<!--",  # HTML, XML, Markdown
+    r"^\s*\(\*",  # OCaml, Pascal
+    r"^\s*\{-",  # Haskell (multi-line start)
+    r"^\s*'''",  # Python (multi-line string/comment)
+    r'^\s*"""',  # Python (multi-line string/comment)
+    r"^\s*REM\s",  # BASIC, batch files
+    r"^\s*\/\/\/",  # Swift, Kotlin (documentation comments)
+    r"^\s*<!",  # DTD
+    r"^\s*--\[\[",  # Lua (multi-line start)
+    r"^\s*=begin",  # Ruby (multi-line start)
+]
+
+PLACEHOLDER_PATTERNS = [
+    r"// ... \(rest of the previous code remains the same\)",
+    r"// Code Was Here",
+    r"# ... \(rest of the previous code remains the same\)",
+    r"# Code Was Here",
+]
+
+KEYWORDS = [
+    "rest of the previous code remains the same",
+    "Code Was Here",
+]
+
+# Compiled once at import: the patterns used to be recompiled for every line
+_COMMENT = "|".join(COMMENT_PATTERNS)
+_PLACEHOLDER = "|".join(PLACEHOLDER_PATTERNS)
+_KEYWORD = "|".join(re.escape(keyword) for keyword in KEYWORDS)
+
+COMMENT_RE = re.compile(_COMMENT, re.IGNORECASE)
+PLACEHOLDER_RE = re.compile(_PLACEHOLDER)
+KEYWORD_RE = re.compile(_KEYWORD)
+
+# The ellipsis and the placeholder keywords are all literals: a single scan of the
+# text finds every one of them, and the (rarer) placeholder patterns all contain a
+# keyword so they only need checking when one was found
+TRIGGER_RE = re.compile(rf"(?P<has_ellipsis>\.\.\.)|(?P<has_keyword>{_KEYWORD})")
+LINE_FLAGS = ("has_comment", "has_placeholder_word", "has_ellipsis", "has_keyword")
 
 
 def is_likely_comment(line: str) -> bool:
-    @lru_cache(maxsize=1)
-    def get_compiled_patterns():
-        patterns = [
-            r"^\s*#",  # Python, Ruby, Perl, Shell, Makefile
-            r"^\s*//",  # C, C++, Java, JavaScript, Go, Rust, Swift
-            r"^\s*/\*",  # C, C++, Java, JavaScript, CSS (multi-line start)
-            r"\*/\s*$",  # Multi-line comment end
-            r"^\s*\{/\*",  # TypeScript, JavaScript (alternative multi-line)
-            r"^\s*--",  # SQL, Lua, Haskell
-            r"^\s*%",  # Matlab, LaTeX, Prolog
-            r"^\s*;",  # Assembly, Lisp, Clojure
-            r"^\s*<!--",  # HTML, XML, Markdown
-            r"^\s*\(\*",  # OCaml, Pascal
-            r"^\s*\{-",  # Haskell (multi-line start)
-            r"^\s*'''",  # Python (multi-line string/comment)
-            r'^\s*"""',  # Python (multi-line string/comment)
-            r"^\s*REM\s",  # BASIC, batch files
-            r"^\s*\/\/\/",  # Swift, Kotlin (documentation comments)
-            r"^\s*<!",  # DTD
-            r"^\s*--\[\[",  # Lua (multi-line start)
-            r"^\s*=begin",  # Ruby (multi-line start)
-        ]
-        return [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
-
-    # Get the compiled patterns (will be cached after first call)
-    compiled_patterns = get_compiled_patterns()
-
-    # Check if any pattern matches
-    return any(pattern.match(line) for pattern in compiled_patterns)
+    return COMMENT_RE.match(line) is not None
 
 
 def is_known_code_placeholder(line: str) -> bool:
-    placeholders = [
-        r"// ... \(rest of the previous code remains the same\)",
-        r"// Code Was Here",
-        r"# ... \(rest of the previous code remains the same\)",
-        r"# Code Was Here",
-    ]
-    return any(re.search(pattern, line) for pattern in placeholders)
+    return PLACEHOLDER_RE.search(line) is not None
 
 
 def keyword_based_detection(inserted_line: str) -> bool:
-    keywords = [
-        r"rest of the previous code remains the same",
-        r"Code Was Here",
-    ]
-    return any(keyword in inserted_line for keyword in keywords)
+    return KEYWORD_RE.search(inserted_line) is not None
+
+
+def line_flags(lines: List[str]) -> Dict[str, bool]:
+    """Whether any of the lines has each of the LINE_FLAGS"""
+    flags = dict.fromkeys(LINE_FLAGS, False)
+    flags["has_comment"] = any(COMMENT_RE.match(line) for line in lines)
+    # The patterns never span a newline, so the lines are scanned as one text
+    text = "\n".join(lines)
+    for match in TRIGGER_RE.finditer(text):
+        flags[match.lastgroup] = True
+    if flags["has_keyword"]:
+        flags["has_placeholder_word"] = PLACEHOLDER_RE.search(text) is not None
+    return flags
 
 
-def build_features(code_diff: CodeDiff):
+def change_sequence_type(
+    segment: DiffSegment, prev_segment: Optional[DiffSegment]
+) -> str:
+    if not prev_segment:
+        return segment.type
+    if prev_segment.type == segment.type:
+        raise ValueError("Consecutive segments of the same type")
+    elif segment.type == "addition" and prev_segment.type == "deletion":
+        return "replaced_previous"
+    elif segment.type == "deletion" and prev_segment.type == "addition":
+        return "removed_previous"
+    elif prev_segment.type == "unchanged":
+        return segment.type
+    elif segment.type == "unchanged":
+        return "unchanged"
+    else:
+        raise ValueError("Unknown segment sequence")
+
+
+def build_features(code_diff: CodeDiffs):
     for diff in code_diff.changes:
         prev_segment = None
         for segment in diff.segments:
             if segment.features is None:
                 segment.features = {}
             # Segment Features
-            if prev_segment:
-                if prev_segment.type == segment.type:
-                    raise ValueError("Consecutive segments of the same type")
-                elif segment.type == "addition" and prev_segment.type == "deletion":
-                    segment.features["change_sequence_type"] = "replaced_previous"
-                elif segment.type == "deletion" and prev_segment.type == "addition":
-                    segment.features["change_sequence_type"] = "removed_previous"
-                elif prev_segment.type == "unchanged":
-                    segment.features["change_sequence_type"] = segment.type
-                elif segment.type == "unchanged":
-                    segment.features["change_sequence_type"] = "unchanged"
-                else:
-                    raise ValueError("Unknown segment sequence")
-            else:
-                segment.features["change_sequence_type"] = segment.type
-
-            segment.features["segment_size"] = len(segment.content)
+            segment.features["change_sequence_type"] = change_sequence_type(
+                segment, prev_segment
+            )
+            segment.features["segment_size"] = len(segment)
             segment.features["prev_segment_size"] = (
-                len(prev_segment.content) if prev_segment else 0
+                len(prev_segment) if prev_segment else 0
             )
 
-            # Line Features
-            segment.features["has_comment"] = any(
-                is_likely_comment(line) for line in segment.content
-            )
-            segment.features["has_placeholder_word"] = any(
-                is_known_code_placeholder(line) for line in segment.content
-            )
-            # Ellipsis is a common placeholder for code
-            segment.features["has_ellipsis"] = any(
-                "..." in line for line in segment.content
-            )
-            segment.features["has_keyword"] = any(
-                keyword_based_detection(line) for line in segment.content
-            )
+            # Line Features (the ellipsis is a common placeholder for code)
+            segment.features.update(line_flags(segment.content))
             #
             prev_segment = segment
+
+
+CHANGE_SEQUENCE_TYPES = (
+    "addition",
+    "deletion",
+    "unchanged",
+    "replaced_previous",
+    "removed_previous",
+)
+_SEQUENCE_CODES = {name: code for code, name in enumerate(CHANGE_SEQUENCE_TYPES)}
+
+
+@dataclass
+class FeatureTable:
+    """The segment features as columns, one row per input of `build_inputs`
+
+    Row `i` describes `inputs[i]`, so large diffs need a handful of arrays instead
+    of a dict per segment. `change_sequence_type` holds indices into
+    CHANGE_SEQUENCE_TYPES.
+    """
+
+    change_sequence_type: array = field(default_factory=lambda: array("B"))
+    segment_size: array = field(default_factory=lambda: array("l"))
+    prev_segment_size: array = field(default_factory=lambda: array("l"))
+    has_comment: array = field(default_factory=lambda: array("B"))
+    has_placeholder_word: array = field(default_factory=lambda: array("B"))
+    has_ellipsis: array = field(default_factory=lambda: array("B"))
+    has_keyword: array = field(default_factory=lambda: array("B"))
+
+    def __len__(self) -> int:
+        return len(self.segment_size)
+
+    def row(self, i: int) -> dict:
+        """Row `i` in the dict layout of `segment.features`"""
+        return {
+            "change_sequence_type": CHANGE_SEQUENCE_TYPES[self.change_sequence_type[i]],
+            "segment_size": self.segment_size[i],
+            "prev_segment_size": self.prev_segment_size[i],
+            **{flag: bool(getattr(self, flag)[i]) for flag in LINE_FLAGS},
+        }
+
+    def add_diff(self, diff: CodeDiff) -> None:
+        """Append the rows of one hunk, e.g. as soon as a streaming parser yields it
+
+        The first segment of a hunk has no previous segment and is not an input.
+        """
+        for prev_segment, segment in zip(diff.segments, diff.segments[1:]):
+            self.change_sequence_type.append(
+                _SEQUENCE_CODES[change_sequence_type(segment, prev_segment)]
+            )
+            self.segment_size.append(len(segment))
+            self.prev_segment_size.append(len(prev_segment))
+            flags = line_flags(segment.content)
+            for flag in LINE_FLAGS:
+                getattr(self, flag).append(flags[flag])
+
+
+def build_feature_table(code_diff: CodeDiffs) -> FeatureTable:
+    """Columnar equivalent of `build_features`, for the segments `build_inputs` keeps"""
+    table = FeatureTable()
+    for diff in code_diff.changes:
+        table.add_diff(diff)
+    return table
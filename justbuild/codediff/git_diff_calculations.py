@@ -1,24 +1,102 @@
 import re
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+LINE_TYPES = {"-": "deletion", "+": "addition"}  # anything else is 'unchanged'
 
 
-@dataclass
 class DiffSegment:
-    type: str  # 'addition' or 'deletion'
-    content: List[str]
-    features: Dict[str, List[str]] = None
+    """A run of diff lines of one type: lines [start, end) of a shared buffer
+
+    The buffer holds each diff line once, with its '+', '-' or ' ' prefix, and the
+    segment's code is only rendered when `content` or `text` is read.
+    """
+
+    __slots__ = ("type", "lines", "start", "end", "features")
+
+    def __init__(
+        self,
+        type: str,  # 'addition', 'deletion' or 'unchanged'
+        lines: List[str],
+        start: int,
+        end: int,
+        features: Dict[str, List[str]] = None,
+    ):
+        self.type = type
+        self.lines = lines
+        self.start = start
+        self.end = end
+        self.features = features
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @property
+    def content(self) -> List[str]:
+        return [line[1:] for line in self.lines[self.start : self.end]]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.content)
+
+    def __repr__(self) -> str:
+        return f"DiffSegment(type={self.type!r}, content={self.content!r})"
 
 
-@dataclass
 class CodeDiff:
-    lineno: int
-    raw_code_diff: str
-    old_start: int
-    old_count: int
-    new_start: int
-    new_count: int
-    segments: List[DiffSegment]
+    """One hunk: its header and the lines [start, end) of the shared diff buffer"""
+
+    __slots__ = (
+        "lineno",
+        "old_start",
+        "old_count",
+        "new_start",
+        "new_count",
+        "segments",
+        "lines",
+        "start",
+        "end",
+    )
+
+    def __init__(
+        self,
+        lineno: int,
+        old_start: int,
+        old_count: int,
+        new_start: int,
+        new_count: int,
+        lines: List[str],
+    ):
+        self.lineno = lineno
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.segments: List[DiffSegment] = []
+        self.lines = lines
+        self.start = self.end = len(lines)
+
+    def append(self, line: str) -> None:
+        """Add a '+', '-' or ' ' prefixed line at the end of the hunk and the buffer"""
+        segment_type = LINE_TYPES.get(line[:1], "unchanged")
+        if not self.segments or self.segments[-1].type != segment_type:
+            self.segments.append(
+                DiffSegment(segment_type, self.lines, self.end, self.end)
+            )
+        self.lines.append(line)
+        self.segments[-1].end += 1
+        self.end += 1
+
+    @property
+    def raw_code_diff(self) -> str:
+        return "".join(line + "\n" for line in self.lines[self.start : self.end])
+
+    def __repr__(self) -> str:
+        return (
+            f"CodeDiff(old_start={self.old_start}, old_count={self.old_count}, "
+            f"new_start={self.new_start}, new_count={self.new_count}, "
+            f"segments={self.segments!r})"
+        )
 
 
 @dataclass
@@ -29,22 +107,50 @@ class CodeDiffs:
 
 
 def parse_diff_header(header: str) -> Dict[str, int]:
-    if match := re.match(r"@@ -(\d+),(\d+) \+(\d+),(\d+) @@", header):
+    # git omits the line count when it is 1, e.g. `@@ -3 +3 @@`
+    if match := re.match(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", header):
         return {
             "old_start": int(match[1]),
-            "old_count": int(match[2]),
+            "old_count": int(match[2] or 1),
             "new_start": int(match[3]),
-            "new_count": int(match[4]),
+            "new_count": int(match[4] or 1),
         }
     return {}
 
 
-def parse_git_diff(diff_output: str) -> CodeDiffs:
-    lines = diff_output.split("\n")
-    code_diffs = CodeDiffs(old_file="", new_file="", changes=[])
+def _diff_lines(diff_output: Union[str, Iterable[str]]) -> Iterable[str]:
+    if isinstance(diff_output, str):
+        return diff_output.split("\n")
+    # Lines read from a file or a pipe keep their line ending
+    return (line.rstrip("\n") for line in diff_output)
+
+
+def iter_git_diff(
+    diff_output: Union[str, Iterable[str]], code_diffs: CodeDiffs
+) -> Iterator[CodeDiff]:
+    """Parse a diff incrementally, yielding each hunk as soon as it is complete
+
+    `diff_output` can be a string or any iterable of lines, such as the stdout of
+    a `git diff` process. The file names are set on `code_diffs` as they are read
+    and every completed hunk is appended to `code_diffs.changes` before it is
+    yielded.
+    """
+    buffer: List[str] = []  # The hunk lines of every change, stored once
     current_diff = None
-    current_segment = None
-    for line in lines:
+    # Lines left in the current hunk, from its `@@` header: a deleted `-- note`
+    # line reads `--- note` and must not be taken for a file header
+    old_left = new_left = 0
+    for line in _diff_lines(diff_output):
+        # Skip the trailing newline of the output and 'No newline at end of file'
+        if not line or line.startswith("\\"):
+            continue
+        if (old_left > 0 or new_left > 0) and not line.startswith("@@"):
+            current_diff.append(line)
+            if not line.startswith("+"):
+                old_left -= 1
+            if not line.startswith("-"):
+                new_left -= 1
+            continue
         if line.startswith("--- "):
             if code_diffs.old_file:
                 raise ValueError("Multiple old files detected")
@@ -58,54 +164,107 @@ def parse_git_diff(diff_output: str) -> CodeDiffs:
 
         if line.startswith("@@"):
             if current_diff:
-                if current_segment:
-                    current_diff.segments.append(current_segment)
                 code_diffs.changes.append(current_diff)
+                yield current_diff
             header_info = parse_diff_header(line)
             current_diff = CodeDiff(
                 lineno=header_info["new_start"],
-                raw_code_diff="",
                 old_start=header_info["old_start"],
                 old_count=header_info["old_count"],
                 new_start=header_info["new_start"],
                 new_count=header_info["new_count"],
-                segments=[],
+                lines=buffer,
             )
-            current_segment = None
+            old_left, new_left = header_info["old_count"], header_info["new_count"]
             continue
 
         if current_diff is None:
             raise ValueError("Diff header not found")
-
-        if line.startswith("-"):
-            if current_segment and current_segment.type != "deletion":
-                current_diff.segments.append(current_segment)
-                current_segment = None
-            if not current_segment:
-                current_segment = DiffSegment(type="deletion", content=[])
-        elif line.startswith("+"):
-            if current_segment and current_segment.type != "addition":
-                current_diff.segments.append(current_segment)
-                current_segment = None
-            if not current_segment:
-                current_segment = DiffSegment(type="addition", content=[])
-        else:
-            if current_segment and current_segment.type != "unchanged":
-                current_diff.segments.append(current_segment)
-                current_segment = None
-            if not current_segment:
-                current_segment = DiffSegment(type="unchanged", content=[])
-        current_segment.content.append(line[1:])
-        current_diff.raw_code_diff += line + "\n"
+        current_diff.append(line)
 
     if current_diff:
-        if current_segment:
-            current_diff.segments.append(current_segment)
         code_diffs.changes.append(current_diff)
+        yield current_diff
+
 
+def parse_git_diff(diff_output: Union[str, Iterable[str]]) -> CodeDiffs:
+    code_diffs = CodeDiffs(old_file="", new_file="", changes=[])
+    for _ in iter_git_diff(diff_output, code_diffs):
+        pass
     return code_diffs
 
 
+def split_git_diff_lines(
+    diff_output: Union[str, Iterable[str]]
+) -> Iterator[Tuple[str, List[str]]]:
+    """Split a multi-file `git diff` into the (path, diff lines) of each file
+
+    The lines are not parsed, so callers can handle a file that fails to parse on
+    its own. Extended headers (`index`, `new file mode`, ...) are dropped and
+    binary files, which have no `---`/`+++` lines, are skipped. The path is read
+    from the `+++` line, or the `---` line of a deleted file, since the names of
+    the `diff --git` line cannot be told apart when they contain spaces.
+    """
+    path, file_lines = "", None
+    for line in _diff_lines(diff_output):
+        if line.startswith("diff --git "):
+            if file_lines:
+                yield path, file_lines
+            path, file_lines = "", []
+        elif file_lines is None:
+            continue
+        elif file_lines or line.startswith("--- "):
+            file_lines.append(line)
+            if len(file_lines) == 2 and line.startswith("+++ "):
+                path = header_file_path(line)
+                if path == "/dev/null":
+                    path = header_file_path(file_lines[0])
+    if file_lines:
+        yield path, file_lines
+
+
+def split_git_diff(diff_output: Union[str, Iterable[str]]) -> Iterator[CodeDiffs]:
+    """Split a multi-file `git diff` into one CodeDiffs per file, as each file closes
+
+    See `split_git_diff_lines`, which lets one file fail without the others.
+    """
+    for _, file_lines in split_git_diff_lines(diff_output):
+        yield parse_git_diff(file_lines)
+
+
+def diff_file_path(path: str) -> str:
+    """Strip the `a/` or `b/` prefix git adds to the file names in a diff"""
+    return path[2:] if path.startswith(("a/", "b/")) else path
+
+
+def header_file_path(line: str) -> str:
+    """The file name of a `--- a/...` or `+++ b/...` line, without its prefix
+
+    git ends the name with a tab when it contains a space, and quotes it, with
+    C-style escapes, when it contains special or non-ASCII characters.
+    """
+    name = line[4:].rstrip("\t")
+    if name.startswith('"') and name.endswith('"'):
+        escaped = name[1:-1].encode("ascii", "backslashreplace")
+        name = escaped.decode("unicode_escape").encode("latin-1").decode("utf-8")
+    return diff_file_path(name)
+
+
+def iter_segments(diffs: CodeDiffs) -> Iterator[Tuple[int, int, int]]:
+    """(hunk index, segment index, new line) of every segment that follows another
+
+    The segments are those classified by the models (the rows of a FeatureTable),
+    in order. The new line is where the segment starts in the new code, 0-based.
+    """
+    for i, diff in enumerate(diffs.changes):
+        new_lineno = diff.new_start - 1
+        for j, segment in enumerate(diff.segments):
+            if j > 0:
+                yield i, j, new_lineno
+            if segment.type != "deletion":
+                new_lineno += len(segment)
+
+
 def code_diff_around_segment(
     diffs: CodeDiffs, diff_index: int, segment_index: int
 ) -> str:
@@ -133,13 +292,4 @@ def code_diff_around_segment(
         end += 1
 
     # Build the raw code diff
-    raw_code_diff = []
-    for k in range(start, end + 1):
-        segment = diff.segments[k]
-        if segment.type == "addition":
-            raw_code_diff.append("+" + "\n+".join(segment.content))
-        elif segment.type == "deletion":
-            raw_code_diff.append("-" + "\n-".join(segment.content))
-        else:
-            raw_code_diff.append(" " + "\n ".join(segment.content))
-    return "\n".join(raw_code_diff)
+    return "\n".join(diff.lines[diff.segments[start].start : diff.segments[end].end])
@@ -1,6 +1,7 @@
 import subprocess
+import tempfile
 from pathlib import Path
-from typing import List, Union
+from typing import Iterator, List, Optional, Union
 
 
 def is_git_installed() -> bool:
@@ -41,6 +42,17 @@ def get_staged_changes(file_path: str) -> str:
     return "\n".join(result.stdout.split("\n")[2:])
 
 
+def get_all_staged_changes() -> str:
+    """Staged changes for the whole tree in a single `git diff` call"""
+    result = subprocess.run(
+        ["git", "diff", "--cached"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout
+
+
 def get_diff(old_file: str, new_file: str):
     try:
         result = subprocess.run(
@@ -56,8 +68,94 @@ def get_diff(old_file: str, new_file: str):
         return "\n".join(e.output.split("\n")[2:])
 
 
+def stream_git_diff(
+    old_file: Optional[Union[str, Path]], new_file: Union[str, Path]
+) -> Iterator[str]:
+    """Lines of `git diff` as git writes them, from the `---` header onwards
+
+    Like `run_git_diff` (the staged changes of new_file when old_file is None), but
+    reads the output from the pipe instead of buffering it.
+    """
+    if old_file is None:
+        args = ["git", "diff", "--cached", "--", str(new_file)]
+    else:
+        args = ["git", "diff", "--no-index", "--", str(old_file), str(new_file)]
+    # stderr goes to a file: a pipe left unread while stdout is drained could fill
+    # up and block git, and with it this reader
+    with tempfile.TemporaryFile("w+") as stderr_file, subprocess.Popen(
+        args, stdout=subprocess.PIPE, stderr=stderr_file, text=True
+    ) as process:
+        in_header = True
+        for line in process.stdout:
+            # Drop the 'diff --git' and 'index' lines before the file names
+            if in_header and not line.startswith("--- "):
+                continue
+            in_header = False
+            yield line
+        process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+    # `git diff --no-index` exits with 1 when the files differ
+    if process.returncode not in (0, 1):
+        raise subprocess.CalledProcessError(process.returncode, args, stderr=stderr)
+
+
+def stream_all_staged_changes() -> Iterator[str]:
+    """Lines of `get_all_staged_changes`, read from the `git diff` pipe"""
+    args = ["git", "diff", "--cached"]
+    with subprocess.Popen(args, stdout=subprocess.PIPE, text=True) as process:
+        yield from process.stdout
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args)
+
+
 def run_git_diff(old_file: Union[str, Path], new_file: Union[str, Path]) -> str:
     if old_file is None:
         return get_staged_changes(str(new_file))
     else:
         return get_diff(str(old_file), str(new_file))
+
+
+def list_files(directory: Union[str, Path], *options: str) -> Optional[List[Path]]:
+    """The files `git ls-files <options>` lists under `directory`
+
+    None when git is missing or `directory` is not inside a git repository.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(directory), "ls-files", "-z", *options],
+            capture_output=True,
+            check=True,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    names = result.stdout.decode("utf-8", "surrogateescape").split("\0")
+    return [Path(directory) / name for name in names if name]
+
+
+def get_index_path(directory: Union[str, Path]) -> Optional[Path]:
+    """The git index of the repository holding `directory`, None outside of one"""
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(directory), "rev-parse", "--git-path", "index"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    return Path(directory) / result.stdout.strip()
+
+
+def get_index_version(file: Union[str, Path]) -> Optional[str]:
+    """The content of `file` in the git index, None if it is not there (or binary)"""
+    file = Path(file)
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(file.parent), "show", f":./{file.name}"],
+            capture_output=True,
+            check=True,
+        )
+        return result.stdout.decode("utf-8")
+    except (subprocess.CalledProcessError, FileNotFoundError, UnicodeDecodeError):
+        return None
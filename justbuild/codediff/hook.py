@@ -0,0 +1,186 @@
+"""Pre-commit check for code omissions in the staged changes: `lfg hook`
+
+A single `git diff --cached` is scanned with the Greedy model. Segments it is unsure
+about take the verdicts of earlier merges instead: the remembered hunk verdicts
+(including human labels) first, then the cached LLM verdicts, both opened read
+only. Nothing is sent to the LLM, nothing is written and nobody is asked, so the
+hook only imports the light parts of the pipeline (no openai, rich or tqdm) and
+answers within a fraction of a second.
+"""
+
+import argparse
+import sys
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from justbuild.codediff.features import build_feature_table
+from justbuild.codediff.git_diff_calculations import (
+    CodeDiff,
+    CodeDiffs,
+    code_diff_around_segment,
+    diff_file_path,
+    iter_segments,
+    parse_git_diff,
+    split_git_diff_lines,
+)
+from justbuild.codediff.git_wrappers import stream_all_staged_changes
+from justbuild.codediff.hunk_memo import HunkMemo, get_hunk_memo, hunk_key
+from justbuild.codediff.llm_cache import (
+    VerdictCache,
+    default_cache_path,
+    get_verdict_cache,
+    verdict_key,
+)
+from justbuild.codediff.models import GreedyModel, is_uncertain
+from justbuild.codediff.prompts import BATCH_SYSTEM_PROMPT, system_prompt, user_message
+from justbuild.config import Config, load_config
+
+
+def _cached_llm_verdict(
+    config: Config, cache: VerdictCache, diffs: CodeDiffs, i: int, j: int
+) -> Optional[dict]:
+    """The verdict an earlier merge got from the LLM for this segment, if any"""
+    message = user_message(
+        {
+            "_diff": code_diff_around_segment(diffs, i, j),
+            "_curr_segment": diffs.changes[i].segments[j].text,
+        }
+    )
+    for prompt in (system_prompt(config.llm_verbose), BATCH_SYSTEM_PROMPT):
+        key = verdict_key(prompt, config.model_name, config.model_temperature, message)
+        if (verdict := cache.get(key)) is not None:
+            return verdict
+    return None
+
+
+def _remembered_hunk(
+    config: Config, memo: Optional[HunkMemo], diff: CodeDiff
+) -> Optional[List[dict]]:
+    """The outputs an earlier merge (with or without the LLM) kept for this hunk"""
+    if memo is None:
+        return None
+    for namespace in (config.model_name, "fast"):
+        if (known := memo.get(hunk_key(diff, namespace))) is not None:
+            return known
+    return None
+
+
+def scan_diffs(
+    diffs: CodeDiffs,
+    config: Config,
+    memo: Optional[HunkMemo] = None,
+    cache: Optional[VerdictCache] = None,
+) -> List[dict]:
+    """The segments of one file's diff that look like code omissions"""
+    predictions = GreedyModel().predict_batch(build_feature_table(diffs))
+    findings = []
+    known: Dict[int, Optional[List[dict]]] = {}
+    for row, (i, j, new_lineno) in enumerate(iter_segments(diffs)):
+        diff = diffs.changes[i]
+        segment = diff.segments[j]
+        if i not in known:
+            known[i] = _remembered_hunk(config, memo, diff)
+        verdict = {
+            "is_code_omission": predictions["is_code_omission"][row],
+            "confidence": predictions["confidence"][row],
+        }
+        source = "greedy"
+        if known[i] is not None and "final" in known[i][j - 1]:
+            output = known[i][j - 1]
+            verdict = output["final"]
+            source = "human" if "human" in output else "memo"
+        elif is_uncertain(verdict) and cache is not None:
+            if cached := _cached_llm_verdict(config, cache, diffs, i, j):
+                verdict, source = cached, "llm"
+        if verdict["is_code_omission"] and segment.type != "deletion":
+            findings.append(
+                {
+                    "file": diff_file_path(diffs.new_file),
+                    "line": new_lineno + 1,
+                    "placeholder": segment.text.strip().split("\n")[0],
+                    "omitted_lines": len(diff.segments[j - 1]),
+                    "confidence": verdict.get("confidence"),
+                    "source": source,
+                }
+            )
+    return findings
+
+
+def scan_staged(
+    config: Config,
+    diff_lines: Optional[Iterable[str]] = None,
+    files: Optional[Iterable[str]] = None,
+) -> List[dict]:
+    """Likely code omissions in the staged changes (or in `diff_lines`)
+
+    Pass `files` to only report those paths, e.g. the file names pre-commit gives.
+    """
+    if diff_lines is None:
+        diff_lines = stream_all_staged_changes()
+    files = set(files) if files else None
+    memo = get_hunk_memo(config, read_only=True)
+    cache = None
+    cache_path = Path(config.cache_path or default_cache_path())
+    if config.cache_enabled and cache_path.exists():
+        cache = get_verdict_cache(str(cache_path), read_only=True)
+
+    findings = []
+    for path, file_lines in split_git_diff_lines(diff_lines):
+        try:
+            diffs = parse_git_diff(file_lines)
+            if diffs.new_file == "/dev/null":
+                continue  # Deleted files have no code left to omit
+            if files is not None and diff_file_path(diffs.new_file) not in files:
+                continue
+            findings.extend(scan_diffs(diffs, config, memo=memo, cache=cache))
+        except Exception as e:
+            # A file the hook cannot read must never block the commit
+            print(f"LFG: skipped {path}: {e}", file=sys.stderr)
+    return findings
+
+
+def format_report(findings: List[dict]) -> str:
+    lines = [f"LFG 💥! {len(findings)} likely code omissions in the staged changes:"]
+    for finding in findings:
+        confidence = finding["confidence"]
+        lines.append(
+            f"  {finding['file']}:{finding['line']}: {finding['placeholder']} "
+            f"(replaces {finding['omitted_lines']} lines, {finding['source']}"
+            + (f" {confidence:.2f})" if confidence is not None else ")")
+        )
+    lines.append(
+        "Restore the omitted code with `lfg merge`, or skip this check with "
+        "`git commit --no-verify`."
+    )
+    return "\n".join(lines)
+
+
+def check_staged(files: Optional[Iterable[str]] = None, no_cache=False) -> int:
+    """Print the report of the likely omissions, the exit code for git (1 if any)"""
+    # No OpenAI client: the hook never calls the LLM, it only reads cached verdicts
+    config = replace(load_config(clients=False), cache_enabled=not no_cache)
+    findings = scan_staged(config, files=files)
+    if findings:
+        print(format_report(findings), file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """`lfg-hook`, the pre-commit entry point, without the CLI's startup time"""
+    parser = argparse.ArgumentParser(
+        prog="lfg-hook", description="Check the staged changes for code omissions"
+    )
+    parser.add_argument("files", nargs="*", help="Only check these staged files")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Only use the Greedy model, ignore cached verdicts",
+    )
+    args = parser.parse_args(argv)
+    return check_staged(args.files, no_cache=args.no_cache)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
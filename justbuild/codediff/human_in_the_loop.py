@@ -1,11 +1,17 @@
-from typing import Dict, List, Optional
+import queue
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import typer
 from rich.console import Console
 from rich.panel import Panel
+from rich.segment import Segments
 from rich.syntax import Syntax
 from rich.text import Text
 
+# Diffs rendered ahead of the one being reviewed
+RENDER_AHEAD = 2
+
 
 def _show_title(console):
     console.print(
@@ -20,27 +26,67 @@ def _show_title(console):
     )
 
 
+def _render_diff(console: Console, diff: str) -> Segments:
+    """The diff highlighted by rich's Syntax, ready to print"""
+    diff_syntax = Syntax(diff, "diff", theme="monokai", line_numbers=True)
+    return Segments(list(console.render(diff_syntax)))
+
+
+def _rendered_ahead(
+    samples: Iterable[Dict], console: Console
+) -> Iterator[Tuple[Dict, Segments]]:
+    """The samples with their rendered diffs, highlighted in a background thread
+
+    While the user reads one diff the next ones are prepared, and `samples` can be
+    a stream that is still being filled (e.g. by the LLM).
+    """
+    rendered: queue.Queue = queue.Queue(maxsize=RENDER_AHEAD)
+    done = object()
+
+    def render():
+        try:
+            for sample in samples:
+                rendered.put((sample, _render_diff(console, sample["_diff"])))
+        except BaseException as e:  # Raised again in the reviewing thread
+            rendered.put(e)
+        rendered.put(done)
+
+    threading.Thread(target=render, name="lfg-render", daemon=True).start()
+    while (item := rendered.get()) is not done:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
 def labeling(
-    samples: List[Dict],
+    samples: Iterable[Dict],
     label="label",
     default_confidence=0.99,
     console: Optional[Console] = None,
 ) -> List[Dict]:
     """
     Allow the user to review and label code diffs for placeholder comments.
+
+    `samples` can be an iterator that yields diffs as they are found to need a
+    review, so the user can start before the models are done with the others.
     """
     console = console or Console()
+    total = len(samples) if isinstance(samples, list) else None
     labeled_inputs = []
 
-    for index, input_dict in enumerate(samples, start=1):
-        _show_title(console)
-        console.print(f"\n[bold]Reviewing diff {index} of {len(samples)}[/bold]\n")
-
-        # Display the diff using rich's Syntax highlighting
-        diff_syntax = Syntax(
-            input_dict["_diff"], "diff", theme="monokai", line_numbers=True
+    for index, (input_dict, diff_render) in enumerate(
+        _rendered_ahead(samples, console), start=1
+    ):
+        if index == 1:
+            console.clear()
+            _show_title(console)
+        # Only the new diff is printed below the last one, nothing is redrawn
+        console.rule(
+            f"[bold]Reviewing diff {index}"
+            + (f" of {total}" if total is not None else "")
+            + "[/bold]"
         )
-        console.print(diff_syntax)
+        console.print(diff_render)
 
         # Ask the user for input
         contains_placeholder = typer.confirm(
@@ -53,9 +99,6 @@ def labeling(
         input_dict["confidence"] = default_confidence
         labeled_inputs.append(input_dict)
 
-        # Clear the screen for the next diff
-        console.clear()
-
     return labeled_inputs
 
 
@@ -0,0 +1,95 @@
+import copy
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from justbuild.codediff.git_diff_calculations import CodeDiff
+from justbuild.codediff.llm_cache import (
+    VerdictCache,
+    default_cache_path,
+    get_verdict_cache,
+)
+from justbuild.config import Config
+
+
+def hunk_key(diff: CodeDiff, namespace: str = "") -> str:
+    """Content address of a hunk, independent of where it sits in the file
+
+    The `@@` line numbers are left out and trailing whitespace is ignored, so a hunk
+    keeps its key when code above it changes. `namespace` separates verdicts that
+    were reached differently (e.g. with and without the LLM).
+    """
+    digest = hashlib.sha256(namespace.encode("utf-8"))
+    for line in diff.lines[diff.start : diff.end]:
+        digest.update(b"\0")
+        digest.update(line.rstrip().encode("utf-8"))
+    return digest.hexdigest()
+
+
+class HunkMemo:
+    """Verdicts of the hunks that were already classified, keyed by `hunk_key`
+
+    For each hunk, the outputs ('naive', 'llm', 'human' and 'final' verdicts) of its
+    segments after the first, in order, the same rows `build_inputs` makes. Kept in
+    memory, or in a `store` on disk so that later runs (and human labels) carry over.
+    """
+
+    def __init__(self, store: Optional[VerdictCache] = None):
+        self.store = store
+        self._hunks: Dict[str, List[dict]] = {}
+        self.reused = 0
+        self.classified = 0
+
+    def get(
+        self, key: str, accept: Optional[Callable[[List[dict]], bool]] = None
+    ) -> Optional[List[dict]]:
+        """The outputs of the hunk, unless unknown or turned down by `accept`"""
+        if self.store is not None:
+            outputs = self.store.get(key)  # A fresh copy, decoded from JSON
+        else:
+            outputs = copy.deepcopy(self._hunks.get(key))
+        if outputs is not None and accept is not None and not accept(outputs):
+            outputs = None
+        if outputs is None:
+            self.classified += 1
+        else:
+            self.reused += 1
+        return outputs
+
+    def set(self, key: str, outputs: List[dict]) -> None:
+        if self.store is not None:
+            self.store.set(key, outputs)
+        else:
+            self._hunks[key] = copy.deepcopy(outputs)
+
+    def __len__(self) -> int:
+        return len(self.store) if self.store is not None else len(self._hunks)
+
+    def stats(self) -> dict:
+        return {"reused": self.reused, "classified": self.classified}
+
+
+def default_hunk_memo_path(config: Config) -> Path:
+    """Next to the LLM verdict cache"""
+    verdicts_path = Path(config.cache_path) if config.cache_path else None
+    return (verdicts_path or default_cache_path()).with_name("hunk_verdicts.sqlite3")
+
+
+def get_hunk_memo(config: Config, read_only: bool = False) -> Optional[HunkMemo]:
+    """A HunkMemo persisted on disk, or None when the config disables caching
+
+    A `read_only` memo is None until a merge created the file.
+    """
+    if not config.cache_enabled:
+        return None
+    path = Path(config.hunk_memo_path or default_hunk_memo_path(config))
+    if read_only:
+        if not path.exists():
+            return None
+        return HunkMemo(get_verdict_cache(str(path), read_only=True))
+    store = get_verdict_cache(
+        str(path),
+        max_entries=config.cache_max_entries,
+        max_age_days=config.cache_max_age_days,
+    )
+    return HunkMemo(store)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+
+
+def default_cache_path() -> Path:
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "justbuild" / "llm_verdicts.sqlite3"
+
+
+def verdict_key(
+    system_prompt: str, model_name: str, temperature: float, user_message: str
+) -> str:
+    """Content address of an LLM request: identical prompts share a verdict"""
+    digest = hashlib.sha256()
+    for part in (system_prompt, model_name, repr(float(temperature)), user_message):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class VerdictCache:
+    """On-disk (SQLite) cache of LLM verdicts keyed by `verdict_key`
+
+    Entries older than `max_age_days` are dropped and only the `max_entries` most
+    recently used are kept, both checked when the cache is opened. A `read_only`
+    cache (of an existing file) only looks verdicts up: nothing is evicted or
+    touched, e.g. for the pre-commit hook.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        max_entries: int = 10_000,
+        max_age_days: float = 30,
+        read_only: bool = False,
+    ):
+        self.path = Path(path) if path else default_cache_path()
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if read_only:
+            self._conn = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the LLM worker threads, guarded by self._lock
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+        self.evict()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.read_only:
+                self._conn.execute(
+                    "UPDATE verdicts SET accessed = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        return json.loads(row[0])
+
+    def __contains__(self, key: str) -> bool:
+        """Whether `key` has a verdict, without counting a hit or a miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, value, accessed) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+
+    def evict(self) -> None:
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM verdicts WHERE accessed < ?", (cutoff,))
+            self._conn.execute(
+                "DELETE FROM verdicts WHERE key NOT IN ("
+                "SELECT key FROM verdicts ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM verdicts")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def get_verdict_cache(
+    path: Optional[str] = None,
+    max_entries: int = 10_000,
+    max_age_days: float = 30,
+    read_only: bool = False,
+) -> VerdictCache:
+    """The process-wide VerdictCache for `path`, opened (and evicted) on first use
+
+    Keeps a single SQLite connection for all the merges of a long-running process
+    """
+    return VerdictCache(
+        path, max_entries=max_entries, max_age_days=max_age_days, read_only=read_only
+    )
@@ -1,19 +1,33 @@
+import concurrent.futures
+import queue
+import shutil
 import tempfile
+import time
 from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-from justbuild.codediff.features import build_features
+from justbuild.codediff.diff_engine import diff_code, iter_code_diffs
+from justbuild.codediff.features import FeatureTable, build_feature_table
 from justbuild.codediff.git_diff_calculations import (
     CodeDiffs,
     code_diff_around_segment,
+    diff_file_path,
+    iter_segments,
     parse_git_diff,
+    split_git_diff_lines,
 )
-from justbuild.codediff.git_wrappers import get_changed_files, is_git_repo, run_git_diff
+from justbuild.codediff.git_wrappers import is_git_repo, stream_all_staged_changes
 from justbuild.codediff.human_in_the_loop import labeling, print_changes
-from justbuild.codediff.models import GreedyModel
+from justbuild.codediff.hunk_memo import HunkMemo, get_hunk_memo, hunk_key
+from justbuild.codediff.metrics import Metrics
+from justbuild.codediff.models import GreedyModel, is_uncertain
 from justbuild.codediff.models_llm import LLMModel
-from justbuild.config import Config
+from justbuild.codediff.models_local import LocalModel, get_local_model
+from justbuild.codediff.scheduler import schedule_llm
+from justbuild.config import Config, get_config
 
 
 def merge(
@@ -25,53 +39,246 @@ def merge(
     fast=False,
     interactive=False,
     dry_run=False,
+    diff_backend: Optional[str] = None,
+    diffs: Optional[CodeDiffs] = None,
+    memo: Optional[HunkMemo] = None,
+    metrics: Optional[Metrics] = None,
     **kwargs,
 ) -> dict:
     """Combine code into target_file from new_file and old_file
     Particularly focusing on LLM-related code section ommissions
 
+    Pass pre-computed `diffs` (e.g. from `split_git_diff`) to skip diffing the files.
+    Hunks seen in previous merges keep their verdicts (and human labels) from the
+    `memo`, by default the one persisted next to the LLM cache. The time spent in
+    each stage, LLM usage and cache hits are recorded in `metrics` and returned
+    under the "metrics" key.
+
     We can do greedy merging of code sections
     We can use LLM to assist in merging code sections
     We can prompt the user to resolve code sections
     """
     if config is None:
-        config = Config.create()
+        config = get_config()
+    if memo is None:
+        memo = get_hunk_memo(config)
+    if metrics is None:
+        metrics = Metrics()
 
     if new_file is None:
         raise ValueError("new_file must be provided")
 
-    if target_file is None:
-        target_file = new_file
+    new_file = Path(new_file)
+    target_file = Path(target_file) if target_file is not None else new_file
 
     # Step 1: Find Likely Section Omissions
     ## Most Granular - Look at all diffs to approve and reject
-    all_diffs = run_git_diff(old_file, new_file)
-    diffs = parse_git_diff(all_diffs)
+    table = None
+    if diffs is None:
+        diffs = CodeDiffs(old_file="", new_file="", changes=[])
+        table = FeatureTable()
+        # Features are built hunk by hunk while git is still writing the diff
+        for diff in metrics.iter_stage(
+            "diff",
+            iter_code_diffs(
+                old_file, new_file, diffs, backend=diff_backend or config.diff_backend
+            ),
+        ):
+            with metrics.stage("features"):
+                table.add_diff(diff)
+
+    classification, human_labels = _classify_with_review(
+        diffs,
+        config=config,
+        yes=yes,
+        fast=fast,
+        interactive=interactive,
+        table=table,
+        memo=memo,
+        metrics=metrics,
+    )
+    return _apply_merge(
+        old_file,
+        new_file,
+        target_file,
+        classification,
+        yes=yes,
+        dry_run=dry_run,
+        human_labels=human_labels,
+    )
 
-    # Model Creation
-    build_features(diffs)
 
-    inputs = build_inputs(diffs)
-    outputs = defaultdict(dict)
+@dataclass
+class Classification:
+    """Model verdicts for every segment of a file, before human review"""
 
-    # Greedy Model - Use Greedy Model to predict code omissions
-    predictions = GreedyModel().predict(inputs)
-    for pred in predictions:
-        outputs[pred["_id"]]["naive"] = {
-            k: v for k, v in pred.items() if k in ["is_code_omission", "confidence"]
+    inputs: List[dict]
+    outputs: Dict[int, dict]
+    inputs_for_humans: List[dict]
+    cache_stats: Dict[str, int] = field(
+        default_factory=lambda: {"hits": 0, "misses": 0}
+    )
+    # Hunks whose verdicts came from (or go to) the memo
+    memo: Optional[HunkMemo] = None
+    hunk_keys: List[str] = field(default_factory=list)
+    hunk_stats: Dict[str, int] = field(
+        default_factory=lambda: {"reused": 0, "classified": 0}
+    )
+    metrics: Metrics = field(default_factory=Metrics)
+    # Learns from the human labels of this review
+    table: Optional[FeatureTable] = None
+    local_model: Optional[LocalModel] = None
+
+
+def _apply_merge(
+    old_file: Optional[Path],
+    new_file: Path,
+    target_file: Path,
+    classification: Classification,
+    yes=False,
+    dry_run=False,
+    human_labels: Optional[List[dict]] = None,
+) -> dict:
+    """Review the classified segments and write (or print) the merged new_file"""
+    merged_code, change_log, human_labels = _review_and_merge(
+        new_file.read_text(), classification, yes=yes, human_labels=human_labels
+    )
+
+    if dry_run:
+        # Print the changes
+        print_changes(change_log)
+    else:
+        # Write the changes to the target file
+        with classification.metrics.stage("write"):
+            target_file.write_text(merged_code)
+
+    return {
+        "old_file": old_file,
+        "new_file": new_file,
+        "target_file": target_file,
+        "changes": change_log,
+        "labels": human_labels,
+        "cache": classification.cache_stats,
+        "hunks": classification.hunk_stats,
+        "metrics": classification.metrics.as_dict(),
+    }
+
+
+def _classify_segments(
+    diffs: CodeDiffs,
+    config: Config,
+    fast=False,
+    interactive=False,
+    table: Optional[FeatureTable] = None,
+    memo: Optional[HunkMemo] = None,
+    metrics: Optional[Metrics] = None,
+    on_review: Optional[Callable[[dict], None]] = None,
+) -> Classification:
+    """Run the Greedy, local and LLM models over every segment of `diffs`
+
+    Pass the `table` of features if it was built while the diff was streamed in.
+    Segments of hunks already in the `memo` keep their verdicts and skip the models.
+    The segments the Greedy model is unsure about go to the local model trained on
+    earlier human labels, and only those it is unsure about too reach the LLM, most
+    valuable first and within the config's LLM budgets. Does not touch the console
+    or the file system, so it is safe to run in a worker.
+
+    `on_review` is called with each of the `inputs_for_humans` as soon as it is
+    known to need a review, e.g. before the LLM has answered about the others.
+    """
+    # Greedy Model - Use Greedy Model to predict code omissions from the cheap
+    # numeric features, before any segment text is rendered
+    if metrics is None:
+        metrics = Metrics()
+    if table is None:
+        with metrics.stage("features"):
+            table = build_feature_table(diffs)
+    with metrics.stage("greedy"):
+        predictions = GreedyModel().predict_batch(table)
+        inputs = build_inputs(diffs)
+    metrics.count("hunks", len(diffs.changes))
+    metrics.count("segments", len(inputs))
+    outputs = defaultdict(dict)
+    for i, (is_code_omission, confidence) in enumerate(
+        zip(predictions["is_code_omission"], predictions["confidence"])
+    ):
+        outputs[i]["naive"] = {
+            "is_code_omission": is_code_omission,
+            "confidence": confidence,
         }
 
+    # Hunk Memo - Reuse the verdicts of the hunks classified in a previous merge
+    hunk_keys, reused = [], set()
+    hunk_stats = {"reused": 0, "classified": len(diffs.changes)}
+    if memo is not None:
+        namespace = "fast" if fast else config.model_name
+        hunk_keys = [hunk_key(diff, namespace) for diff in diffs.changes]
+        reused, hunk_stats = _reuse_hunks(
+            memo, hunk_keys, inputs, outputs, interactive, metrics
+        )
+    metrics.count("hunks.reused", hunk_stats["reused"])
+
     low_confidence_samples = [
-        i
-        for i, d in zip(inputs, predictions)
-        if (not d["is_code_omission"] and d["confidence"] < 0.9)
-        or (d["is_code_omission"] and d["confidence"] > 0.1)
+        inputs[i]
+        for i, output in outputs.items()
+        if i not in reused and is_uncertain(output["naive"])
     ]
+    if on_review is not None and (interactive or fast):
+        for row in _inputs_for_humans(
+            inputs, outputs, low_confidence_samples, reused, interactive
+        ):
+            on_review(row)
+
+    def review_disagreements(predictions: List[dict]) -> None:
+        for prediction in predictions:
+            i = prediction["_id"]
+            naive = outputs[i]["naive"]
+            if prediction["is_code_omission"] != naive["is_code_omission"]:
+                on_review({"_id": i, "_diff": inputs[i]["_diff"]})
+
+    # Local Model - Decide the segments it is confident about on CPU
+    local_model = get_local_model(config)
+    llm_samples = low_confidence_samples
+    if not fast and local_model is not None and local_model.trained:
+        with metrics.stage("local"):
+            llm_samples = _run_local_model(
+                local_model, low_confidence_samples, table, inputs, outputs, config
+            )
+        metrics.count("local.segments", len(low_confidence_samples) - len(llm_samples))
 
-    # LLM Model - Use LLM Model to predict code omissions
-    disagreements = []
+    # LLM Model - Use LLM Model to predict code omissions, within the budgets
+    disagreements = None
+    cache_stats = {"hits": 0, "misses": 0}
     if not fast:
-        llm_outputs = run_llm_model(config, diffs, low_confidence_samples)
+        llm_model = LLMModel(config=config, metrics=metrics)
+        schedule = schedule_llm(llm_samples, outputs, table, llm_model, config)
+        deadline = None
+        if config.llm_deadline is not None:
+            deadline = time.monotonic() + config.llm_deadline
+        with metrics.stage("llm"):
+            llm_outputs = run_llm_model(
+                config,
+                diffs,
+                schedule.send,
+                model=llm_model,
+                deadline=deadline,
+                on_results=(
+                    review_disagreements
+                    if on_review is not None and not interactive
+                    else None
+                ),
+            )
+        # Over the budget or past the deadline: the Greedy (or local) verdict stands
+        deferred = schedule.deferred + [
+            sample for sample in schedule.send if sample["_id"] not in llm_outputs
+        ]
+        for sample in deferred:
+            outputs[sample["_id"]]["deferred"] = True
+        cache_stats = llm_model.cache_stats()
+        metrics.count("llm.segments", len(schedule.send))
+        metrics.count("llm.deferred", len(deferred))
+        metrics.count("llm.cache_hits", cache_stats["hits"])
+        metrics.count("llm.cache_misses", cache_stats["misses"])
         for i, output in llm_outputs.items():
             outputs[i]["llm"] = output
 
@@ -79,7 +286,8 @@ def merge(
             i
             for i, output in outputs.items()
             if (
-                "llm" in output
+                i not in reused
+                and "llm" in output
                 and "naive" in output
                 and output["llm"]["is_code_omission"]
                 != output["naive"]["is_code_omission"]
@@ -87,62 +295,225 @@ def merge(
         ]
 
     # Human in the Loop - Prompt user to resolve code omissions
+    return Classification(
+        inputs=inputs,
+        outputs=outputs,
+        inputs_for_humans=_inputs_for_humans(
+            inputs, outputs, low_confidence_samples, reused, interactive, disagreements
+        ),
+        cache_stats=cache_stats,
+        memo=memo,
+        hunk_keys=hunk_keys,
+        hunk_stats=hunk_stats,
+        metrics=metrics,
+        table=table,
+        local_model=local_model,
+    )
+
+
+def _reuse_hunks(
+    memo: HunkMemo,
+    hunk_keys: List[str],
+    inputs: List[dict],
+    outputs: Dict[int, dict],
+    interactive: bool,
+    metrics: Metrics,
+) -> Tuple[set, dict]:
+    """Fill `outputs` from the memo, returning the reused segments and hunk counts
+
+    A broad review asks about every uncertain segment, so it only reuses the hunks
+    whose uncertain segments a human already labeled, not those of a `--yes` run.
+    """
+    accept = _human_reviewed if interactive else None
+    with metrics.stage("memo"):
+        known = {k: memo.get(key, accept) for k, key in enumerate(hunk_keys)}
+    reused = set()
+    for i, row in enumerate(inputs):
+        if (hunk_outputs := known[row["_diff_index"]]) is not None:
+            outputs[i] = hunk_outputs[row["_segment_index"] - 1]
+            reused.add(i)
+    reused_hunks = sum(hunk_outputs is not None for hunk_outputs in known.values())
+    return reused, {"reused": reused_hunks, "classified": len(known) - reused_hunks}
+
+
+def _run_local_model(
+    local_model: LocalModel,
+    samples: List[dict],
+    table: FeatureTable,
+    inputs: List[dict],
+    outputs: Dict[int, dict],
+    config: Config,
+) -> List[dict]:
+    """Set the local verdicts it is confident about, returning the other samples"""
+    undecided = []
+    for sample in samples:
+        i = sample["_id"]
+        probability = local_model.predict_proba(_local_features(table, inputs, i))
+        confidence = max(probability, 1 - probability)
+        if confidence >= config.local_model_confidence:
+            outputs[i]["local"] = {
+                "is_code_omission": probability >= 0.5,
+                "confidence": confidence,
+            }
+        else:
+            undecided.append(sample)
+    return undecided
+
+
+def _inputs_for_humans(
+    inputs: List[dict],
+    outputs: Dict[int, dict],
+    low_confidence_samples: List[dict],
+    reused: set,
+    interactive: bool,
+    disagreements: Optional[List[int]] = None,
+) -> List[dict]:
+    """The segments to review: all the uncertain ones when `interactive`, those the
+    LLM disagrees about when it ran (`disagreements`), else the Greedy positives
+    """
     if interactive:  # Broad: Loop on all eligible samples
-        inputs_for_humans = [
-            {"_id": i, "_diff": sample["_diff"]}
-            for i, sample in enumerate(low_confidence_samples)
-            if sample is not None
-        ]
-    elif not fast:  # Narrow: Loop only where disagreement between Greedy and LLM
-        inputs_for_humans = [
-            {"_id": i, "_diff": inputs[i]["_diff"]} for i in disagreements
-        ]
+        ids = [sample["_id"] for sample in low_confidence_samples]
+    elif disagreements is not None:  # Narrow: Disagreement between Greedy and LLM
+        ids = disagreements
     else:  # All the positive samples from Greedy model
-        inputs_for_humans = [
-            {"_id": i, "_diff": sample["_diff"]}
-            for i, sample in enumerate(low_confidence_samples)
-            if sample["is_code_omission"]
+        ids = [
+            i
+            for i, output in outputs.items()
+            if output["naive"]["is_code_omission"] and i not in reused
         ]
+    return [{"_id": i, "_diff": inputs[i]["_diff"]} for i in ids]
+
+
+def _human_reviewed(hunk_outputs: List[dict]) -> bool:
+    """Whether a human labeled every uncertain segment of a remembered hunk"""
+    return all(
+        "human" in output or not is_uncertain(output["naive"])
+        for output in hunk_outputs
+    )
+
+
+def _local_features(table: FeatureTable, inputs: List[dict], i: int) -> dict:
+    """The input of the local model for segment `i`"""
+    return {**table.row(i), "_curr_segment": inputs[i]["_curr_segment"]}
+
+
+def _classify_with_review(
+    diffs: CodeDiffs, config: Config, yes=False, **kwargs
+) -> Tuple[Classification, Optional[List[dict]]]:
+    """`_classify_segments`, and the human labels when the review ran alongside
+
+    With `config.pipelined_review` the segments are classified in a worker thread
+    while the human reviews the ones already known to need it, so the first diff
+    shows up without waiting for every LLM verdict. The labels are None when
+    nobody was asked yet, for `_review_and_merge` to ask.
+    """
+    if yes or not config.pipelined_review:
+        return _classify_segments(diffs, config=config, **kwargs), None
+
+    if kwargs.get("metrics") is None:
+        kwargs["metrics"] = Metrics()
+    metrics = kwargs["metrics"]
+    pending: queue.Queue = queue.Queue()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(
+            _classify_segments, diffs, config=config, on_review=pending.put, **kwargs
+        )
+        future.add_done_callback(lambda _: pending.put(None))
+        with metrics.stage("review"):
+            human_labels = labeling(
+                iter(pending.get, None),
+                label="is_code_omission",
+                default_confidence=0.99,
+            )
+        return future.result(), human_labels
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _review_and_merge(
+    new_code: str,
+    classification: Classification,
+    yes=False,
+    human_labels: Optional[List[dict]] = None,
+) -> Tuple[str, list, Optional[list]]:
+    """Ask the human about the uncertain segments and revert the code omissions
+
+    Pass the `human_labels` of a review that already took place to skip asking.
+    """
+    inputs = classification.inputs
+    outputs = classification.outputs
+    inputs_for_humans = classification.inputs_for_humans
+    metrics = classification.metrics
 
     if yes:
         human_labels = None
     else:
-        human_labels = labeling(
-            inputs_for_humans, label="is_code_omission", default_confidence=0.99
-        )
+        if human_labels is None:
+            with metrics.stage("review"):
+                human_labels = labeling(
+                    inputs_for_humans,
+                    label="is_code_omission",
+                    default_confidence=0.99,
+                )
+        metrics.count("review.labels", len(human_labels))
         for pred in human_labels:
             outputs[pred["_id"]]["human"] = {
                 k: v for k, v in pred.items() if k in ["is_code_omission", "confidence"]
             }
+        if human_labels and classification.local_model is not None:
+            with metrics.stage("local.fit"):
+                classification.local_model.learn(
+                    [
+                        _local_features(classification.table, inputs, pred["_id"])
+                        for pred in human_labels
+                    ],
+                    [pred["is_code_omission"] for pred in human_labels],
+                )
 
     determine_final_output(outputs)
+    if classification.memo is not None:
+        with metrics.stage("memo"):
+            _remember_hunks(classification)
 
     # Where 'final' outputs are True, replace the code with the omitted code
-    merged_code, change_log = _merge_code(new_file, inputs, outputs)
+    with metrics.stage("merge"):
+        merged_code, change_log = _merge_code(new_code, inputs, outputs)
 
-    if dry_run:
-        # Print the changes
-        print_changes(change_log)
-    else:
-        # Write the changes to the target file
-        target_file.write_text(merged_code)
+    return merged_code, change_log, human_labels
 
-    return {
-        "old_file": old_file,
-        "new_file": new_file,
-        "target_file": target_file,
-        "changes": change_log,
-        "labels": human_labels,
-    }
+
+def _remember_hunks(classification: Classification) -> None:
+    """Store the reviewed verdicts of every hunk in the memo, for the next merge
+
+    Hunks with segments deferred by the LLM budget are left out, so that the next
+    merge asks about them instead of reusing the fallback verdict.
+    """
+    hunk_outputs = defaultdict(list)
+    for i, row in enumerate(classification.inputs):
+        hunk_outputs[row["_diff_index"]].append(classification.outputs[i])
+    for k, key in enumerate(classification.hunk_keys):
+        if not any(_is_deferred(output) for output in hunk_outputs[k]):
+            classification.memo.set(key, hunk_outputs[k])
+
+
+def _is_deferred(output: dict) -> bool:
+    """Whether the segment's verdict fell back to the Greedy model for lack of budget"""
+    return output.get("deferred", False) and "human" not in output
 
 
 def run_llm_model(
     config: Config,
     diffs: CodeDiffs,
     inputs: list[dict],
+    model: Optional[LLMModel] = None,
+    deadline: Optional[float] = None,
+    on_results: Optional[Callable[[List[dict]], None]] = None,
 ):
-
-    llm_filtered_predictions = LLMModel(config=config).predict(inputs, code_diffs=diffs)
+    model = model or LLMModel(config=config)
+    llm_filtered_predictions = model.predict(
+        inputs, code_diffs=diffs, deadline=deadline, on_results=on_results
+    )
     outputs = defaultdict(dict)
     for pred in llm_filtered_predictions:
         outputs[pred["_id"]] = {
@@ -154,58 +525,121 @@ def run_llm_model(
 
 def determine_final_output(outputs: dict):
     """Merge Outputs - this is a naive way that ignores confidence
-    sets 'final' output based on the human, llm, or naive output (in that order)
+    sets 'final' output based on the human, llm, local or naive output (in that order)
     """
     for i, output in outputs.items():
         if "human" in output:
             outputs[i]["final"] = output["human"]
         elif "llm" in output:
             outputs[i]["final"] = output["llm"]
+        elif "local" in output:
+            outputs[i]["final"] = output["local"]
         else:
             outputs[i]["final"] = output["naive"]
 
 
-def _merge_code(new_file, inputs, outputs):
-    merged_code = new_file.read_text()
+def _merge_code(new_code, inputs, outputs):
+    """Splice the omitted code back in, in a single pass over the lines of new_code
+
+    Each accepted omission replaces the lines of its segment (located by the
+    `_new_lineno`/`_new_line_count` coordinates from the diff) with the previous
+    segment. Segments that are not in the new code (deletions) have nothing to
+    revert and are skipped.
+    """
+    lines = new_code.split("\n")
+
+    accepted = sorted(
+        (
+            i
+            for i, output in outputs.items()
+            if output["final"]["is_code_omission"] and inputs[i]["_new_line_count"] > 0
+        ),
+        key=lambda i: inputs[i]["_new_lineno"],
+    )
 
+    merged_lines = []
     change_log = []
-    for i, output in outputs.items():
-        if output["final"]["is_code_omission"]:
-            if merged_code.count(inputs[i]["_curr_segment"]) != 1:
-                raise ValueError("Code segment occurs more than once in the code")
+    position = 0
+    for i in accepted:
+        start = inputs[i]["_new_lineno"]
+        end = start + inputs[i]["_new_line_count"]
+        if start < position:
+            raise ValueError(f"Overlapping code omissions at line {start + 1}")
+        if "\n".join(lines[start:end]) != inputs[i]["_curr_segment"]:
+            raise ValueError(f"Code segment not found at line {start + 1}")
+
+        merged_lines.extend(lines[position:start])
+        merged_lines.append(inputs[i]["_prev_segment"])
+        position = end
+        change_log.append(
+            {
+                "confidence": outputs[i]["final"].get("confidence"),
+                "git_diff": inputs[i]["_diff"],
+                "omitted_code": inputs[i]["_curr_segment"],
+                "replaced_code": inputs[i]["_prev_segment"],
+                # Decided without the LLM, whose budget ran out
+                "deferred": _is_deferred(outputs[i]),
+            }
+        )
+    merged_lines.extend(lines[position:])
 
-            merged_code = merged_code.replace(
-                inputs[i]["_curr_segment"], inputs[i]["_prev_segment"]
-            )
-            change_log.append(
-                {
-                    "confidence": output["final"].get("confidence"),
-                    "git_diff": inputs[i]["_diff"],
-                    "omitted_code": inputs[i]["_curr_segment"],
-                    "replaced_code": inputs[i]["_prev_segment"],
-                }
-            )
+    return "\n".join(merged_lines), change_log
+
+
+class SegmentInput(Mapping):
+    """The input row of one segment, whose code is only rendered when read
+
+    Most rows are settled by the Greedy model from their numeric features, so the
+    `_prev_segment`, `_curr_segment` and `_diff` strings are only built (once) for
+    the rows that reach the LLM, a human or the change log.
+    """
+
+    __slots__ = ("_diffs", "_fields")
+
+    LAZY_FIELDS = ("_prev_segment", "_curr_segment", "_diff")
+
+    def __init__(self, diffs: CodeDiffs, fields: dict):
+        self._diffs = diffs
+        self._fields = fields
+
+    def _render(self, key: str) -> str:
+        i, j = self._fields["_diff_index"], self._fields["_segment_index"]
+        segments = self._diffs.changes[i].segments
+        if key == "_prev_segment":
+            return segments[j - 1].text
+        if key == "_curr_segment":
+            return segments[j].text
+        return code_diff_around_segment(self._diffs, i, j)
+
+    def __getitem__(self, key: str):
+        if key not in self._fields and key in self.LAZY_FIELDS:
+            self._fields[key] = self._render(key)
+        return self._fields[key]
 
-    return merged_code, change_log
+    def __iter__(self):
+        yield from self._fields
+        yield from (key for key in self.LAZY_FIELDS if key not in self._fields)
 
+    def __len__(self) -> int:
+        return len(set(self._fields).union(self.LAZY_FIELDS))
 
-def build_inputs(diffs):
-    inputs = [
-        {
-            "_id": None,  # Counter to be added later
+    def __repr__(self) -> str:
+        return f"SegmentInput({self._fields!r})"
+
+
+def build_inputs(diffs: CodeDiffs) -> List[SegmentInput]:
+    inputs = []
+    for i, j, new_lineno in iter_segments(diffs):
+        segment = diffs.changes[i].segments[j]
+        fields = {
+            "_id": len(inputs),
             "_diff_index": i,
             "_segment_index": j,
-            "_prev_segment": "\n".join(diffs.changes[i].segments[j - 1].content),
-            "_curr_segment": "\n".join(diffs.changes[i].segments[j].content),
-            "_diff": code_diff_around_segment(diffs, i, j),
+            "_new_lineno": new_lineno,
+            "_new_line_count": len(segment) if segment.type != "deletion" else 0,
             **(segment.features or {}),
         }
-        for i, diff in enumerate(diffs.changes)
-        for j, segment in enumerate(diff.segments)
-        if j > 0
-    ]
-    for counter, i in enumerate(inputs):
-        i["_id"] = counter
+        inputs.append(SegmentInput(diffs, fields))
     return inputs
 
 
@@ -215,10 +649,22 @@ def merge_all(
     fast=False,
     interactive=False,
     dry_run=False,
+    jobs: int = 1,
+    metrics: Optional[Metrics] = None,
     **kwargs,
 ) -> dict:
+    """Merge every file with staged changes
+
+    With `jobs > 1` the files are classified (features, Greedy and LLM models) in a
+    pool of `jobs` workers, while human review and file writes stay serialized in the
+    order of the diff. With a single job, each file's review starts while its
+    segments are still being classified. Each file reports its own "metrics", and
+    `metrics` collects those of the whole run.
+    """
     if config is None:
-        config = Config.create()
+        config = get_config()
+    if metrics is None:
+        metrics = Metrics()
 
     # Assert that git is installed and that we are inside a git repo
     if not config.git_installed:
@@ -226,28 +672,200 @@ def merge_all(
     if not is_git_repo():
         raise RuntimeError("Not inside a git repository")
 
-    # Get list of changed files
-    changed_files = get_changed_files()
+    memo = get_hunk_memo(config)
+
+    def classify(file: str, diffs: CodeDiffs) -> Classification:
+        return _classify_segments(
+            diffs,
+            config=config,
+            fast=fast,
+            interactive=interactive,
+            memo=memo,
+            metrics=metrics.child(file),
+        )
+
+    def classify_with_review(file: str, diffs: CodeDiffs):
+        return _classify_with_review(
+            diffs,
+            config=config,
+            yes=yes,
+            fast=fast,
+            interactive=interactive,
+            memo=memo,
+            metrics=metrics.child(file),
+        )
 
     results = {}
-    for file in changed_files:
-        try:
-            results[file] = merge(
-                old_file=None,
-                new_file=file,
-                target_file=file,
-                config=config,
-                yes=yes,
-                fast=fast,
-                interactive=interactive,
-                dry_run=dry_run,
-                **kwargs,
-            )
-        except Exception as e:
-            results[file] = {"error": str(e)}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        # A single `git diff` for the whole tree, parsed file by file as it is read
+        # so that a file that fails to parse only fails its own merge
+        file_diffs, futures = [], {}
+        for path, file_lines in metrics.iter_stage(
+            "diff", split_git_diff_lines(stream_all_staged_changes())
+        ):
+            try:
+                diffs = parse_git_diff(file_lines)
+            except Exception as e:
+                results[path] = {"error": str(e)}
+                continue
+            if diffs.new_file == "/dev/null":
+                continue  # Deleted files have nothing to merge into
+            file = diff_file_path(diffs.new_file)
+            file_diffs.append((file, diffs))
+            if jobs > 1:
+                futures[file] = executor.submit(classify, file, diffs)
+
+        for file, diffs in file_diffs:
+            try:
+                if futures:
+                    classification, human_labels = futures[file].result(), None
+                else:
+                    classification, human_labels = classify_with_review(file, diffs)
+                results[file] = _apply_merge(
+                    None,
+                    Path(file),
+                    Path(file),
+                    classification,
+                    yes=yes,
+                    dry_run=dry_run,
+                    human_labels=human_labels,
+                )
+            except Exception as e:
+                results[file] = {"error": str(e)}
     return results
 
 
+def merge_pasted(
+    files: List[Tuple[str, str]],
+    root: Optional[Path] = None,
+    config: Optional[Config] = None,
+    yes=False,
+    fast=False,
+    interactive=False,
+    dry_run=False,
+    jobs: int = 4,
+    diff_backend: Optional[str] = None,
+    metrics: Optional[Metrics] = None,
+) -> dict:
+    """Merge the new code of several files, e.g. from `paste.parse_code_blocks`
+
+    `files` are (path relative to `root`, new code) pairs. Like in `merge_all`,
+    they are classified in a pool of `jobs` workers sharing the config (and so the
+    LLM client and rate limiter), while human review stays serialized in the order
+    of `files`. Files that do not exist yet are created with the new code. Each file
+    is diffed with `diff_backend`, by default the config's.
+
+    The merged files are written at once, and only if every file merged: each
+    goes to a temporary file next to its target, then replaces it. Each result
+    has the "seconds" the file took, "created" and "written".
+    """
+    if config is None:
+        config = get_config()
+    if metrics is None:
+        metrics = Metrics()
+    root = Path(root or Path.cwd()).resolve()
+    memo = get_hunk_memo(config)
+    diff_backend = diff_backend or config.diff_backend
+
+    def classify(
+        path: str, new_code: str
+    ) -> Tuple[Path, Optional[Classification], float]:
+        start = time.perf_counter()
+        target_file = (root / path).resolve()
+        if root not in target_file.parents:
+            raise ValueError(f"{path} is outside of {root}")
+        if not target_file.exists():
+            return target_file, None, time.perf_counter() - start
+        file_metrics = metrics.child(path)
+        with file_metrics.stage("diff"):
+            diffs = _diff_pasted(target_file, new_code, diff_backend)
+        classification = _classify_segments(
+            diffs,
+            config=config,
+            fast=fast,
+            interactive=interactive,
+            memo=memo,
+            metrics=file_metrics,
+        )
+        return target_file, classification, time.perf_counter() - start
+
+    results, merged = {}, {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [executor.submit(classify, path, code) for path, code in files]
+        for (path, new_code), future in zip(files, futures):
+            try:
+                target_file, classification, seconds = future.result()
+                if classification is None:
+                    merged[target_file] = new_code
+                    results[path] = {
+                        "target_file": target_file,
+                        "changes": [],
+                        "created": True,
+                        "seconds": seconds,
+                    }
+                    continue
+                start = time.perf_counter()
+                merged_code, change_log, human_labels = _review_and_merge(
+                    new_code, classification, yes=yes
+                )
+                merged[target_file] = merged_code
+                results[path] = {
+                    "target_file": target_file,
+                    "changes": change_log,
+                    "labels": human_labels,
+                    "cache": classification.cache_stats,
+                    "hunks": classification.hunk_stats,
+                    "metrics": classification.metrics.as_dict(),
+                    "created": False,
+                    "seconds": seconds + time.perf_counter() - start,
+                }
+                if dry_run:
+                    print_changes(change_log)
+            except Exception as e:
+                results[path] = {"error": str(e)}
+
+    written = not dry_run and len(merged) == len(results)
+    if written:
+        with metrics.stage("write"):
+            _write_atomically(merged)
+    for updates in results.values():
+        if "error" not in updates:
+            updates["written"] = written
+    return results
+
+
+def _diff_pasted(target_file: Path, new_code: str, backend: str) -> CodeDiffs:
+    """Diff a file against new code held in memory, with the selected backend"""
+    if backend == "python":
+        return diff_code(target_file.read_text(), new_code)
+    diffs = CodeDiffs(old_file="", new_file="", changes=[])
+    with tempfile.TemporaryDirectory(prefix="lfg-") as tmp:
+        new_file = Path(tmp) / target_file.name
+        new_file.write_text(new_code)
+        for _ in iter_code_diffs(target_file, new_file, diffs, backend=backend):
+            pass
+    return diffs
+
+
+def _write_atomically(files: Dict[Path, str]) -> None:
+    """Write every file or none: all the contents go to temporary files first"""
+    staged = []
+    try:
+        for path, code in files.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.lfg-tmp")
+            tmp.write_text(code)
+            if path.exists():
+                shutil.copymode(path, tmp)
+            staged.append((tmp, path))
+    except BaseException:
+        for tmp, _ in staged:
+            tmp.unlink(missing_ok=True)
+        raise
+    for tmp, path in staged:
+        tmp.replace(path)
+
+
 def merge_code(
     old_code: str,
     new_code: str,
@@ -257,41 +875,41 @@ def merge_code(
     fast=False,
     interactive=False,
     dry_run=False,
+    memo: Optional[HunkMemo] = None,
+    metrics: Optional[Metrics] = None,
     **kwargs,
 ) -> Tuple[str, dict]:
     if config is None:
-        config = Config.create()
+        config = get_config()
+    if memo is None:
+        memo = get_hunk_memo(config)
+    if metrics is None:
+        metrics = Metrics()
 
     if not old_code or not new_code:
         raise ValueError("Both old_code and new_code must be provided")
 
-    file_type_suffix = file_type_suffix or None
-
-    new_file = Path(tempfile.mkstemp(prefix="lfg-", suffix=file_type_suffix)[1])
-    old_file = Path(tempfile.mkstemp(prefix="lfg-", suffix=file_type_suffix)[1])
-    target_file = Path(tempfile.mkstemp(prefix="lfg-", suffix=file_type_suffix)[1])
-
-    with open(new_file, "w") as file:
-        file.write(new_code)
-    with open(old_file, "w") as file:
-        file.write(old_code)
-
-    updates = merge(
-        old_file,
-        new_file,
-        target_file,
+    # Both versions are already in memory, so diff them in-process
+    with metrics.stage("diff"):
+        diffs = diff_code(old_code, new_code)
+    classification, human_labels = _classify_with_review(
+        diffs,
         config=config,
         yes=yes,
         fast=fast,
         interactive=interactive,
-        dry_run=dry_run,
-        **kwargs,
+        memo=memo,
+        metrics=metrics,
+    )
+    output, change_log, human_labels = _review_and_merge(
+        new_code, classification, yes=yes, human_labels=human_labels
     )
-    output = target_file.read_text()
-    target_file.unlink()
-    new_file.unlink()
-    old_file.unlink()
+    if dry_run:
+        print_changes(change_log)
     return output, {
-        "changes": updates["changes"],
-        "labels": updates["labels"],
+        "changes": change_log,
+        "labels": human_labels,
+        "cache": classification.cache_stats,
+        "hunks": classification.hunk_stats,
+        "metrics": metrics.as_dict(),
     }
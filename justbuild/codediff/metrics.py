@@ -0,0 +1,194 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TypeVar, Union
+
+from rich.console import Console
+from rich.table import Table
+
+T = TypeVar("T")
+
+# Upper bounds (seconds) of the latency histogram buckets, the last one is open
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metrics:
+    """Stage timings, counters and histograms of one merge
+
+    Stages are timed spans (a stage can run several times, e.g. once per hunk) that
+    add up to a total per stage, and are kept for `chrome_trace`. A Metrics with a
+    `parent` also records everything in the parent, so a run over many files can be
+    summarized as a whole. Safe to share between threads.
+    """
+
+    def __init__(self, parent: Optional["Metrics"] = None, label: str = ""):
+        self.parent = parent
+        self.label = label
+        self.origin = parent.origin if parent else time.perf_counter()
+        self.stages: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.counters: Dict[str, float] = defaultdict(int)
+        self.histograms: Dict[str, List[float]] = defaultdict(list)
+        self.spans: List[dict] = []
+        self._lock = threading.Lock()
+
+    def child(self, label: str) -> "Metrics":
+        return Metrics(parent=self, label=label)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_span(name, start, time.perf_counter(), self.label)
+
+    def iter_stage(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yield from `iterable`, timing the production of each item as `name`
+
+        For streams (e.g. a `git diff` pipe) whose items are consumed as they come,
+        so that the consumer's work is not counted in the stage.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._add_span(name, start, time.perf_counter(), self.label)
+                return
+            self._add_span(name, start, time.perf_counter(), self.label)
+            yield item
+
+    def _add_span(self, name: str, start: float, end: float, label: str) -> None:
+        with self._lock:
+            stage = self.stages[name]
+            stage[0] += 1
+            stage[1] += end - start
+            self.spans.append(
+                {
+                    "name": name,
+                    "start": start,
+                    "end": end,
+                    "thread": threading.get_ident(),
+                    "label": label,
+                }
+            )
+        if self.parent is not None:
+            self.parent._add_span(name, start, end, label)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+        if self.parent is not None:
+            self.parent.count(name, value)
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self.histograms[name].append(value)
+        if self.parent is not None:
+            self.parent.observe(name, value)
+
+    def as_dict(self) -> dict:
+        """JSON-ready summary: {"stages", "counters", "histograms"}"""
+        with self._lock:
+            return {
+                "stages": {
+                    name: {"calls": calls, "seconds": seconds}
+                    for name, (calls, seconds) in self.stages.items()
+                },
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: _summarize(values) for name, values in self.histograms.items()
+                },
+            }
+
+    def chrome_trace(self) -> dict:
+        """The spans as Chrome trace events (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {
+                    "name": span["name"],
+                    "cat": "lfg",
+                    "ph": "X",
+                    "ts": (span["start"] - self.origin) * 1e6,
+                    "dur": (span["end"] - span["start"]) * 1e6,
+                    "pid": pid,
+                    "tid": span["thread"],
+                    "args": {"file": span["label"]} if span["label"] else {},
+                }
+                for span in self.spans
+            ]
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": self.as_dict(),
+        }
+
+    def dump(self, path: Union[str, Path]) -> None:
+        Path(path).write_text(json.dumps(self.chrome_trace()))
+
+
+def _summarize(values: List[float]) -> dict:
+    values = sorted(values)
+    buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+    for value in values:
+        buckets[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+    labels = [f"<={bound}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+    return {
+        "count": len(values),
+        "sum": sum(values),
+        "min": values[0],
+        "p50": _percentile(values, 0.5),
+        "p90": _percentile(values, 0.9),
+        "p99": _percentile(values, 0.99),
+        "max": values[-1],
+        "buckets": dict(zip(labels, buckets)),
+    }
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def print_profile(summary: dict, console: Optional[Console] = None) -> None:
+    """Print a `Metrics.as_dict()` summary as tables"""
+    console = console or Console()
+    total = sum(stage["seconds"] for stage in summary["stages"].values()) or 1.0
+
+    stages = Table(title="LFG Profile", box=None)
+    stages.add_column("Stage", style="cyan", no_wrap=True)
+    stages.add_column("Calls", justify="right")
+    stages.add_column("Seconds", justify="right", style="magenta")
+    stages.add_column("%", justify="right")
+    for name, stage in sorted(
+        summary["stages"].items(), key=lambda item: -item[1]["seconds"]
+    ):
+        stages.add_row(
+            name,
+            str(stage["calls"]),
+            f"{stage['seconds']:.4f}",
+            f"{100 * stage['seconds'] / total:.1f}",
+        )
+    console.print(stages)
+
+    if summary["counters"]:
+        counters = Table(box=None)
+        counters.add_column("Counter", style="cyan", no_wrap=True)
+        counters.add_column("Value", justify="right", style="magenta")
+        for name, value in sorted(summary["counters"].items()):
+            counters.add_row(name, f"{value:g}")
+        console.print(counters)
+
+    for name, histogram in summary["histograms"].items():
+        console.print(
+            f"[cyan]{name}[/cyan] n={histogram['count']} "
+            + " ".join(
+                f"{q}={histogram[q]:.3f}s" for q in ("min", "p50", "p90", "p99", "max")
+            )
+        )
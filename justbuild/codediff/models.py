@@ -1,10 +1,30 @@
-import re
-from typing import List
+from typing import Dict, List, Tuple
 
-import tqdm
+from justbuild.codediff.features import CHANGE_SEQUENCE_TYPES, FeatureTable
 
-from justbuild.codediff.git_diff_calculations import CodeDiffs
-from justbuild.config import Config
+
+def is_uncertain(verdict: dict) -> bool:
+    """Whether a Greedy verdict is unsure enough to ask the other models"""
+    if verdict["is_code_omission"]:
+        return verdict["confidence"] > 0.1
+    return verdict["confidence"] < 0.9
+
+
+def _score(
+    sequence_type: str, size: int, prev_size: int, ellipsis: bool, comment: bool
+) -> Tuple[bool, float]:
+    """The Greedy rule: (is_code_omission, confidence) of a segment"""
+    # Per the definition of a code omission, we are looking for 'replaced_previous' changes
+    if sequence_type != "replaced_previous":
+        return False, 0.95
+
+    # A common false positive for the LLM model
+    if size >= prev_size and size >= 3:
+        return False, 0.90
+
+    # Common predictive features for code omissions
+    fcast = size == 1 and prev_size > 5 and bool(ellipsis or comment)
+    return fcast, 0.3 + 0.6 * float(fcast)
 
 
 class GreedyModel:
@@ -17,26 +37,14 @@ class GreedyModel:
         pass  # no training required
 
     def _formula(self, features: dict) -> dict:
-        # Per the definition of a code omission, we are looking for 'replaced_previous' changes
-        if features.get("change_sequence_type") != "replaced_previous":
-            return {"is_code_omission": False, "confidence": 0.95}
-
-        # A common false positive for the LLM model
-        if (
-            features.get("segment_size") >= features.get("prev_segment_size")
-        ) and features.get("segment_size") >= 3:
-            return {"is_code_omission": False, "confidence": 0.90}
-
-        # Common predictive features for code omissions
-        fcast = (
-            features.get("segment_size") == 1
-            and features.get("prev_segment_size") > 5
-            and (features.get("has_ellipsis") or features.get("has_comment"))
+        is_code_omission, confidence = _score(
+            features.get("change_sequence_type"),
+            features.get("segment_size"),
+            features.get("prev_segment_size"),
+            features.get("has_ellipsis"),
+            features.get("has_comment"),
         )
-        return {
-            "is_code_omission": fcast,
-            "confidence": 0.3 + 0.6 * float(fcast),
-        }
+        return {"is_code_omission": is_code_omission, "confidence": confidence}
 
     def predict(self, features: List[dict]) -> List[dict]:
         return [
@@ -48,3 +56,19 @@ class GreedyModel:
             }
             for d in features
         ]
+
+    def predict_batch(self, table: FeatureTable) -> Dict[str, list]:
+        """`_formula` over every row of a FeatureTable, returned as two columns"""
+        is_code_omission, confidence = [], []
+        for sequence_code, size, prev_size, ellipsis, comment in zip(
+            table.change_sequence_type,
+            table.segment_size,
+            table.prev_segment_size,
+            table.has_ellipsis,
+            table.has_comment,
+        ):
+            sequence_type = CHANGE_SEQUENCE_TYPES[sequence_code]
+            fcast, score = _score(sequence_type, size, prev_size, ellipsis, comment)
+            is_code_omission.append(fcast)
+            confidence.append(score)
+        return {"is_code_omission": is_code_omission, "confidence": confidence}
@@ -1,193 +1,111 @@
+import asyncio
 import concurrent.futures
+import json
+import math
 import re
-from typing import List
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
+import openai
 import tqdm
 
 from justbuild.codediff.git_diff_calculations import CodeDiffs
+from justbuild.codediff.llm_cache import VerdictCache, get_verdict_cache, verdict_key
+from justbuild.codediff.metrics import Metrics
+from justbuild.codediff.prompts import (  # noqa: F401
+    ANSWER_SYSTEM_PROMPT,
+    BATCH_SYSTEM_PROMPT,
+    PLACEHOLDER_GUIDE,
+    SYSTEM_PROMPT,
+    system_prompt,
+    user_message,
+)
+from justbuild.codediff.rate_limit import backoff_delay, get_rate_limiter, run_coroutine
 from justbuild.config import Config
 
-SYSTEM_PROMPT = """Analyze the following `git diff` output to determine if the original code was replaced with a "Placeholder Comment":
-
-### Definition of a Placeholder Comment
-A placeholder comment is a descriptive note within the code that indicates a section of the code is intentionally omitted or remains unchanged, often represented by ellipsis or specific text.
-
-### Checklist to Identify Placeholder Comments in a `git diff`
-
-1. **Ellipsis (`...`) Usage**:
-   - Look for ellipsis within the comment, which often signifies omitted code.
-
-2. **Descriptive Text**:
-   - Check if the comment contains text that describes the omitted code or indicates that the content remains unchanged (e.g., "form content remains the same").
-
-3. **Contextual Placement**:
-   - Ensure the comment is placed in a logical location where significant code blocks would typically exist (e.g., within a form, function, or component).
-
-4. **Consistency with Surrounding Code**:
-   - Verify that the comment is consistent with the surrounding code structure, suggesting it is a placeholder for more detailed implementations.
-
-5. **Purpose Indication**:
-   - Determine if the comment clearly indicates its purpose, such as explaining the functionality or section of the code that is not shown.
-
-6. **Length Differences**:
-   - There are a significant number of lines in the original code that are missing in the new code, indicating a placeholder comment.
-   - The new code is much shorter than the original code, suggesting omitted content.
-
-7. **Code Omission Indicators**:
-    - Look for specific phrases like "Code Was Here" or "rest of the previous code remains the same" that are commonly used as placeholders.
-
-8. **Code Comments**:
-    - The majority of the new code in the diff is comments or placeholder text.
-
-### Samples of Placeholder Comments
-
- - `# ... (SYSTEM_PROMPT remains unchanged)`
- - `# ... (This method remains unchanged)`
- - `// ... (previous handler functions remain the same)`
- - `// ... (previous hotkey handlers remain the same)`
- - `// ... (rest of the previous code remains the same)`
- - `// ... (previous state and handlers remain the same)`
- - `// ... (previous imports and code remain the same)`
- - `{/* ... (previous content remains the same) */}`
-
-### Example of a Placeholder Comment in a `git diff`
-```diff
--                <div className="flex items-center border-2 border-gray-300 rounded-lg p-2">
--                    <input
--                        ref={inputRef}
--                        name="input"
--                        type="text"
--                        value={input}
--                        onChange={(e) => setInput(e.target.value)}
--                        className="flex-grow outline-none"
--                        placeholder="What should we brainstorm today?"
--                    />
--                    <button
--                        type="button"
--                        onClick={handleVoiceInput}
--                        className={`mx-2 ${isRecording ? "text-red-500" : "text-gray-500"}`}
--                    >
--                        <MicIcon size={20} />
--                    </button>
--                    <button
--                        type="button"
--                        onClick={handleAttachment}
--                        className="mx-2 text-gray-500"
--                    >
--                        <PaperclipIcon size={20} />
--                    </button>
--                    <button
--                        type="submit"
--                        className="text-blue-500"
--                        disabled={fetcher.state === "submitting"}
--                    >
--                        <SendIcon size={20} />
--                    </button>
--                </div>
-+                {/* ... (form content remains the same) ... */}
-```
-Response: yes
-
-### Negative Example: Not a Placeholder Comment in a `git diff`
-```diff
- } from "~/models/brainstorm.server";
- import invariant from "tiny-invariant";
-
--import DynamicComponent from '~/components/DynamicComponent';
-+import DynamicComponent from "~/components/DynamicComponent";
-+import { Button } from "~/components/ui/button";
-+import {
-+    DropdownMenu,
-+    DropdownMenuContent,
-+    DropdownMenuItem,
-+    DropdownMenuTrigger,
-+} from "~/components/ui/dropdown-menu";
-+import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from "~/components/ui/dialog";
-
- interface BrainstormingBotPageProps {
-     currentBrainstorm: BrainstormSession;
-```
-Response: no
-
-### Negative Example: Not a Placeholder Comment in a `git diff`
-```
-     return (
--        <div className="flex flex-col h-screen p-4">
-+        <div className="flex flex-col p-4">
-+            {/* Header */}
-             <h1 className="text-2xl font-bold mb-4">
-                 Task: {currentBrainstorm.title}
-             </h1>
-```
-Response: no
-
-### Negative Example: Not a Placeholder Comment in a `git diff`
-```diff
-             </div>
-
--            {/* Display brainstorming results here */}
--            <div className="border-2 border-gray-300 rounded-lg p-2 flex-grow overflow-y-auto">
--                {samples &&
--                    samples?.map((input: any, index: number) => (
--                        <DynamicComponent
--                            componentName={activeDataView}
--                            key_name={index}
--                            props={{
--                                data: input
--                            }}
--                        />
--                    ))}
-+            {/* Scrollable results area */}
-+            <div className="flex-grow overflow-y-auto">
-+                <div className="border-2 border-gray-300 rounded-lg p-2 mb-4">
-+                    {samples &&
-+                        samples?.map((input: any, index: number) => (
-+                            <DynamicComponent
-+                                componentName={activeDataView}
-+                                key_name={index}
-+                                props={{
-+                                    data: input,
-+                                }}
-+                            />
-+                        ))}
-+                </div>
-             </div>
-```
-Response: no
-
-By following this checklist, you can effectively identify placeholder comments in a `git diff` and understand their purpose within the code.
-
-Think step by step about the context of the code and the purpose of the diff to determine if the new code is a placeholder for the original code.
-
-Start your response with a list of the features you identified in the diff, followed by your answer to the question below.
-
-Your answer must end with 'yes' or 'no' to indicate whether the new code is a placeholder comment for the original code."""
+# 429s, 5xx and dropped connections are worth retrying, other API errors are not
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+)
 
 
 class LLMModel:
-
-    def __init__(self, config: Config, **kwargs):
+    def __init__(
+        self,
+        config: Config,
+        cache: Optional[VerdictCache] = None,
+        metrics: Optional[Metrics] = None,
+        **kwargs,
+    ):
         self.config = config
         self.params = kwargs
+        # Request latencies, token usage and retries
+        self.metrics = metrics if metrics is not None else Metrics()
+        if cache is None and config.cache_enabled:
+            cache = get_verdict_cache(
+                config.cache_path,
+                max_entries=config.cache_max_entries,
+                max_age_days=config.cache_max_age_days,
+            )
+        self.cache = cache
+        # The cache can be shared with other models, only count this model's lookups
+        self._cache_baseline = cache.stats() if cache else {"hits": 0, "misses": 0}
 
     def fit(self, *args) -> None:  # noqa
         pass
 
-    def _request(self, feature: dict, code_diffs: CodeDiffs) -> dict:
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"hits": 0, "misses": 0}
+        return {
+            name: count - self._cache_baseline[name]
+            for name, count in self.cache.stats().items()
+        }
 
-        user_message = f"""```diff
-{feature['_diff']}
-```
-Is the following line a placeholder comment for the original code? (yes/no)
-```
-{feature.get("_curr_segment","")}
-```
-"""
+    def _request(self, feature: dict, code_diffs: CodeDiffs) -> dict:
+        user_message = self._user_message(feature)
         # if "loader implementation remains the same" in feature.get("_curr_segment", ""):
         #     return {"confidence": 0.95, "is_code_omission": True}
-        result = self.config.client.chat.completions.create(
+        if self.cache is None:
+            return self._complete(user_message)
+
+        key = self._cache_key(user_message)
+        if (verdict := self.cache.get(key)) is None:
+            verdict = self._complete(user_message)
+            self.cache.set(key, verdict)
+        return verdict
+
+    async def _arequest(self, feature: dict, code_diffs: CodeDiffs) -> dict:
+        user_message = self._user_message(feature)
+        if self.cache is None:
+            return await self._acomplete(user_message)
+
+        key = self._cache_key(user_message)
+        if (verdict := self.cache.get(key)) is None:
+            verdict = await self._acomplete(user_message)
+            self.cache.set(key, verdict)
+        return verdict
+
+    def _user_message(self, feature: dict) -> str:
+        return user_message(feature)
+
+    def _system_prompt(self) -> str:
+        return system_prompt(self.config.llm_verbose)
+
+    def _cache_key(self, user_message: str) -> str:
+        return verdict_key(
+            self._system_prompt(),
+            self.config.model_name,
+            self.config.model_temperature,
+            user_message,
+        )
+
+    def _completion_kwargs(self, user_message: str) -> dict:
+        kwargs = dict(
             messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "system", "content": self._system_prompt()},
                 {"role": "user", "content": user_message},
             ],
             model=self.config.model_name,
@@ -196,11 +114,103 @@ Is the following line a placeholder comment for the original code? (yes/no)
             stop=None,
             temperature=self.config.model_temperature,
         )
+        if not self.config.llm_verbose:
+            # A single answer token; its logprobs give the confidence
+            kwargs.update(max_tokens=1, logprobs=True, top_logprobs=5)
+        return kwargs
+
+    def _complete(self, user_message: str) -> dict:
+        return self._parse_completion(
+            self._create(self._completion_kwargs(user_message))
+        )
+
+    async def _acomplete(self, user_message: str) -> dict:
+        return self._parse_completion(
+            await self._acreate(self._completion_kwargs(user_message))
+        )
+
+    def _create(self, kwargs: dict):
+        start = time.perf_counter()
+        result = self.config.client.chat.completions.create(**kwargs)
+        self._record_request(result, time.perf_counter() - start)
+        return result
+
+    def _record_request(self, result, seconds: float) -> None:
+        self.metrics.count("llm.requests")
+        self.metrics.observe("llm.latency", seconds)
+        usage = getattr(result, "usage", None)
+        for name in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if (tokens := getattr(usage, name, None)) is not None:
+                self.metrics.count(f"llm.{name}", tokens)
+        if usage is not None:
+            self.metrics.count(
+                "llm.cost",
+                self._cost(
+                    getattr(usage, "prompt_tokens", 0) or 0,
+                    getattr(usage, "completion_tokens", 0) or 0,
+                ),
+            )
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """USD for that many tokens at the config's prices"""
+        return (
+            prompt_tokens * self.config.prompt_token_cost
+            + completion_tokens * self.config.completion_token_cost
+        ) / 1_000_000
+
+    def estimate_cost(self, feature: dict) -> float:
+        """Upper bound of the USD cost of asking about `feature` on its own"""
+        kwargs = self._completion_kwargs(self._user_message(feature))
+        prompt_tokens = sum(len(m["content"]) for m in kwargs["messages"]) // 4
+        return self._cost(prompt_tokens, kwargs["max_tokens"])
+
+    def is_cached(self, feature: dict) -> bool:
+        """Whether the verdict of `feature` is cached, so asking about it is free"""
+        if self.cache is None:
+            return False
+        if self._cache_key(self._user_message(feature)) in self.cache:
+            return True
+        return self.config.llm_batching and self._batch_key(feature) in self.cache
+
+    async def _acreate(self, kwargs: dict):
+        """Async request behind the process-wide rate limiter, retrying 429/5xx"""
+        limiter = get_rate_limiter(
+            self.config.max_concurrent_requests,
+            self.config.requests_per_minute,
+            self.config.tokens_per_minute,
+            key=f"{self.config.backend}:{self.config.base_url}",
+        )
+        tokens = _estimate_tokens(kwargs)
+        for attempt in range(self.config.max_retries + 1):
+            await limiter.acquire(tokens)
+            start = time.perf_counter()
+            try:
+                result = await self.config.async_client.chat.completions.create(
+                    **kwargs
+                )
+                self._record_request(result, time.perf_counter() - start)
+                return result
+            except RETRYABLE_ERRORS:
+                if attempt == self.config.max_retries:
+                    self.metrics.count("llm.errors")
+                    raise
+                self.metrics.count("llm.retries")
+            finally:
+                limiter.release()
+            await asyncio.sleep(backoff_delay(attempt))
+
+    def _parse_completion(self, result) -> dict:
+        if not self.config.llm_verbose:
+            return self._parse_answer(result)
+
         if len(result.choices) == 0 or result.choices[0].finish_reason != "stop":
             raise RuntimeError("OpenAI API did not return a response")
 
-        if len(result.choices):
-            content = result.choices[0].message.content
+        return self._parse_reasoning(result.choices[0].message.content)
+
+    def _parse_reasoning(self, content: str) -> dict:
+        """Verdict from the last 'yes' or 'no' word of a free-text answer"""
+        if content:
             response = content.lower().split()[::-1]
             for w in response:
                 # remove punctuation
@@ -219,33 +229,241 @@ Is the following line a placeholder comment for the original code? (yes/no)
                     }
         return {"confidence": 0.95, "is_code_omission": False}
 
-    def predict(self, features: List[dict], code_diffs: CodeDiffs) -> List[dict]:
-        features = [f for f in features if f is not None]
+    def _parse_answer(self, result) -> dict:
+        """Verdict from a single yes/no token, with the confidence from its logprobs"""
+        # max_tokens=1 means the answer token usually ends with finish_reason 'length'
+        if len(result.choices) == 0 or result.choices[0].finish_reason not in (
+            "stop",
+            "length",
+        ):
+            raise RuntimeError("OpenAI API did not return a response")
+
+        choice = result.choices[0]
+        probabilities = {"yes": 0.0, "no": 0.0}
+        logprobs = getattr(choice, "logprobs", None)
+        if logprobs and logprobs.content:
+            for candidate in logprobs.content[0].top_logprobs or []:
+                token = re.sub(r"[^\w]", "", candidate.token).lower()
+                if token in probabilities:
+                    probabilities[token] += math.exp(candidate.logprob)
+
+        total = probabilities["yes"] + probabilities["no"]
+        if total == 0:
+            # No usable logprobs (e.g. not supported by the backend)
+            return self._parse_reasoning(choice.message.content)
+        return {
+            "confidence": max(probabilities.values()) / total,
+            "is_code_omission": probabilities["yes"] > probabilities["no"],
+        }
+
+    # Batched mode: many numbered diffs per request, answered as JSON
+
+    def _batches(self, features: List[dict]) -> List[List[dict]]:
+        """Pack features into batches that fit `llm_batch_token_budget`"""
+        if not self.config.llm_batching:
+            return [[f] for f in features]
+
+        batches, batch, batch_tokens = [], [], 0
+        for feature in features:
+            tokens = len(self._user_message(feature)) // 4
+            if batch and (
+                batch_tokens + tokens > self.config.llm_batch_token_budget
+                or len(batch) >= self.config.llm_max_batch_size
+            ):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(feature)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _batch_key(self, feature: dict) -> str:
+        return verdict_key(
+            BATCH_SYSTEM_PROMPT,
+            self.config.model_name,
+            self.config.model_temperature,
+            self._user_message(feature),
+        )
+
+    def _batch_lookup(self, batch: List[dict]) -> Tuple[Dict[int, dict], List[int]]:
+        """Cached verdicts by position in the batch, and the positions still to ask"""
+        verdicts = {}
+        for i, feature in enumerate(batch):
+            if self.cache and (verdict := self.cache.get(self._batch_key(feature))):
+                verdicts[i] = verdict
+        return verdicts, [i for i in range(len(batch)) if i not in verdicts]
+
+    def _batch_completion_kwargs(self, batch: List[dict], pending: List[int]) -> dict:
+        user_message = "\n".join(
+            f"Diff {n}:\n{self._user_message(batch[i])}"
+            for n, i in enumerate(pending, start=1)
+        )
+        return dict(
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": user_message},
+            ],
+            model=self.config.model_name,
+            max_tokens=20 + 10 * len(pending),
+            n=1,
+            stop=None,
+            temperature=self.config.model_temperature,
+        )
+
+    def _parse_batch_completion(
+        self, result, batch: List[dict], pending: List[int]
+    ) -> Dict[int, dict]:
+        """Verdicts by position in the batch; unparseable answers are left out"""
+        if len(result.choices) == 0 or result.choices[0].finish_reason != "stop":
+            return {}
+        content = result.choices[0].message.content or ""
+        try:
+            answers = json.loads(content[content.index("{") : content.rindex("}") + 1])
+        except ValueError:
+            return {}
+        if not isinstance(answers, dict):
+            return {}
+
+        verdicts = {}
+        for n, i in enumerate(pending, start=1):
+            answer = answers.get(str(n))
+            if isinstance(answer, str):
+                answer = {"yes": True, "no": False}.get(answer.strip().lower())
+            if not isinstance(answer, bool):
+                continue
+            verdicts[i] = {"confidence": 0.95, "is_code_omission": answer}
+            if self.cache:
+                self.cache.set(self._batch_key(batch[i]), verdicts[i])
+        return verdicts
+
+    def _predict_batch(self, batch: List[dict], code_diffs: CodeDiffs) -> List[dict]:
+        verdicts = {}
+        if len(batch) > 1:
+            verdicts, pending = self._batch_lookup(batch)
+            if pending:
+                result = self._create(self._batch_completion_kwargs(batch, pending))
+                verdicts.update(self._parse_batch_completion(result, batch, pending))
+        # Single features and anything the batch answer missed go one by one
         return [
-            {"_id": f["_id"], **self._request(f, code_diffs=code_diffs)}
-            for f in tqdm.tqdm(features)
+            {
+                "_id": f["_id"],
+                **(verdicts.get(i) or self._request(f, code_diffs=code_diffs)),
+            }
+            for i, f in enumerate(batch)
+        ]
+
+    async def _apredict_batch(
+        self, batch: List[dict], code_diffs: CodeDiffs
+    ) -> List[dict]:
+        verdicts = {}
+        if len(batch) > 1:
+            verdicts, pending = self._batch_lookup(batch)
+            if pending:
+                kwargs = self._batch_completion_kwargs(batch, pending)
+                result = await self._acreate(kwargs)
+                verdicts.update(self._parse_batch_completion(result, batch, pending))
+        return [
+            {
+                "_id": f["_id"],
+                **(verdicts.get(i) or await self._arequest(f, code_diffs=code_diffs)),
+            }
+            for i, f in enumerate(batch)
         ]
 
-    def predict(self, features: List[dict], code_diffs: CodeDiffs) -> List[dict]:
+    def predict(
+        self,
+        features: List[dict],
+        code_diffs: CodeDiffs,
+        deadline: Optional[float] = None,
+        on_results: Optional[Callable[[List[dict]], None]] = None,
+    ) -> List[dict]:
+        """Verdicts of the features, requested in order
+
+        Past the `deadline` (a `time.monotonic()` time) the pending requests are
+        dropped, and the features they were about are left out of the results.
+        `on_results` is called with the verdicts of each request as it completes,
+        possibly from another thread.
+        """
         features = [f for f in features if f is not None]
+        if self.config.async_client is not None:
+            return run_coroutine(
+                self.apredict(
+                    features,
+                    code_diffs=code_diffs,
+                    deadline=deadline,
+                    on_results=on_results,
+                )
+            )
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.config.max_concurrent_requests
+        )
+        results = []
+        try:
+            futures = [
+                executor.submit(self._predict_batch, batch, code_diffs)
+                for batch in self._batches(features)
+            ]
+            with tqdm.tqdm(
+                total=len(features), desc="LFG - LLM Code Omission Detection"
+            ) as progress:
+                for future in concurrent.futures.as_completed(
+                    futures, timeout=_remaining(deadline)
+                ):
+                    batch_results = future.result()
+                    if on_results is not None:
+                        on_results(batch_results)
+                    results.extend(batch_results)
+                    progress.update(len(batch_results))
+        except concurrent.futures.TimeoutError:
+            self.metrics.count("llm.deadline_exceeded")
+        finally:
+            # Requests already sent finish in the background and still fill the cache
+            executor.shutdown(wait=False, cancel_futures=True)
 
-        def process_feature(feature):
-            return {
-                "_id": feature["_id"],
-                **self._request(feature, code_diffs=code_diffs),
-            }
+        return results
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_feature = {
-                executor.submit(process_feature, feature): feature
-                for feature in features
-            }
-            results = []
-            for future in tqdm.tqdm(
-                concurrent.futures.as_completed(future_to_feature),
-                total=len(features),
-                desc="LFG - LLM Code Omission Detection",
-            ):
-                results.append(future.result())
+    async def apredict(
+        self,
+        features: List[dict],
+        code_diffs: CodeDiffs,
+        deadline: Optional[float] = None,
+        on_results: Optional[Callable[[List[dict]], None]] = None,
+    ) -> List[dict]:
+        features = [f for f in features if f is not None]
 
+        results = []
+        tasks = [
+            asyncio.ensure_future(self._apredict_batch(b, code_diffs))
+            for b in self._batches(features)
+        ]
+        with tqdm.tqdm(
+            total=len(features), desc="LFG - LLM Code Omission Detection"
+        ) as progress:
+            try:
+                for future in asyncio.as_completed(tasks, timeout=_remaining(deadline)):
+                    batch_results = await future
+                    if on_results is not None:
+                        on_results(batch_results)
+                    results.extend(batch_results)
+                    progress.update(len(batch_results))
+            except asyncio.TimeoutError:
+                self.metrics.count("llm.deadline_exceeded")
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
         return results
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until the `time.monotonic()` deadline, None without one"""
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def _estimate_tokens(completion_kwargs: dict) -> int:
+    """Rough prompt size (~4 characters per token) plus the completion budget"""
+    prompt_chars = sum(len(m["content"]) for m in completion_kwargs["messages"])
+    return prompt_chars // 4 + completion_kwargs["max_tokens"]
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import math
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from justbuild.codediff.features import CHANGE_SEQUENCE_TYPES, LINE_FLAGS
+from justbuild.codediff.llm_cache import default_cache_path
+from justbuild.config import Config
+
+# Feature vector layout: bias, one-hot change sequence type, sizes, line flags, then
+# the hashed character n-grams of the segment text
+NGRAM_SIZE = 3
+NGRAM_BUCKETS = 1 << 14
+MAX_TEXT_LENGTH = 400  # Placeholders are short, the n-grams of long segments are noise
+_TYPES_OFFSET = 1
+_SIZES_OFFSET = _TYPES_OFFSET + len(CHANGE_SEQUENCE_TYPES)
+_FLAGS_OFFSET = _SIZES_OFFSET + 3
+_NGRAMS_OFFSET = _FLAGS_OFFSET + len(LINE_FLAGS)
+
+
+def vectorize(feature: dict) -> Dict[int, float]:
+    """Sparse vector of a segment: its `build_features` values and `_curr_segment`
+
+    The n-grams are hashed with crc32, which (unlike `hash`) is stable across
+    processes, so saved weights stay valid.
+    """
+    vector = {0: 1.0}
+    sequence_type = feature.get("change_sequence_type")
+    if sequence_type in CHANGE_SEQUENCE_TYPES:
+        vector[_TYPES_OFFSET + CHANGE_SEQUENCE_TYPES.index(sequence_type)] = 1.0
+    size = feature.get("segment_size") or 0
+    prev_size = feature.get("prev_segment_size") or 0
+    vector[_SIZES_OFFSET] = math.log1p(size)
+    vector[_SIZES_OFFSET + 1] = math.log1p(prev_size)
+    vector[_SIZES_OFFSET + 2] = math.log1p(prev_size) - math.log1p(size)
+    for k, flag in enumerate(LINE_FLAGS):
+        if feature.get(flag):
+            vector[_FLAGS_OFFSET + k] = 1.0
+
+    text = " ".join(feature.get("_curr_segment", "").lower().split())
+    text = text[:MAX_TEXT_LENGTH]
+    ngrams: Dict[int, float] = {}
+    for k in range(len(text) - NGRAM_SIZE + 1):
+        bucket = zlib.crc32(text[k : k + NGRAM_SIZE].encode("utf-8"))
+        index = _NGRAMS_OFFSET + bucket % NGRAM_BUCKETS
+        ngrams[index] = ngrams.get(index, 0.0) + 1.0
+    if ngrams:
+        norm = math.sqrt(sum(count * count for count in ngrams.values()))
+        vector.update((index, count / norm) for index, count in ngrams.items())
+    return vector
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    exp_z = math.exp(z)
+    return exp_z / (1.0 + exp_z)
+
+
+def _class_weight(negatives: int, positives: int) -> Dict[float, float]:
+    """Weigh the classes evenly: omissions are much rarer than real changes"""
+    total = negatives + positives
+    return {1.0: total / (2 * positives), 0.0: total / (2 * negatives)}
+
+
+class LabelStore:
+    """On-disk (SQLite) `is_code_omission` labels with the features of their segment
+
+    Keyed by the features, so labeling the same segment again replaces its label.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS labels (key TEXT PRIMARY KEY, "
+                "features TEXT NOT NULL, label INTEGER NOT NULL, created REAL NOT NULL)"
+            )
+
+    def add(self, features: List[dict], labels: List[bool]) -> None:
+        rows = []
+        for feature, label in zip(features, labels):
+            encoded = json.dumps(feature, sort_keys=True)
+            key = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+            rows.append((key, encoded, int(bool(label)), time.time()))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO labels (key, features, label, created) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def load(self, limit: int = 10_000) -> Tuple[List[dict], List[bool]]:
+        """The `limit` most recent labels, as (features, labels)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT features, label FROM labels ORDER BY created DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows], [bool(row[1]) for row in rows]
+
+    def class_counts(self) -> Tuple[int, int]:
+        """The number of (real change, code omission) labels"""
+        with self._lock:
+            total, positives = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(label), 0) FROM labels"
+            ).fetchone()
+        return total - positives, positives
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM labels")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+
+class LocalModel:
+    """Logistic regression over the segment features and character n-grams
+
+    Trained by `fit` on the human labels, it runs on CPU in microseconds per segment,
+    between the Greedy model and the LLM: only the segments it is unsure about are
+    sent to the LLM. Until it has seen `min_labels` labels of both classes it is
+    untrained and decides nothing. Once trained, `learn` only updates it with the
+    new labels (`partial_fit`), so a review does not wait for a retraining.
+    """
+
+    def __init__(
+        self,
+        store: Optional[LabelStore] = None,
+        path: Optional[Union[str, Path]] = None,
+        epochs: int = 30,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        min_labels: int = 20,
+    ):
+        self.store = store
+        self.path = Path(path) if path else None
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.min_labels = min_labels
+        self.weights: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.weights)
+
+    def fit(self, features: List[dict], labels: List[bool]) -> None:
+        """Train from scratch with SGD on the log loss (deterministic order)"""
+        if len(labels) < self.min_labels or len(set(labels)) < 2:
+            self.weights = {}
+            return
+        samples = [(vectorize(f), float(y)) for f, y in zip(features, labels)]
+        positives = sum(y for _, y in samples)
+        class_weight = _class_weight(len(samples) - positives, positives)
+        weights: Dict[int, float] = {}
+        rng = random.Random(0)
+        for epoch in range(self.epochs):
+            rate = self.learning_rate / (1 + epoch)
+            rng.shuffle(samples)
+            self._sgd_pass(weights, samples, rate, class_weight)
+        self.weights = {i: w for i, w in weights.items() if w != 0.0}
+
+    def partial_fit(
+        self,
+        features: List[dict],
+        labels: List[bool],
+        class_weight: Optional[Dict[float, float]] = None,
+        epochs: int = 3,
+    ) -> None:
+        """Update the trained weights with a few SGD passes over new labels only
+
+        The learning rate picks up where the decay of `fit` ended. `class_weight`
+        should come from all the labels seen so far, not just the new ones.
+        """
+        samples = [(vectorize(f), float(y)) for f, y in zip(features, labels)]
+        weights = dict(self.weights)
+        rate = self.learning_rate / (1 + self.epochs)
+        for _ in range(epochs):
+            self._sgd_pass(weights, samples, rate, class_weight or {1.0: 1, 0.0: 1})
+        self.weights = {i: w for i, w in weights.items() if w != 0.0}
+
+    def _sgd_pass(
+        self,
+        weights: Dict[int, float],
+        samples: List[Tuple[Dict[int, float], float]],
+        rate: float,
+        class_weight: Dict[float, float],
+    ) -> None:
+        for vector, y in samples:
+            z = sum(weights.get(i, 0.0) * x for i, x in vector.items())
+            gradient = (_sigmoid(z) - y) * class_weight[y]
+            for i, x in vector.items():
+                w = weights.get(i, 0.0)
+                weights[i] = w - rate * (gradient * x + self.l2 * w)
+
+    def predict_proba(self, feature: dict) -> float:
+        """Probability that the segment is a code omission"""
+        weights = self.weights
+        z = sum(weights.get(i, 0.0) * x for i, x in vectorize(feature).items())
+        return _sigmoid(z)
+
+    def predict(self, features: List[dict]) -> List[dict]:
+        predictions = []
+        for feature in features:
+            probability = self.predict_proba(feature)
+            predictions.append(
+                {
+                    "_id": feature.get("_id"),
+                    "is_code_omission": probability >= 0.5,
+                    "confidence": max(probability, 1 - probability),
+                }
+            )
+        return predictions
+
+    def learn(self, features: List[dict], labels: List[bool]) -> None:
+        """Store new labels, update the model with them and save it
+
+        The model is fitted on all the stored labels only once, when there are
+        enough of both classes to train it.
+        """
+        if self.store is None:
+            if self.trained:
+                self.partial_fit(features, labels)
+            else:
+                self.fit(features, labels)
+            return
+        with self._lock:
+            self.store.add(features, labels)
+            negatives, positives = self.store.class_counts()
+            if self.trained:
+                # The store may hold a single class, e.g. cleared under saved weights
+                class_weight = None
+                if negatives and positives:
+                    class_weight = _class_weight(negatives, positives)
+                self.partial_fit(features, labels, class_weight)
+            elif negatives and positives and negatives + positives >= self.min_labels:
+                self.fit(*self.store.load())
+            if self.path is not None:
+                self.save(self.path)
+
+    def save(self, path: Union[str, Path]) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({str(i): w for i, w in self.weights.items()}))
+        tmp.replace(path)
+
+    def load(self, path: Union[str, Path]) -> None:
+        path = Path(path)
+        if path.exists():
+            weights = json.loads(path.read_text())
+            self.weights = {int(i): w for i, w in weights.items()}
+
+
+def default_labels_path(config: Config) -> Path:
+    """Next to the LLM verdict cache"""
+    verdicts_path = Path(config.cache_path) if config.cache_path else None
+    return (verdicts_path or default_cache_path()).with_name("labels.sqlite3")
+
+
+@lru_cache(maxsize=None)
+def _local_model(labels_path: str) -> LocalModel:
+    path = Path(labels_path).with_name("local_model.json")
+    model = LocalModel(store=LabelStore(labels_path), path=path)
+    model.load(path)
+    return model
+
+
+def get_local_model(config: Config) -> Optional[LocalModel]:
+    """The process-wide LocalModel of the config's labels, or None when disabled
+
+    Like the cached verdicts, what was learned from earlier labels is ignored when
+    the config disables caching.
+    """
+    if not (config.cache_enabled and config.local_model_enabled):
+        return None
+    return _local_model(str(config.labels_path or default_labels_path(config)))
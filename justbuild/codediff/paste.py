@@ -0,0 +1,127 @@
+"""Split an LLM chat answer into the files it rewrites: `lfg paste` without a path
+
+Answers often hold several fenced code blocks, each labeled with the path of its
+file in one of a few ways:
+
+    ```python src/app.py          (in the info string, or title="src/app.py")
+    **`src/app.py`**              (on the line before the fence)
+    # src/app.py                  (as the first line of the code, which is dropped)
+
+Blocks without a path (shell commands, examples) are skipped.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+_FENCE = re.compile(r"^(?P<indent>[ \t]*)(?P<fence>`{3,}|~{3,})(?P<info>.*)$")
+_FILE_NAME = re.compile(r"[\w.@+-]*\.[A-Za-z][A-Za-z0-9]*")
+_NAMES_WITHOUT_SUFFIX = {"Dockerfile", "Makefile", "Procfile", "Gemfile"}
+# A path as the first line of the code: `# path`, `// path`, `-- path`, `<!-- path -->`
+_PATH_COMMENT = re.compile(
+    r"^\s*(?:#|//|--|/\*|<!--)\s*(?:file(?:name)?:\s*)?"
+    r"(?P<path>\S+?)\s*(?:\*/|-->)?\s*$",
+    re.IGNORECASE,
+)
+_LABEL_PREFIX = re.compile(r"^(?:file(?:name)?|path)\s*:\s*", re.IGNORECASE)
+
+
+def _as_path(token: str) -> Optional[str]:
+    """`token` if it looks like a relative file path, e.g. "src/app.py" or "app.py" """
+    token = token.strip().strip("`*_\"'").rstrip(":")
+    if not token or token.startswith(("http://", "https://")) or "//" in token:
+        return None
+    name = token.rsplit("/", 1)[-1]
+    if _FILE_NAME.fullmatch(name) or name in _NAMES_WITHOUT_SUFFIX:
+        return token
+    return None
+
+
+def _path_in_info(info: str) -> Optional[str]:
+    """The path in a fence's info string: "python src/app.py", "py title=app.py" """
+    for token in re.split(r"[\s:=,{}]+", info):
+        if path := _as_path(token):
+            return path
+    return None
+
+
+def _path_in_label(line: str) -> Optional[str]:
+    """The path on the line before a fence: "### `src/app.py`", "File: app.py"
+
+    Only a line that holds nothing but the path counts, so that a sentence naming
+    a file ("Then update `setup.py`:") does not label the command block after it.
+    """
+    line = _LABEL_PREFIX.sub("", line.strip().lstrip("#*_>-+ ").rstrip("*_: "))
+    line = line.strip("`*_ ")
+    return _as_path(line) if len(line.split()) == 1 else None
+
+
+def parse_code_blocks(text: str) -> List[Tuple[str, str]]:
+    """The (path, code) of every fenced block labeled with a path, in order
+
+    A path given twice keeps its last block, the latest revision in the answer.
+    """
+    blocks = {}
+    lines = text.splitlines()
+    k = 0
+    while k < len(lines):
+        opening = _FENCE.match(lines[k])
+        if opening is None:
+            k += 1
+            continue
+        indent, fence = opening["indent"], opening["fence"]
+        label = next((line for line in reversed(lines[:k]) if line.strip()), "")
+        code = []
+        k += 1
+        while k < len(lines):
+            closing = _FENCE.match(lines[k])
+            if (
+                closing is not None
+                and closing["fence"][0] == fence[0]
+                and len(closing["fence"]) >= len(fence)
+                and not closing["info"].strip()
+            ):
+                break
+            line = lines[k]
+            code.append(line[len(indent) :] if line.startswith(indent) else line)
+            k += 1
+        k += 1
+
+        path = _path_in_info(opening["info"]) or _path_in_label(label)
+        if path is None and code and (comment := _PATH_COMMENT.match(code[0])):
+            if path := _as_path(comment["path"]):
+                code = code[1:]
+        if path is not None:
+            blocks.pop(path, None)
+            blocks[path] = "\n".join(code) + "\n"
+    return list(blocks.items())
+
+
+def print_summary(results: dict, console: Optional[Console] = None) -> None:
+    """A table of the files of a multi-file paste, with their timings"""
+    console = console or Console()
+    table = Table(title="LFG 🚀! Pasted files")
+    table.add_column("File", style="cyan", no_wrap=True)
+    table.add_column("Status")
+    table.add_column("Omissions corrected", justify="right")
+    table.add_column("Hunks reused", justify="right")
+    table.add_column("Seconds", justify="right", style="magenta")
+    for file, updates in results.items():
+        if "error" in updates:
+            status = f"[red]{updates['error']}[/red]"
+        elif updates.get("created"):
+            status = "created"
+        elif not updates.get("written", True):
+            status = "not written"
+        else:
+            status = "merged"
+        table.add_row(
+            file,
+            status,
+            str(len(updates.get("changes", []))),
+            str(updates.get("hunks", {}).get("reused", 0)),
+            f"{updates['seconds']:.2f}" if "seconds" in updates else "",
+        )
+    console.print(table)
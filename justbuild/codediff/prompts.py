@@ -0,0 +1,196 @@
+"""Prompts of the LLM model, kept apart from `models_llm` (and openai) so that
+the verdict cache can be read without loading the client, e.g. by `lfg hook`
+"""
+
+PLACEHOLDER_GUIDE = """Analyze the following `git diff` output to determine if the original code was replaced with a "Placeholder Comment":
+
+### Definition of a Placeholder Comment
+A placeholder comment is a descriptive note within the code that indicates a section of the code is intentionally omitted or remains unchanged, often represented by ellipsis or specific text.
+
+### Checklist to Identify Placeholder Comments in a `git diff`
+
+1. **Ellipsis (`...`) Usage**:
+   - Look for ellipsis within the comment, which often signifies omitted code.
+
+2. **Descriptive Text**:
+   - Check if the comment contains text that describes the omitted code or indicates that the content remains unchanged (e.g., "form content remains the same").
+
+3. **Contextual Placement**:
+   - Ensure the comment is placed in a logical location where significant code blocks would typically exist (e.g., within a form, function, or component).
+
+4. **Consistency with Surrounding Code**:
+   - Verify that the comment is consistent with the surrounding code structure, suggesting it is a placeholder for more detailed implementations.
+
+5. **Purpose Indication**:
+   - Determine if the comment clearly indicates its purpose, such as explaining the functionality or section of the code that is not shown.
+
+6. **Length Differences**:
+   - There are a significant number of lines in the original code that are missing in the new code, indicating a placeholder comment.
+   - The new code is much shorter than the original code, suggesting omitted content.
+
+7. **Code Omission Indicators**:
+    - Look for specific phrases like "Code Was Here" or "rest of the previous code remains the same" that are commonly used as placeholders.
+
+8. **Code Comments**:
+    - The majority of the new code in the diff is comments or placeholder text.
+
+### Samples of Placeholder Comments
+
+ - `# ... (SYSTEM_PROMPT remains unchanged)`
+ - `# ... (This method remains unchanged)`
+ - `// ... (previous handler functions remain the same)`
+ - `// ... (previous hotkey handlers remain the same)`
+ - `// ... (rest of the previous code remains the same)`
+ - `// ... (previous state and handlers remain the same)`
+ - `// ... (previous imports and code remain the same)`
+ - `{/* ... (previous content remains the same) */}`
+
+### Example of a Placeholder Comment in a `git diff`
+```diff
+-                <div className="flex items-center border-2 border-gray-300 rounded-lg p-2">
+-                    <input
+-                        ref={inputRef}
+-                        name="input"
+-                        type="text"
+-                        value={input}
+-                        onChange={(e) => setInput(e.target.value)}
+-                        className="flex-grow outline-none"
+-                        placeholder="What should we brainstorm today?"
+-                    />
+-                    <button
+-                        type="button"
+-                        onClick={handleVoiceInput}
+-                        className={`mx-2 ${isRecording ? "text-red-500" : "text-gray-500"}`}
+-                    >
+-                        <MicIcon size={20} />
+-                    </button>
+-                    <button
+-                        type="button"
+-                        onClick={handleAttachment}
+-                        className="mx-2 text-gray-500"
+-                    >
+-                        <PaperclipIcon size={20} />
+-                    </button>
+-                    <button
+-                        type="submit"
+-                        className="text-blue-500"
+-                        disabled={fetcher.state === "submitting"}
+-                    >
+-                        <SendIcon size={20} />
+-                    </button>
+-                </div>
++                {/* ... (form content remains the same) ... */}
+```
+Response: yes
+
+### Negative Example: Not a Placeholder Comment in a `git diff`
+```diff
+ } from "~/models/brainstorm.server";
+ import invariant from "tiny-invariant";
+
+-import DynamicComponent from '~/components/DynamicComponent';
++import DynamicComponent from "~/components/DynamicComponent";
++import { Button } from "~/components/ui/button";
++import {
++    DropdownMenu,
++    DropdownMenuContent,
++    DropdownMenuItem,
++    DropdownMenuTrigger,
++} from "~/components/ui/dropdown-menu";
++import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from "~/components/ui/dialog";
+
+ interface BrainstormingBotPageProps {
+     currentBrainstorm: BrainstormSession;
+```
+Response: no
+
+### Negative Example: Not a Placeholder Comment in a `git diff`
+```
+     return (
+-        <div className="flex flex-col h-screen p-4">
++        <div className="flex flex-col p-4">
++            {/* Header */}
+             <h1 className="text-2xl font-bold mb-4">
+                 Task: {currentBrainstorm.title}
+             </h1>
+```
+Response: no
+
+### Negative Example: Not a Placeholder Comment in a `git diff`
+```diff
+             </div>
+
+-            {/* Display brainstorming results here */}
+-            <div className="border-2 border-gray-300 rounded-lg p-2 flex-grow overflow-y-auto">
+-                {samples &&
+-                    samples?.map((input: any, index: number) => (
+-                        <DynamicComponent
+-                            componentName={activeDataView}
+-                            key_name={index}
+-                            props={{
+-                                data: input
+-                            }}
+-                        />
+-                    ))}
++            {/* Scrollable results area */}
++            <div className="flex-grow overflow-y-auto">
++                <div className="border-2 border-gray-300 rounded-lg p-2 mb-4">
++                    {samples &&
++                        samples?.map((input: any, index: number) => (
++                            <DynamicComponent
++                                componentName={activeDataView}
++                                key_name={index}
++                                props={{
++                                    data: input,
++                                }}
++                            />
++                        ))}
++                </div>
+             </div>
+```
+Response: no
+
+By following this checklist, you can effectively identify placeholder comments in a `git diff` and understand their purpose within the code.
+
+Think step by step about the context of the code and the purpose of the diff to determine if the new code is a placeholder for the original code."""
+
+SYSTEM_PROMPT = (
+    PLACEHOLDER_GUIDE
+    + """
+
+Start your response with a list of the features you identified in the diff, followed by your answer to the question below.
+
+Your answer must end with 'yes' or 'no' to indicate whether the new code is a placeholder comment for the original code."""
+)
+
+ANSWER_SYSTEM_PROMPT = (
+    PLACEHOLDER_GUIDE
+    + """
+
+Answer with a single word: 'yes' if the new code is a placeholder comment for the original code, otherwise 'no'."""
+)
+
+BATCH_SYSTEM_PROMPT = (
+    PLACEHOLDER_GUIDE
+    + """
+
+You will be given several numbered diffs. Answer for each diff independently.
+
+Respond only with a JSON object that maps every diff number to "yes" or "no", e.g. {"1": "no", "2": "yes"}."""
+)
+
+
+def user_message(feature: dict) -> str:
+    """The question asked about one segment, from its `_diff` and `_curr_segment`"""
+    return f"""```diff
+{feature['_diff']}
+```
+Is the following line a placeholder comment for the original code? (yes/no)
+```
+{feature.get("_curr_segment","")}
+```
+"""
+
+
+def system_prompt(llm_verbose: bool = False) -> str:
+    return SYSTEM_PROMPT if llm_verbose else ANSWER_SYSTEM_PROMPT
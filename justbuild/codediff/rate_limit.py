@@ -0,0 +1,110 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_limiters: Dict[str, "RateLimiter"] = {}
+
+
+class TokenBucket:
+    """Refills `rate` units per `period` seconds, holding at most `rate` units"""
+
+    def __init__(self, rate: float, period: float = 60.0):
+        self.capacity = float(rate)
+        self.fill_rate = rate / period
+        self.available = float(rate)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(
+            self.capacity, self.available + (now - self.updated) * self.fill_rate
+        )
+        self.updated = now
+
+    async def take(self, amount: float = 1) -> None:
+        # A request larger than the bucket would never fit, so let it drain the bucket
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.available < amount:
+                await asyncio.sleep((amount - self.available) / self.fill_rate)
+                self._refill()
+            self.available -= amount
+
+
+class RateLimiter:
+    """Process-wide cap on in-flight LLM requests, requests/min and tokens/min"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+    ):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, tokens: int) -> None:
+        await self.semaphore.acquire()
+        try:
+            await self.requests.take(1)
+            await self.tokens.take(tokens)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def release(self) -> None:
+        self.semaphore.release()
+
+
+def backoff_delay(attempt: int, base: float = 1.0, maximum: float = 60.0) -> float:
+    """Exponential backoff with 'equal jitter': half fixed, half random"""
+    delay = min(maximum, base * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """The event loop shared by every LLM request in the process
+
+    It runs in a daemon thread so that synchronous callers (one per file in
+    `merge_all`) all schedule their requests behind the same limiter.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="lfg-llm-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def run_coroutine(coro: Awaitable[T]) -> T:
+    """Run `coro` on the shared LLM event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def get_rate_limiter(
+    max_concurrency: int,
+    requests_per_minute: float,
+    tokens_per_minute: float,
+    key: str = "openai",
+) -> RateLimiter:
+    """The process-wide RateLimiter of backend `key`, created on first use
+
+    Call it from the LLM loop. Each backend gets its own limits, so a local server
+    does not share the budget (or the slots) of the hosted API.
+    """
+    if key not in _limiters:
+        _limiters[key] = RateLimiter(
+            max_concurrency, requests_per_minute, tokens_per_minute
+        )
+    return _limiters[key]
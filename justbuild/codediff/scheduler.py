@@ -0,0 +1,82 @@
+"""Which uncertain segments are worth an LLM request, within the budgets of a merge
+
+Every segment the Greedy (and local) model is unsure about is a candidate. They
+are ranked by expected value: the chance that the Greedy verdict is wrong times
+the lines at stake, so a likely mistake about a large block is asked about before
+a doubtful one-liner. Candidates are taken in that order until `llm_max_calls` or
+`llm_max_cost` runs out. Cached verdicts cost nothing and are always taken. The
+deferred segments keep the Greedy verdict and are marked in the change log.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from justbuild.codediff.features import FeatureTable
+from justbuild.codediff.models_llm import LLMModel
+from justbuild.config import Config
+
+
+@dataclass
+class LLMSchedule:
+    send: List[dict] = field(default_factory=list)  # Most valuable first
+    deferred: List[dict] = field(default_factory=list)  # Over the budget
+    estimated_cost: float = 0.0  # USD, of the uncached requests in `send`
+
+
+def expected_value(confidence: float, lines: int) -> float:
+    """Worth of asking the LLM about a segment the Greedy model gave `confidence`
+
+    `lines` is what a wrong verdict costs: the omitted block that is lost, or the
+    new code that is wrongly reverted.
+    """
+    return (1.0 - confidence) * max(lines, 1)
+
+
+def rank_segments(
+    samples: List[dict], outputs: Dict[int, dict], table: FeatureTable
+) -> List[dict]:
+    """The samples by decreasing expected value (ties keep the diff order)"""
+
+    def value(sample: dict) -> float:
+        i = sample["_id"]
+        lines = max(table.segment_size[i], table.prev_segment_size[i])
+        return expected_value(outputs[i]["naive"]["confidence"], lines)
+
+    return sorted(samples, key=value, reverse=True)
+
+
+def schedule_llm(
+    samples: List[dict],
+    outputs: Dict[int, dict],
+    table: FeatureTable,
+    model: LLMModel,
+    config: Config,
+) -> LLMSchedule:
+    """Split the samples between the LLM and the Greedy fallback
+
+    `llm_max_calls` counts the uncached segments asked about (one request each,
+    fewer with `llm_batching`), `llm_max_cost` their estimated USD cost.
+    """
+    ranked = rank_segments(samples, outputs, table)
+    max_calls, max_cost = config.llm_max_calls, config.llm_max_cost
+    if max_calls is None and max_cost is None:
+        return LLMSchedule(send=ranked)
+
+    schedule = LLMSchedule()
+    calls, exhausted = 0, False
+    for sample in ranked:
+        if model.is_cached(sample):
+            schedule.send.append(sample)
+            continue
+        cost = model.estimate_cost(sample)
+        exhausted = exhausted or (
+            (max_calls is not None and calls >= max_calls)
+            or (max_cost is not None and schedule.estimated_cost + cost > max_cost)
+        )
+        if exhausted:
+            schedule.deferred.append(sample)
+            continue
+        schedule.send.append(sample)
+        schedule.estimated_cost += cost
+        calls += 1
+    return schedule
@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from justbuild.codediff.git_wrappers import (
+    get_index_path,
+    get_index_version,
+    list_files,
+)
+from justbuild.codediff.hunk_memo import HunkMemo, get_hunk_memo
+from justbuild.codediff.merging import merge_code
+from justbuild.config import Config, get_config
+
+IGNORED_DIRS = {".git", "__pycache__", ".venv", "venv", "node_modules"}
+
+
+def _git_files(path: Path) -> Optional[Tuple[List[Path], Set[Path]]]:
+    """The files git sees under `path`, and those whose index version is up to date
+
+    Only tracked files, and new files that are not ignored, are listed, so build
+    outputs and virtualenvs are left out. None outside of a git repository.
+    """
+    tracked = list_files(path, "--cached")
+    if tracked is None:
+        return None
+    others = list_files(path, "--others", "--exclude-standard") or []
+    modified = set(list_files(path, "--modified") or [])
+    return tracked + others, {file for file in tracked if file not in modified}
+
+
+def _walked_files(path: Path) -> List[Path]:
+    """The files under `path`, skipping the `IGNORED_DIRS`"""
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+        files.extend(Path(root) / name for name in names)
+    return files
+
+
+def _directories(root: Path, files: Iterable[Path]) -> Set[Path]:
+    """`root` and the directories between it and each of `files`"""
+    directories = {root}
+    for file in files:
+        for parent in file.parents:
+            if parent in directories:
+                break
+            directories.add(parent)
+    return directories
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Watcher:
+    """Re-merges watched files against their last known version when they change
+
+    The files are polled (no inotify dependency) and a change is only merged once
+    the file has been quiet for `debounce` seconds, so an editor's burst of writes
+    is handled once. Each poll only stats the known files, and the index and the
+    directories of a git tree: its files are listed again when one of them changed,
+    as a new file changes its directory. (A file written into a directory that was
+    still empty when listed waits for the next change of the index or of a known
+    directory.) Other trees are walked again every `rescan` seconds. Hunks whose
+    content was already classified reuse their verdicts from the HunkMemo, so a
+    save only pays for the hunks that changed.
+
+    Files that git tracks and that were unmodified when first seen are not read
+    until they change: their last known version is the one in the git index.
+
+    Nobody is asked to review the changes: merges run as with `--yes`.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[Path],
+        config: Optional[Config] = None,
+        fast=False,
+        debounce: float = 0.2,
+        rescan: float = 2.0,
+        memo: Optional[HunkMemo] = None,
+        on_merge: Optional[Callable[[Path, dict], None]] = None,
+    ):
+        self.paths = [Path(path) for path in paths]
+        self.config = config if config is not None else get_config()
+        self.fast = fast
+        self.debounce = debounce
+        self.rescan = rescan
+        if memo is None:
+            # Kept in memory for this session when the persisted memo is disabled
+            memo = get_hunk_memo(self.config) or HunkMemo()
+        self.memo = memo
+        self.on_merge = on_merge
+        # The stat signature of each watched file, and its last known good version
+        # (missing while it is the one in the git index)
+        self.signatures: Dict[Path, Tuple[int, int]] = {}
+        self.snapshots: Dict[Path, str] = {}
+        self.pending: Dict[Path, float] = {}  # Changed files, by time of last change
+        # Of each watched git tree: the stat signature of its index and directories
+        # when it was last listed. Other trees: the time they were last walked
+        self._listed: Dict[Path, Dict[Path, Optional[Tuple[int, int]]]] = {}
+        self._walked_at: Dict[Path, float] = {}
+        self._scan()
+
+    def _scan(self, now: Optional[float] = None) -> None:
+        """Start watching the files that appeared since the last scan
+
+        `now` is the time of the poll, None for the first scan.
+        """
+        for path in self.paths:
+            if not path.is_dir():
+                if path not in self.signatures:
+                    self._track(path)
+                continue
+            listed = self._listed.get(path)
+            if listed is not None:
+                if all(_signature(p) == sig for p, sig in listed.items()):
+                    continue
+            elif path in self._walked_at and now - self._walked_at[path] < self.rescan:
+                continue
+            self._list(path, now)
+
+    def _list(self, path: Path, now: Optional[float]) -> None:
+        """List the files of the tree at `path` and watch the new ones"""
+        # The known directories are stat'ed first, so that a file that appears
+        # while git lists the tree is found at the next poll
+        before = {p: _signature(p) for p in self._listed.get(path, {})}
+        listing = _git_files(path)
+        if listing is None:
+            files, unmodified = _walked_files(path), set()
+            if now is not None:
+                self._walked_at[path] = now
+        else:
+            files, unmodified = listing
+            watched = [get_index_path(path), *_directories(path, files)]
+            self._listed[path] = {
+                p: before[p] if p in before else _signature(p) for p in watched
+            }
+        for file in files:
+            if file not in self.signatures:
+                self._track(file, read=file not in unmodified)
+
+    def _track(self, file: Path, read=True) -> None:
+        """A new file: its first version is the baseline"""
+        signature = _signature(file)
+        if signature is None:
+            return  # Tracked by git but deleted
+        if read:
+            try:
+                self.snapshots[file] = file.read_text()
+            except (UnicodeDecodeError, OSError):
+                return  # Binary or unreadable files are not code to merge
+        self.signatures[file] = signature
+
+    def _untrack(self, file: Path) -> None:
+        self.signatures.pop(file, None)
+        self.snapshots.pop(file, None)
+        self.pending.pop(file, None)
+
+    def poll(self, now: Optional[float] = None) -> Dict[Path, dict]:
+        """Check the files once and merge the ones that settled, {file: updates}"""
+        now = time.monotonic() if now is None else now
+        self._scan(now)
+        for file, signature in list(self.signatures.items()):
+            current = _signature(file)
+            if current is None:
+                self._untrack(file)
+            elif current != signature:
+                self.signatures[file] = current
+                self.pending[file] = now
+
+        results = {}
+        for file, changed_at in list(self.pending.items()):
+            if now - changed_at >= self.debounce:
+                del self.pending[file]
+                results[file] = self.merge(file)
+        return results
+
+    def merge(self, file: Path) -> dict:
+        """Merge the current content of `file` against its snapshot"""
+        try:
+            new_code = file.read_text()
+        except (UnicodeDecodeError, OSError):
+            self._untrack(file)  # Found again, unread, by the next scan
+            return {"changes": [], "hunks": {"reused": 0, "classified": 0}}
+        old_code = self.snapshots.get(file)
+        if old_code is None:
+            old_code = get_index_version(file)
+        if new_code == old_code or not old_code:
+            self.snapshots[file] = new_code
+            return {"changes": [], "hunks": {"reused": 0, "classified": 0}}
+        try:
+            output, updates = merge_code(
+                old_code,
+                new_code,
+                config=self.config,
+                yes=True,
+                fast=self.fast,
+                memo=self.memo,
+            )
+        except Exception as e:  # Keep watching the other files
+            updates = {"error": f"{type(e).__name__}: {e}"}
+        else:
+            if output != new_code:
+                file.write_text(output)
+                self.signatures[file] = _signature(file)
+            self.snapshots[file] = output
+        if self.on_merge:
+            self.on_merge(file, updates)
+        return updates
+
+    def run(self, interval: float = 0.5, stop: Optional[threading.Event] = None):
+        """Poll every `interval` seconds until `stop` is set (or forever)"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.poll()
+            stop.wait(interval)
@@ -1,32 +1,110 @@
 import os
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Union
 
-from dotenv import load_dotenv
-from openai import OpenAI
-
+from justbuild.backends import LLMBackend, create_clients, get_backend
 from justbuild.codediff.git_wrappers import is_git_installed
 
+if TYPE_CHECKING:  # openai is slow to import, only load it when building a client
+    from openai import AsyncOpenAI, OpenAI
+
 
 @dataclass
 class Config:
     name: str = "justbuild"
     model_temperature: float = 0.0
     model_name: str = "gpt-3.5-turbo"
+    # The OpenAI-compatible endpoint of the clients, see `justbuild.backends`
+    backend: str = "openai"
+    base_url: Optional[str] = None  # None for the OpenAI API
+    request_timeout: float = 60.0  # Seconds for a whole request of the clients
     git_installed: bool = False
-    client: OpenAI = None
+    client: "OpenAI" = None
+    async_client: "AsyncOpenAI" = None  # Preferred over `client` when set
     model_enabled: bool = False
+    diff_backend: str = "git"  # 'git' or 'python' (in-process difflib)
+    cache_enabled: bool = True  # Reuse LLM verdicts for identical prompts
+    cache_path: Optional[str] = None  # Defaults to ~/.cache/justbuild
+    cache_max_entries: int = 10_000
+    cache_max_age_days: float = 30
+    # Verdicts (including human labels) of known hunks, reused by later merges
+    hunk_memo_path: Optional[str] = None  # Defaults to ~/.cache/justbuild
+    # Model trained on the human labels, deciding the segments it is sure about
+    # before the LLM is asked
+    local_model_enabled: bool = True
+    local_model_confidence: float = 0.9
+    labels_path: Optional[str] = None  # Defaults to ~/.cache/justbuild
+    # Shared by all the LLM requests of the process to the backend
+    max_concurrent_requests: int = 16
+    requests_per_minute: int = 3_500
+    tokens_per_minute: int = 60_000
+    max_retries: int = 5
+    # USD per million tokens of the model, to estimate the cost of a merge
+    prompt_token_cost: float = 0.5
+    completion_token_cost: float = 1.5
+    # Budgets of the LLM per merged file, None for no limit. The most valuable
+    # uncertain segments are asked first, the rest keep the Greedy verdict
+    llm_max_calls: Optional[int] = None
+    llm_max_cost: Optional[float] = None  # USD, estimated before asking
+    llm_deadline: Optional[float] = None  # Seconds waiting for the LLM
+    # Review the segments known to need a human while the LLM classifies the rest
+    pipelined_review: bool = True
+    # Ask for the full reasoning instead of a single yes/no token (for debugging)
+    llm_verbose: bool = False
+    # Pack several diffs into one LLM request, sized by an estimated token budget
+    llm_batching: bool = False
+    llm_batch_token_budget: int = 3_000
+    llm_max_batch_size: int = 16
 
     @classmethod
-    def create(cls):
-        api_key = os.getenv("OPENAI_API_KEY")
+    def create(cls, clients=True, backend: Union[str, LLMBackend, None] = None):
+        """From the environment; without `clients` openai is not even imported
+
+        The backend defaults to $JUSTBUILD_LLM_BACKEND (or "openai"), and its URL,
+        model and request timeout can be overridden with $JUSTBUILD_LLM_BASE_URL,
+        $JUSTBUILD_LLM_MODEL and $JUSTBUILD_LLM_TIMEOUT (seconds).
+        """
+        backend = get_backend(backend or os.getenv("JUSTBUILD_LLM_BACKEND") or "openai")
+        if backend.api_key_env:
+            api_key = os.getenv(backend.api_key_env)
+        else:
+            api_key = "unused"  # The client insists on a key, local servers ignore it
         model_enabled = api_key is not None
-        return cls(
+        config = cls(
+            model_name=os.getenv("JUSTBUILD_LLM_MODEL") or backend.model_name,
+            backend=backend.name,
+            base_url=os.getenv("JUSTBUILD_LLM_BASE_URL") or backend.base_url,
+            request_timeout=float(
+                os.getenv("JUSTBUILD_LLM_TIMEOUT") or backend.timeout
+            ),
             git_installed=is_git_installed(),
-            client=OpenAI(api_key=api_key) if model_enabled else None,
             model_enabled=model_enabled,
+            cache_path=os.getenv("JUSTBUILD_CACHE_PATH"),
+            max_concurrent_requests=backend.max_concurrent_requests,
+            requests_per_minute=backend.requests_per_minute,
+            tokens_per_minute=backend.tokens_per_minute,
+            prompt_token_cost=backend.prompt_token_cost,
+            completion_token_cost=backend.completion_token_cost,
         )
+        if clients and model_enabled:
+            config.client, config.async_client = create_clients(
+                config.base_url,
+                api_key,
+                config.request_timeout,
+                backend.connect_timeout,
+            )
+        return config
 
 
-def load_config() -> Config:
+def load_config(clients=True, backend: Union[str, LLMBackend, None] = None) -> Config:
+    from dotenv import load_dotenv
+
     load_dotenv()
-    return Config.create()
+    return Config.create(clients=clients, backend=backend)
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """The process-wide Config, built (and `.env` loaded) on first use"""
+    return load_config()
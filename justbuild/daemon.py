@@ -0,0 +1,297 @@
+"""Long-running merge server for editor integrations: `lfg daemon --help`
+
+The server keeps the config, the OpenAI client (and its connection pool), the
+verdict cache and the compiled patterns warm, so an on-save hook only pays for the
+diff and the classification. It speaks JSON over HTTP on localhost:
+
+    GET  /health      -> {"status": "ok", "version": ..., "pid": ..., "requests": ...}
+    POST /merge_code  {"old_code", "new_code", "fast"}
+                      -> {"output", "changes", "cache", "hunks", "metrics"}
+    POST /merge       {"root", "old_file", "new_file", "target_file", "dry_run",
+                       "fast", "diff_backend"}
+                      -> {"output"?, "target_file", "changes", "cache", "hunks",
+                          "metrics"}
+    POST /shutdown    -> {"status": "stopping"}
+
+Any local process (or web page) can reach a localhost port, so every request must
+carry the `Authorization: Bearer <token>` of the session, which the daemon writes
+to a file only its user can read (`token_path`). Requests for another Host than
+localhost (DNS rebinding) and POSTs that are not `application/json` (the simple
+requests a browser sends cross-origin) are turned down. `/merge` only touches
+files under the `root` the client declares, e.g. its repository.
+
+Nobody is at the daemon's console to review changes, so the merges run as with
+`--yes`. This module only imports the standard library: the client side stays as
+fast to start as `lfg --help`.
+"""
+
+import hmac
+import json
+import os
+import secrets
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Union
+
+from justbuild import __version__
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+ALLOWED_HOSTS = {"127.0.0.1", "localhost"}
+
+
+def token_path(port: int = DEFAULT_PORT) -> Path:
+    """Where the daemon on `port` keeps its session token"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    base = Path(runtime_dir) if runtime_dir else Path.home() / ".cache"
+    return base / "justbuild" / f"daemon-{port}.token"
+
+
+def _write_token(path: Path, token: str) -> None:
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as file:
+        file.write(token)
+    os.chmod(path, 0o600)  # Also when the file was left over by another session
+
+
+def _inside(path: Union[str, Path], root: Path) -> Path:
+    resolved = Path(path).resolve()
+    if resolved != root and root not in resolved.parents:
+        raise ValueError(f"{path} is outside of {root}")
+    return resolved
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "MergeServer"
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _refused(self) -> bool:
+        """Reply with an error unless the request is from an authorized client"""
+        host = self.headers.get("Host", "").rsplit(":", 1)[0]
+        if host not in ALLOWED_HOSTS:
+            self._reply(403, {"error": f"Host not allowed: {host}"})
+            return True
+        authorization = self.headers.get("Authorization", "")
+        if not hmac.compare_digest(
+            authorization.encode(), f"Bearer {self.server.token}".encode()
+        ):
+            self._reply(401, {"error": "Missing or wrong daemon token"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self._refused():
+            return
+        if self.path != "/health":
+            return self._reply(404, {"error": f"Unknown endpoint: {self.path}"})
+        self._reply(200, self.server.health())
+
+    def do_POST(self):
+        if self._refused():
+            return
+        routes = {
+            "/merge_code": self.server.merge_code,
+            "/merge": self.server.merge,
+            "/shutdown": self.server.request_shutdown,
+        }
+        if self.path not in routes:
+            return self._reply(404, {"error": f"Unknown endpoint: {self.path}"})
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type != "application/json":
+            return self._reply(415, {"error": "Content-Type must be application/json"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            self._reply(200, routes[self.path](payload))
+        except (ValueError, KeyError, FileNotFoundError) as e:
+            self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+        except Exception as e:  # Keep serving after a failed merge
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        pass  # Editors poll the daemon, keep the console quiet
+
+
+class MergeServer(ThreadingHTTPServer):
+    """Serves `merge_code` and `merge` over localhost HTTP with a warm pipeline
+
+    A new token is written to `token_file` (by default `token_path(port)`) for
+    every session, and removed by `server_close`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        config=None,
+        token_file: Optional[Path] = None,
+    ):
+        super().__init__((host, port), _Handler)
+        self.token = secrets.token_urlsafe(32)
+        self.token_file = Path(token_file or token_path(self.server_address[1]))
+        _write_token(self.token_file, self.token)
+        # Pay for the imports, the .env, the OpenAI client and the cache once
+        from justbuild.codediff import merging
+        from justbuild.codediff.llm_cache import get_verdict_cache
+        from justbuild.config import get_config
+
+        self._merging = merging
+        self.config = config if config is not None else get_config()
+        if self.config.cache_enabled:
+            get_verdict_cache(
+                self.config.cache_path,
+                max_entries=self.config.cache_max_entries,
+                max_age_days=self.config.cache_max_age_days,
+            )
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.token_file.unlink(missing_ok=True)
+
+    def _count_request(self) -> None:
+        with self._requests_lock:
+            self.requests += 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "version": __version__,
+            "pid": os.getpid(),
+            "requests": self.requests,
+        }
+
+    def merge_code(self, payload: dict) -> dict:
+        self._count_request()
+        output, updates = self._merging.merge_code(
+            payload["old_code"],
+            payload["new_code"],
+            config=self.config,
+            yes=True,
+            fast=payload.get("fast", False),
+        )
+        return {
+            "output": output,
+            "changes": updates["changes"],
+            "cache": updates["cache"],
+            "hunks": updates["hunks"],
+            "metrics": updates["metrics"],
+        }
+
+    def merge(self, payload: dict) -> dict:
+        """Merge files on the daemon's file system (send absolute paths)
+
+        Every file must be under the absolute `root` directory of the payload.
+        """
+        self._count_request()
+        if not payload.get("old_file"):
+            raise ValueError(
+                "old_file is required: the daemon cannot read the git index of the "
+                "client's repository"
+            )
+        root = Path(payload.get("root") or "")
+        if not root.is_absolute() or not root.is_dir():
+            raise ValueError("root must be the absolute path of a directory")
+        root = root.resolve()
+        old_file = _inside(payload["old_file"], root)
+        new_file = _inside(payload["new_file"], root)
+        target_file = _inside(payload.get("target_file") or new_file, root)
+        fast = payload.get("fast", False)
+        if payload.get("dry_run"):
+            # Nothing is written, the client gets the merged code instead
+            output, updates = self._merging.merge_code(
+                old_file.read_text(),
+                new_file.read_text(),
+                config=self.config,
+                yes=True,
+                fast=fast,
+            )
+            return {
+                "output": output,
+                "target_file": str(target_file),
+                "changes": updates["changes"],
+                "cache": updates["cache"],
+                "hunks": updates["hunks"],
+                "metrics": updates["metrics"],
+            }
+        updates = self._merging.merge(
+            old_file=old_file,
+            new_file=new_file,
+            target_file=target_file,
+            config=self.config,
+            yes=True,
+            fast=fast,
+            diff_backend=payload.get("diff_backend"),
+        )
+        return {
+            "target_file": str(target_file),
+            "changes": updates["changes"],
+            "cache": updates["cache"],
+            "hunks": updates["hunks"],
+            "metrics": updates["metrics"],
+        }
+
+    def request_shutdown(self, payload: dict) -> dict:
+        # shutdown() waits for serve_forever() to return, so not from this thread
+        threading.Thread(target=self.shutdown, daemon=True).start()
+        return {"status": "stopping"}
+
+
+def request(
+    endpoint: str,
+    payload: Optional[dict] = None,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    timeout: float = 600,
+    token: Optional[str] = None,
+) -> dict:
+    """Call a running daemon: GET without a payload, POST with one
+
+    The `token` is read from the daemon's `token_path(port)` when not given.
+    """
+    if token is None:
+        try:
+            token = token_path(port).read_text().strip()
+        except OSError:
+            raise RuntimeError(
+                f"No lfg daemon on {host}:{port} (no token in {token_path(port)}), "
+                "start one with `lfg daemon start`"
+            ) from None
+    data = json.dumps(payload).encode() if payload is not None else None
+    http_request = urllib.request.Request(
+        f"http://{host}:{port}{endpoint}",
+        data=data,
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.loads(e.read()).get("error", str(e))) from None
+    except urllib.error.URLError as e:
+        raise RuntimeError(
+            f"No lfg daemon on {host}:{port} ({e.reason}), start one with "
+            "`lfg daemon start`"
+        ) from None
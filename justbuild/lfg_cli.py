@@ -1,28 +1,69 @@
 import tempfile
+from dataclasses import replace
 from pathlib import Path
+from typing import List, Optional
+
 import typer
-from rich import print as rprint
-from rich.panel import Panel
-from rich.text import Text
-from rich.table import Table
-import pyperclip
-import typer
-from justbuild import __version__ as version, __description__ as short_description
-from justbuild.codediff.merging import merge as merge_files
-from justbuild.codediff.merging import merge_all
-from justbuild.config import load_config
-from justbuild.ui import show_full_banner
 
-config = load_config()
+from justbuild import __description__ as short_description
+from justbuild import __version__ as version
+from justbuild.config import Config, get_config
+
+# Heavier modules (openai, pyperclip, tqdm, the merge pipeline) are imported inside
+# the commands that need them, so `--help` and the banner start quickly
+
 app = typer.Typer(
     name="lfg",
     help="🚀 LFG! 💬 Chat Assisted Programming 💻 Merge LLM-generated code into your repo",
 )
 
 
+def _command_config(
+    no_cache=False,
+    batch=False,
+    llm_verbose=False,
+    max_llm_calls: Optional[int] = None,
+    max_cost: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> Config:
+    """The shared config with this command's LLM options applied"""
+    return replace(
+        get_config(),
+        cache_enabled=not no_cache,
+        llm_batching=batch,
+        llm_verbose=llm_verbose,
+        llm_max_calls=max_llm_calls,
+        llm_max_cost=max_cost,
+        llm_deadline=deadline,
+    )
+
+
+def _reused_note(updates: dict) -> str:
+    notes = []
+    if reused := updates.get("hunks", {}).get("reused", 0):
+        notes.append(f"{reused} hunks reused")
+    counters = updates.get("metrics", {}).get("counters", {})
+    if deferred := counters.get("llm.deferred", 0):
+        notes.append(f"{deferred} segments left to Greedy, LLM budget spent")
+    return f" ({', '.join(notes)})" if notes else ""
+
+
+def _report_profile(metrics, profile_output: Optional[Path]) -> None:
+    from justbuild.codediff.metrics import print_profile
+
+    print_profile(metrics.as_dict())
+    if profile_output:
+        metrics.dump(profile_output)
+        typer.echo(f"Chrome trace written to {profile_output}")
+
+
 @app.command()
 def paste(
-    file_path: str = typer.Argument(..., help="File path to paste the new code into"),
+    file_path: str = typer.Argument(
+        None,
+        help="File path to paste the new code into. Without it, every code block "
+        "labeled with a path is merged into that file",
+    ),
     dry_run: bool = typer.Option(
         False, "--dry-run", "-d", help="Show the changes without saving"
     ),
@@ -35,18 +76,92 @@ def paste(
     yes: bool = typer.Option(
         False, "--yes", "-y", help="Automatically resolve conflicts using LLM"
     ),
+    diff_backend: str = typer.Option(
+        None, "--diff-backend", help="Diff engine to use: 'git' or 'python'"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Ask the LLM again instead of reusing cached verdicts"
+    ),
+    batch: bool = typer.Option(
+        False, "--batch", help="Classify several diffs per LLM request"
+    ),
+    llm_verbose: bool = typer.Option(
+        False, "--llm-verbose", help="Have the LLM explain its verdicts (slower)"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print the time spent in each stage and LLM usage"
+    ),
+    profile_output: Optional[Path] = typer.Option(
+        None, "--profile-output", help="Also write a Chrome trace (JSON) to this path"
+    ),
+    max_llm_calls: Optional[int] = typer.Option(
+        None, "--max-llm-calls", help="Ask the LLM about at most this many segments"
+    ),
+    max_cost: Optional[float] = typer.Option(
+        None, "--max-cost", help="Estimated LLM spend limit per file, in USD"
+    ),
+    deadline: Optional[float] = typer.Option(
+        None, "--deadline", help="Seconds to wait for the LLM per file"
+    ),
+    jobs: int = typer.Option(
+        4, "--jobs", "-j", help="Number of pasted files to classify in parallel"
+    ),
 ):
     """
     Paste new code from clipboard into the specified file, preserving existing code where indicated.
     """
-    file_path = Path(file_path)
-    file_type_suffix = str(file_path).split(".")[-1]
+    import pyperclip
 
-    tempfilename = Path(tempfile.mkstemp(prefix="lfg-", suffix=file_type_suffix)[1])
+    from justbuild.codediff.merging import merge as merge_files
+    from justbuild.codediff.merging import merge_pasted
+    from justbuild.codediff.metrics import Metrics
+    from justbuild.codediff.paste import parse_code_blocks, print_summary
+
+    config = _command_config(
+        no_cache=no_cache,
+        batch=batch,
+        llm_verbose=llm_verbose,
+        max_llm_calls=max_llm_calls,
+        max_cost=max_cost,
+        deadline=deadline,
+    )
     new_code = pyperclip.paste()
     if not new_code:
         typer.echo("No code found in clipboard")
         raise typer.Exit()
+
+    metrics = Metrics()
+    if file_path is None:
+        files = parse_code_blocks(new_code)
+        if not files:
+            typer.echo(
+                "No code blocks labeled with a file path found in clipboard, "
+                "pass the file path to paste into"
+            )
+            raise typer.Exit(code=1)
+        results = merge_pasted(
+            files,
+            config=config,
+            yes=yes,
+            fast=fast,
+            interactive=interactive,
+            dry_run=dry_run,
+            jobs=jobs,
+            diff_backend=diff_backend,
+            metrics=metrics,
+        )
+        print_summary(results)
+        if profile or profile_output:
+            _report_profile(metrics, profile_output)
+        if any("error" in updates for updates in results.values()):
+            typer.echo("LFG 💥! Nothing was written, fix the errors and paste again")
+            raise typer.Exit(code=1)
+        raise typer.Exit()
+
+    file_path = Path(file_path)
+    file_type_suffix = str(file_path).split(".")[-1]
+
+    tempfilename = Path(tempfile.mkstemp(prefix="lfg-", suffix=file_type_suffix)[1])
     with open(tempfilename, "w") as file:
         file.write(new_code)
 
@@ -62,14 +177,19 @@ def paste(
         fast=fast,
         interactive=interactive,
         dry_run=dry_run,
+        diff_backend=diff_backend,
+        config=config,
+        metrics=metrics,
     )
     typer.echo(f"Code pasted and merged into {file_path} with updates:\n{updates}")
+    if profile or profile_output:
+        _report_profile(metrics, profile_output)
 
 
 @app.command()
 def merge(
-    updated_file: str = typer.Argument(..., help="Modified file path"),
-    old_file: str = typer.Argument(..., help="Original file path"),
+    updated_file: str = typer.Argument(None, help="Modified file path"),
+    old_file: str = typer.Argument(None, help="Original file path"),
     target_file: str = typer.Option(
         None, help="Path to the output file, defaults to `new_file`"
     ),
@@ -85,13 +205,74 @@ def merge(
     yes: bool = typer.Option(
         False, "--yes", "-y", help="Automatically resolve conflicts using LLM"
     ),
+    diff_backend: str = typer.Option(
+        None, "--diff-backend", help="Diff engine to use: 'git' or 'python'"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Ask the LLM again instead of reusing cached verdicts"
+    ),
+    batch: bool = typer.Option(
+        False, "--batch", help="Classify several diffs per LLM request"
+    ),
+    llm_verbose: bool = typer.Option(
+        False, "--llm-verbose", help="Have the LLM explain its verdicts (slower)"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print the time spent in each stage and LLM usage"
+    ),
+    profile_output: Optional[Path] = typer.Option(
+        None, "--profile-output", help="Also write a Chrome trace (JSON) to this path"
+    ),
+    max_llm_calls: Optional[int] = typer.Option(
+        None, "--max-llm-calls", help="Ask the LLM about at most this many segments"
+    ),
+    max_cost: Optional[float] = typer.Option(
+        None, "--max-cost", help="Estimated LLM spend limit per file, in USD"
+    ),
+    deadline: Optional[float] = typer.Option(
+        None, "--deadline", help="Seconds to wait for the LLM per file"
+    ),
+    jobs: int = typer.Option(
+        1, "--jobs", "-j", help="Number of files to classify in parallel"
+    ),
 ):
     """
     Merge changes from new_file into old_file, or merge changes in the entire repo if no files are specified.
     """
+    from justbuild.codediff.merging import merge as merge_files
+    from justbuild.codediff.merging import merge_all
+    from justbuild.codediff.metrics import Metrics
+
+    config = _command_config(
+        no_cache=no_cache,
+        batch=batch,
+        llm_verbose=llm_verbose,
+        max_llm_calls=max_llm_calls,
+        max_cost=max_cost,
+        deadline=deadline,
+    )
+    metrics = Metrics()
     if not old_file and not updated_file and not target_file:
-        typer.echo("No files specified to merge")
-        merge_all()
+        typer.echo("No files specified to merge, merging all staged changes")
+        results = merge_all(
+            config=config,
+            yes=yes,
+            fast=fast,
+            interactive=interactive,
+            dry_run=dry_run,
+            jobs=jobs,
+            metrics=metrics,
+        )
+        for file, updates in results.items():
+            if "error" in updates:
+                typer.echo(f"LFG 💥! {file}: {updates['error']}")
+            else:
+                typer.echo(
+                    f"LFG 🚀! {len(updates.get('changes', []))} Code Omissions Corrected: {file}"
+                    f"{_reused_note(updates)}"
+                )
+        if profile or profile_output:
+            _report_profile(metrics, profile_output)
         raise typer.Exit()
 
     old_file = Path(old_file) if old_file else None
@@ -106,14 +287,221 @@ def merge(
         fast=fast,
         interactive=interactive,
         dry_run=dry_run,
+        diff_backend=diff_backend,
+        config=config,
+        metrics=metrics,
     )
     typer.echo(
-        f"LFG 🚀! {len(updates.get('change_log',[]))} Code Omissions Corrected: {target_file}"
+        f"LFG 🚀! {len(updates.get('changes', []))} Code Omissions Corrected: {target_file}"
+        f"{_reused_note(updates)}"
     )
+    if profile or profile_output:
+        _report_profile(metrics, profile_output)
+
+
+@app.command()
+def watch(
+    paths: List[Path] = typer.Argument(..., help="Files or directories to watch"),
+    fast: bool = typer.Option(
+        False, "--fast", "-F", help="Skip the LLM model, just use hard-coded rules"
+    ),
+    interval: float = typer.Option(0.5, help="Seconds between checks of the files"),
+    debounce: float = typer.Option(
+        0.2, help="Seconds a file must stay unchanged before it is merged"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Ask the LLM again instead of reusing cached verdicts"
+    ),
+    batch: bool = typer.Option(
+        False, "--batch", help="Classify several diffs per LLM request"
+    ),
+):
+    """
+    Revert code omissions in files as soon as they are saved, until stopped.
+    """
+    from justbuild.codediff.watch import Watcher
+
+    def report(file: Path, updates: dict):
+        if "error" in updates:
+            typer.echo(f"LFG 💥! {file}: {updates['error']}")
+        elif updates["changes"]:
+            typer.echo(
+                f"LFG 🚀! {len(updates['changes'])} Code Omissions Corrected: {file}"
+                f"{_reused_note(updates)}"
+            )
+
+    watcher = Watcher(
+        paths,
+        config=_command_config(no_cache=no_cache, batch=batch),
+        fast=fast,
+        debounce=debounce,
+        on_merge=report,
+    )
+    typer.echo(f"LFG watching {len(watcher.signatures)} files (Ctrl+C to stop)")
+    try:
+        watcher.run(interval=interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def hook(
+    files: List[str] = typer.Argument(
+        None, help="Only check these staged files (default: all of them)"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Only use the Greedy model, ignore cached verdicts"
+    ),
+):
+    """
+    Fail a commit whose staged changes look like they omit code.
+
+    Pre-commit runs the same check through `lfg-hook`, which starts faster.
+    """
+    from justbuild.codediff.hook import check_staged
+
+    raise typer.Exit(code=check_staged(files, no_cache=no_cache))
+
+
+@app.command()
+def clear_cache():
+    """
+    Delete all the cached LLM verdicts and the remembered hunk verdicts.
+    """
+    from justbuild.codediff.hunk_memo import default_hunk_memo_path
+    from justbuild.codediff.llm_cache import VerdictCache
+
+    config = get_config()
+    cache = VerdictCache(config.cache_path)
+    entries = len(cache)
+    cache.clear()
+    typer.echo(f"Cleared {entries} cached LLM verdicts from {cache.path}")
+    memo = VerdictCache(config.hunk_memo_path or default_hunk_memo_path(config))
+    entries = len(memo)
+    memo.clear()
+    typer.echo(f"Cleared {entries} remembered hunk verdicts from {memo.path}")
+
+
+daemon_app = typer.Typer(
+    name="daemon",
+    help="Keep the merge pipeline warm in the background for editor integrations",
+)
+app.add_typer(daemon_app)
+
+
+@daemon_app.command("start")
+def daemon_start(
+    port: int = typer.Option(None, "--port", "-p", help="Localhost port to serve on"),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Ask the LLM again instead of reusing cached verdicts"
+    ),
+    batch: bool = typer.Option(
+        False, "--batch", help="Classify several diffs per LLM request"
+    ),
+):
+    """
+    Serve merge requests as JSON over localhost HTTP until stopped.
+    """
+    from justbuild.daemon import DEFAULT_PORT, MergeServer
+
+    config = _command_config(no_cache=no_cache, batch=batch)
+    server = MergeServer(port=port or DEFAULT_PORT, config=config)
+    typer.echo(f"LFG daemon listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@daemon_app.command("status")
+def daemon_status(
+    port: int = typer.Option(None, "--port", "-p", help="Port of the daemon"),
+):
+    """
+    Check that a daemon is running.
+    """
+    from justbuild.daemon import DEFAULT_PORT, request
+
+    try:
+        health = request("/health", port=port or DEFAULT_PORT)
+    except RuntimeError as e:
+        typer.echo(str(e))
+        raise typer.Exit(code=1)
+    typer.echo(
+        f"LFG daemon {health['version']} running (pid {health['pid']}), "
+        f"{health['requests']} requests served"
+    )
+
+
+@daemon_app.command("stop")
+def daemon_stop(
+    port: int = typer.Option(None, "--port", "-p", help="Port of the daemon"),
+):
+    """
+    Stop a running daemon.
+    """
+    from justbuild.daemon import DEFAULT_PORT, request
+
+    try:
+        request("/shutdown", {}, port=port or DEFAULT_PORT)
+    except RuntimeError as e:
+        typer.echo(str(e))
+        raise typer.Exit(code=1)
+    typer.echo("LFG daemon stopped")
+
+
+@daemon_app.command("merge")
+def daemon_merge(
+    updated_file: str = typer.Argument(..., help="Modified file path"),
+    old_file: str = typer.Argument(..., help="Original file path"),
+    target_file: str = typer.Option(
+        None, help="Path to the output file, defaults to `new_file`"
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", "-d", help="Print the merged code without saving"
+    ),
+    fast: bool = typer.Option(
+        False, "--fast", "-F", help="Skip the LLM model, just use hard-coded rules"
+    ),
+    root: Path = typer.Option(
+        None, help="Directory the files must be in, defaults to the current one"
+    ),
+    port: int = typer.Option(None, "--port", "-p", help="Port of the daemon"),
+):
+    """
+    Merge changes from new_file into old_file with a running daemon.
+    """
+    from justbuild.daemon import DEFAULT_PORT, request
+
+    payload = {
+        "root": str((root or Path.cwd()).resolve()),
+        "old_file": str(Path(old_file).resolve()),
+        "new_file": str(Path(updated_file).resolve()),
+        "target_file": str(Path(target_file).resolve()) if target_file else None,
+        "dry_run": dry_run,
+        "fast": fast,
+    }
+    try:
+        updates = request("/merge", payload, port=port or DEFAULT_PORT)
+    except RuntimeError as e:
+        typer.echo(f"LFG 💥! {e}")
+        raise typer.Exit(code=1)
+    if dry_run:
+        typer.echo(updates["output"])
+    else:
+        typer.echo(
+            f"LFG 🚀! {len(updates['changes'])} Code Omissions Corrected: "
+            f"{updates['target_file']}{_reused_note(updates)}"
+        )
 
 
 def display_banner():
     """Pagga font from figlet."""
+    from rich import print as rprint
+    from rich.panel import Panel
+
     banner = """[bold yellow]
  ░▀▀█░█░█░█▀▀░▀█▀░█▀▄░█░█░▀█▀░█░░░█▀▄
  ░░░█░█░█░▀▀█░░█░░█▀▄░█░█░░█░░█░░░█░█
@@ -125,6 +513,9 @@ def display_banner():
 
 
 def display_info():
+    from rich import print as rprint
+    from rich.table import Table
+
     table = Table(show_header=False, box=None)
     table.add_column("Key", style="cyan", no_wrap=True)
     table.add_column("Value", style="magenta")
@@ -138,9 +529,16 @@ def display_info():
 
 
 def display_commands():
+    from rich import print as rprint
+    from rich.table import Table
+
     commands = [
         ("paste", "Paste new code from clipboard into a file"),
         ("merge", "Merge changes between files or in the entire repo"),
+        ("clear-cache", "Delete the cached LLM and hunk verdicts"),
+        ("watch", "Revert code omissions in files as soon as they are saved"),
+        ("hook", "Check the staged changes for code omissions (pre-commit)"),
+        ("daemon", "Keep the merge pipeline warm for editor integrations"),
     ]
 
     table = Table(title="Available Commands", box=None)
@@ -156,4 +554,6 @@ def display_commands():
 @app.callback(invoke_without_command=True)
 def banner(ctx: typer.Context):
     if ctx.invoked_subcommand is None:
+        from justbuild.ui import show_full_banner
+
         show_full_banner("lfg", show_commands=False)
@@ -1,16 +1,9 @@
-import tempfile
-from pathlib import Path
-import typer
 from rich import print as rprint
 from rich.panel import Panel
-from rich.text import Text
 from rich.table import Table
-import pyperclip
-import typer
-from justbuild import (
-    __version__ as version,
-    __description__ as short_description,
-)
+
+from justbuild import __description__ as short_description
+from justbuild import __version__ as version
 
 
 def display_banner(command: str = "justbuild"):
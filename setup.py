@@ -42,6 +42,7 @@ setup(
     entry_points={
         "console_scripts": [
             "lfg=justbuild.lfg_cli:app",
+            "lfg-hook=justbuild.codediff.hook:main",
             "justbuild=justbuild.cli:app",
         ],
     },
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import unittest
+from dataclasses import replace
+from unittest import mock
+
+import openai
+
+from justbuild.backends import BACKENDS, UNMETERED, LLMBackend, register_backend
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.bench.fake_openai import FakeOpenAIServer
+from justbuild.codediff.merging import merge_code
+from justbuild.config import Config
+
+# No backend, URL or model picked by the environment running the tests
+CLEAN_ENV = {
+    "JUSTBUILD_LLM_BACKEND": "",
+    "JUSTBUILD_LLM_BASE_URL": "",
+    "JUSTBUILD_LLM_MODEL": "",
+    "JUSTBUILD_LLM_TIMEOUT": "",
+}
+
+
+def _stub_backend(server: FakeOpenAIServer, **kwargs) -> LLMBackend:
+    """A local server without auth, like `llama-server` or `ollama serve`"""
+    return LLMBackend(
+        "stub",
+        base_url=server.base_url,
+        model_name="stub-model",
+        api_key_env=None,
+        requests_per_minute=UNMETERED,
+        tokens_per_minute=UNMETERED,
+        **kwargs,
+    )
+
+
+@mock.patch.dict(os.environ, CLEAN_ENV)
+class TestBackends(unittest.TestCase):
+    def tearDown(self):
+        BACKENDS.pop("stub", None)
+
+    def test_openai_is_the_default(self):
+        with mock.patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"}):
+            config = Config.create(clients=False)
+        self.assertEqual(config.backend, "openai")
+        self.assertIsNone(config.base_url)
+        self.assertEqual(config.model_name, "gpt-3.5-turbo")
+        self.assertTrue(config.model_enabled)
+
+    def test_local_backends_need_no_api_key(self):
+        with mock.patch.dict(os.environ, {"OPENAI_API_KEY": ""}):
+            for name in ("ollama", "llamacpp", "vllm"):
+                config = Config.create(clients=False, backend=name)
+                self.assertTrue(config.model_enabled)
+                self.assertEqual(config.base_url, BACKENDS[name].base_url)
+                self.assertEqual(
+                    config.max_concurrent_requests,
+                    BACKENDS[name].max_concurrent_requests,
+                )
+
+    def test_environment_overrides(self):
+        env = {
+            "JUSTBUILD_LLM_BACKEND": "ollama",
+            "JUSTBUILD_LLM_BASE_URL": "http://gpu-box:11434/v1",
+            "JUSTBUILD_LLM_MODEL": "qwen2.5-coder",
+        }
+        with mock.patch.dict(os.environ, env):
+            config = Config.create(clients=False)
+        self.assertEqual(config.backend, "ollama")
+        self.assertEqual(config.base_url, "http://gpu-box:11434/v1")
+        self.assertEqual(config.model_name, "qwen2.5-coder")
+
+    def test_unknown_backend(self):
+        with self.assertRaisesRegex(ValueError, "Unknown LLM backend"):
+            Config.create(clients=False, backend="nope")
+
+    def test_merge_against_a_local_server(self):
+        old_code, new_code = synthetic_pair(300)
+        with FakeOpenAIServer(latency=0.02) as server:
+            register_backend(_stub_backend(server, max_concurrent_requests=2))
+            config = replace(Config.create(backend="stub"), cache_enabled=False)
+            self.assertEqual(config.max_concurrent_requests, 2)
+            merge_code(old_code, new_code, config=config, yes=True)
+
+            self.assertGreater(server.requests, 2)
+            self.assertEqual(server.model, "stub-model")
+            self.assertEqual(server.max_in_flight, 2)
+
+    def test_request_timeout(self):
+        with FakeOpenAIServer(latency=1.0) as server:
+            config = Config.create(backend=_stub_backend(server, timeout=0.1))
+            request = config.async_client.chat.completions.create(
+                model=config.model_name, messages=[{"role": "user", "content": "?"}]
+            )
+            with self.assertRaises(openai.APITimeoutError):
+                asyncio.run(request)
+
+    def test_clients_use_the_config_timeout(self):
+        with FakeOpenAIServer() as server:
+            config = Config.create(backend=_stub_backend(server, timeout=7.0))
+        self.assertEqual(config.request_timeout, 7.0)
+        self.assertEqual(config.client.timeout.read, 7.0)
+        self.assertEqual(config.async_client.timeout.read, 7.0)
+
+        with FakeOpenAIServer() as server, mock.patch.dict(
+            os.environ, {"JUSTBUILD_LLM_TIMEOUT": "3"}
+        ):
+            config = Config.create(backend=_stub_backend(server, timeout=7.0))
+        self.assertEqual(config.request_timeout, 3.0)
+        self.assertEqual(config.async_client.timeout.read, 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
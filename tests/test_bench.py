@@ -0,0 +1,35 @@
+import unittest
+
+from justbuild.bench import compare, run_benchmarks
+from justbuild.bench.corpus import synthetic_files, synthetic_pair
+from justbuild.codediff.diff_engine import diff_code
+
+
+class TestCorpus(unittest.TestCase):
+    def test_synthetic_pair_is_deterministic(self):
+        self.assertEqual(synthetic_pair(300, seed=1), synthetic_pair(300, seed=1))
+        old_code, new_code = synthetic_pair(300)
+        self.assertAlmostEqual(old_code.count("\n"), 300, delta=15)
+        self.assertTrue(diff_code(old_code, new_code).changes)
+
+    def test_synthetic_files(self):
+        self.assertEqual(len(synthetic_files(5, 50)), 5)
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_run_and_compare(self):
+        report = run_benchmarks([200], [3], lines_per_file=50, repeat=1, llm=True)
+        self.assertEqual(
+            [r["case"] for r in report["results"]], ["lines=200", "files=3"]
+        )
+        stages = report["results"][0]["stages"]
+        self.assertIn("diff_code", stages)
+        self.assertIn("LLMModel.predict", stages)
+
+        rows = compare(report, report)
+        self.assertTrue(rows)
+        self.assertTrue(all(row["ratio"] == 1.0 for row in rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
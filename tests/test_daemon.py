@@ -0,0 +1,131 @@
+import http.client
+import stat
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from justbuild.config import Config
+from justbuild.daemon import MergeServer, request
+
+OLD_CODE = (
+    "def f():\n" + "".join(f"    x{i} = {i}\n" for i in range(8)) + "    return 1\n"
+)
+NEW_CODE = (
+    "def f():\n    # ... (rest of the previous code remains the same)\n    return 1\n"
+)
+
+
+class TestMergeServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = MergeServer(
+            port=0,
+            config=Config(cache_enabled=False),
+            token_file=Path(self.tmp.name) / "daemon.token",
+        )
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self._request("/shutdown", {})
+        self.thread.join(timeout=5)
+        self.server.server_close()
+        self.assertFalse(self.server.token_file.exists())
+        self.tmp.cleanup()
+
+    def _request(self, endpoint, payload=None):
+        return request(endpoint, payload, port=self.port, token=self.server.token)
+
+    def _raw_request(self, method="POST", body=b"{}", **headers) -> int:
+        """The status of a request with other headers than the client's"""
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            connection.request(method, "/merge_code", body=body, headers=headers)
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    def test_merge_code(self):
+        response = self._request(
+            "/merge_code", {"old_code": OLD_CODE, "new_code": NEW_CODE, "fast": True}
+        )
+        self.assertEqual(response["output"], OLD_CODE)
+        self.assertEqual(len(response["changes"]), 1)
+        self.assertEqual(self._request("/health")["requests"], 1)
+
+    def test_merge_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            old_file, new_file = Path(tmp) / "old.py", Path(tmp) / "new.py"
+            old_file.write_text(OLD_CODE)
+            new_file.write_text(NEW_CODE)
+            payload = {
+                "root": tmp,
+                "old_file": str(old_file),
+                "new_file": str(new_file),
+            }
+
+            dry_run = self._request(
+                "/merge", {**payload, "dry_run": True, "fast": True}
+            )
+            self.assertEqual(dry_run["output"], OLD_CODE)
+            self.assertEqual(new_file.read_text(), NEW_CODE)
+
+            self._request("/merge", {**payload, "fast": True})
+            self.assertEqual(new_file.read_text(), OLD_CODE)
+
+            outside = {**payload, "target_file": str(Path(self.tmp.name) / "x.py")}
+            with self.assertRaisesRegex(RuntimeError, "is outside of"):
+                self._request("/merge", outside)
+            with self.assertRaisesRegex(RuntimeError, "root must be"):
+                self._request("/merge", {**payload, "root": None})
+
+    def test_errors(self):
+        with self.assertRaisesRegex(RuntimeError, "old_file is required"):
+            self._request("/merge", {"new_file": "x.py"})
+        with self.assertRaisesRegex(RuntimeError, "Unknown endpoint"):
+            self._request("/nope", {})
+        # The server keeps serving after a failed request
+        self.assertEqual(self._request("/health")["status"], "ok")
+
+    def test_unauthorized_requests(self):
+        self.assertEqual(stat.S_IMODE(self.server.token_file.stat().st_mode), 0o600)
+        with self.assertRaisesRegex(RuntimeError, "wrong daemon token"):
+            request("/health", port=self.port, token="guess")
+
+        authorization = f"Bearer {self.server.token}"
+        json_type = "application/json"
+        host = f"127.0.0.1:{self.port}"
+        self.assertEqual(
+            self._raw_request(Host=host, **{"Content-Type": json_type}), 401
+        )
+        # DNS rebinding: the right token cannot come from a page of another host
+        self.assertEqual(
+            self._raw_request(
+                Host=f"evil.example:{self.port}",
+                Authorization=authorization,
+                **{"Content-Type": json_type},
+            ),
+            403,
+        )
+        # What a browser may send cross-origin without a preflight
+        self.assertEqual(
+            self._raw_request(
+                Host=host,
+                Authorization=authorization,
+                **{"Content-Type": "text/plain"},
+            ),
+            415,
+        )
+        self.assertEqual(self.server.requests, 0)
+
+
+class TestClient(unittest.TestCase):
+    def test_no_daemon(self):
+        with self.assertRaisesRegex(RuntimeError, "No lfg daemon"):
+            request("/health", port=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.codediff import diff_engine
+from justbuild.codediff.diff_engine import diff_code, get_code_diffs
+from justbuild.codediff.git_wrappers import is_git_installed
+
+OLD_CODE = """import os
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        data = f.read()
+    data = data.strip()
+    return data
+
+
+def save(path, data):
+    with open(path, "w") as f:
+        f.write(data)
+
+
+def main():
+    data = load(sys.argv[1])
+    save(sys.argv[2], data)
+"""
+
+# (name, new_code) pairs diffed against OLD_CODE
+GOLDEN_CORPUS = [
+    (
+        "placeholder",
+        OLD_CODE.replace(
+            """    with open(path) as f:
+        data = f.read()
+    data = data.strip()
+    return data
+""",
+            "    # ... (rest of the previous code remains the same)\n",
+        ),
+    ),
+    ("single_line_change", OLD_CODE.replace("import sys", "import json")),
+    ("insertion", OLD_CODE.replace("import sys\n", "import sys\nimport json\n")),
+    ("deletion", OLD_CODE.replace("    data = data.strip()\n", "")),
+    (
+        "two_hunks",
+        "import os\nimport pathlib\n"
+        + OLD_CODE[len("import os\nimport sys\n") :].replace(
+            "save(sys.argv[2], data)", "# ... (rest remains the same)"
+        ),
+    ),
+    ("no_trailing_newline", OLD_CODE.rstrip("\n") + "\n    print(data)"),
+    ("identical", OLD_CODE),
+    (
+        "moved_block",  # Where a patience diff and git's Myers diff part ways
+        OLD_CODE.replace("def load(", "def _load(").replace(
+            "def main():", "def main():\n    pass\n\n\ndef other():"
+        ),
+    ),
+]
+
+
+def _as_tuples(code_diffs):
+    return [
+        (
+            diff.old_start,
+            diff.old_count,
+            diff.new_start,
+            diff.new_count,
+            [(s.type, s.content) for s in diff.segments],
+        )
+        for diff in code_diffs.changes
+    ]
+
+
+class TestDiffEngine(unittest.TestCase):
+    def test_placeholder_segments(self):
+        diffs = diff_code(OLD_CODE, GOLDEN_CORPUS[0][1])
+        self.assertEqual(len(diffs.changes), 1)
+        types = [s.type for s in diffs.changes[0].segments]
+        self.assertEqual(types, ["unchanged", "deletion", "addition", "unchanged"])
+        self.assertEqual(len(diffs.changes[0].segments[1].content), 4)
+
+    def test_empty_old_code(self):
+        diffs = diff_code("", "a\nb\n")
+        self.assertEqual(diffs.changes[0].old_start, 0)
+        self.assertEqual(diffs.changes[0].new_start, 1)
+        self.assertEqual(diffs.changes[0].segments[0].content, ["a", "b"])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_code_diffs("a.py", "b.py", backend="svn")
+
+    @unittest.skipUnless(is_git_installed(), "git is not installed")
+    def test_golden_corpus_matches_git(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            old_file = Path(tmp) / "old.py"
+            old_file.write_text(OLD_CODE)
+            for name, new_code in GOLDEN_CORPUS:
+                with self.subTest(name=name):
+                    new_file = Path(tmp) / f"{name}.py"
+                    new_file.write_text(new_code)
+                    git_diffs = get_code_diffs(old_file, new_file, backend="git")
+                    python_diffs = get_code_diffs(old_file, new_file, backend="python")
+                    self.assertEqual(_as_tuples(python_diffs), _as_tuples(git_diffs))
+                    self.assertEqual(
+                        [d.raw_code_diff for d in python_diffs.changes],
+                        [d.raw_code_diff for d in git_diffs.changes],
+                    )
+
+    @unittest.skipUnless(is_git_installed(), "git is not installed")
+    def test_patience_matcher_matches_git(self):
+        """Large files go through the patience anchors, small ones through difflib"""
+        with tempfile.TemporaryDirectory() as tmp:
+            old_file, new_file = Path(tmp) / "old.py", Path(tmp) / "new.py"
+            for lines in (300, 20_000):
+                for seed in range(3):
+                    with self.subTest(lines=lines, seed=seed):
+                        old_code, new_code = synthetic_pair(lines, seed=seed)
+                        old_file.write_text(old_code)
+                        new_file.write_text(new_code)
+                        git_diffs = get_code_diffs(old_file, new_file, backend="git")
+                        self.assertEqual(
+                            _as_tuples(diff_code(old_code, new_code)),
+                            _as_tuples(git_diffs),
+                        )
+
+    def test_small_ranges_are_matched_by_difflib(self):
+        a = ["def a():", "    pass", "", "", "def b():", "    pass"]
+        b = a[4:] + a[2:4] + a[:2]  # The functions swapped
+        matcher = diff_engine._PatienceMatcher(None, a, b, autojunk=False)
+        self.assertEqual(
+            matcher.get_opcodes(),
+            diff_engine.difflib.SequenceMatcher(
+                None, a, b, autojunk=False
+            ).get_opcodes(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.codediff.diff_engine import diff_code
+from justbuild.codediff.features import (
+    build_feature_table,
+    build_features,
+    is_known_code_placeholder,
+    is_likely_comment,
+    keyword_based_detection,
+    line_flags,
+)
+
+
+class TestLineFlags(unittest.TestCase):
+    def test_single_lines(self):
+        cases = {
+            "x = 1": (False, False, False, False),
+            "    # ... (rest of the previous code remains the same)": (
+                True,
+                True,
+                True,
+                True,
+            ),
+            "// Code Was Here": (True, True, False, True),
+            "x = f(...)  # Code Was Here": (False, True, True, True),
+            "print('Code Was Here')": (False, False, False, True),
+            "rem old basic": (True, False, False, False),
+            "*/": (True, False, False, False),
+            "x = 1  */": (False, False, False, False),
+        }
+        for line, expected in cases.items():
+            with self.subTest(line=line):
+                flags = line_flags([line])
+                self.assertEqual(
+                    (
+                        flags["has_comment"],
+                        flags["has_placeholder_word"],
+                        flags["has_ellipsis"],
+                        flags["has_keyword"],
+                    ),
+                    expected,
+                )
+                self.assertEqual(is_likely_comment(line), expected[0])
+                self.assertEqual(is_known_code_placeholder(line), expected[1])
+                self.assertEqual(keyword_based_detection(line), expected[3])
+
+    def test_flags_are_any_over_lines(self):
+        flags = line_flags(["x = 1", "# a comment", "y = [...]"])
+        self.assertTrue(flags["has_comment"])
+        self.assertTrue(flags["has_ellipsis"])
+        self.assertFalse(flags["has_keyword"])
+        self.assertFalse(any(line_flags([]).values()))
+
+
+class TestFeatureTable(unittest.TestCase):
+    def test_rows_match_segment_features(self):
+        diffs = diff_code(*synthetic_pair(2_000))
+        build_features(diffs)
+        expected = [
+            segment.features for diff in diffs.changes for segment in diff.segments[1:]
+        ]
+        table = build_feature_table(diffs)
+        self.assertEqual(len(table), len(expected))
+        self.assertEqual([table.row(i) for i in range(len(table))], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
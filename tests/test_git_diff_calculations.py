@@ -0,0 +1,195 @@
+import os
+import subprocess
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from justbuild.codediff.git_diff_calculations import (
+    CodeDiffs,
+    diff_file_path,
+    iter_git_diff,
+    parse_git_diff,
+    split_git_diff,
+    split_git_diff_lines,
+)
+from justbuild.codediff.git_wrappers import run_git_diff, stream_git_diff
+
+MULTI_FILE_DIFF = """diff --git a/b.bin b/b.bin
+index 87ae6b6..22f6b3b 100644
+Binary files a/b.bin and b/b.bin differ
+diff --git a/d.py b/d.py
+deleted file mode 100644
+index bca70f3..0000000
+--- a/d.py
++++ /dev/null
+@@ -1 +0,0 @@
+-q
+diff --git a/new.py b/new.py
+new file mode 100644
+index 0000000..8ba3a16
+--- /dev/null
++++ b/new.py
+@@ -0,0 +1 @@
++n
+diff --git a/x.py b/x.py
+index 422c2b7..55dce13 100644
+--- a/x.py
++++ b/x.py
+@@ -1,2 +1,2 @@
+ a
+-b
++B
+"""
+
+# git ends names with spaces with a tab, and quotes non-ASCII names
+SPACED_PATHS_DIFF = """diff --git a/gone file.py b/gone file.py
+deleted file mode 100644
+index 587be6b..0000000
+--- a/gone file.py\t
++++ /dev/null
+@@ -1 +0,0 @@
+-x
+diff --git a/my file.py b/my file.py
+index 7898192..6178079 100644
+--- a/my file.py\t
++++ b/my file.py\t
+@@ -1 +1 @@
+-a
++b
+diff --git "a/new \\303\\251.py" "b/new \\303\\251.py"
+new file mode 100644
+index 0000000..8ba3a16
+--- /dev/null
++++ "b/new \\303\\251.py"\t
+@@ -0,0 +1 @@
++n
+"""
+
+
+class TestGitDiffCalculations(unittest.TestCase):
+    def test_parse_single_line_header(self):
+        diffs = parse_git_diff("--- a/x.py\n+++ b/x.py\n@@ -3 +3 @@\n-b\n+B\n")
+        self.assertEqual(diffs.changes[0].old_count, 1)
+        self.assertEqual(diffs.changes[0].new_start, 3)
+        self.assertEqual(
+            [s.type for s in diffs.changes[0].segments], ["deletion", "addition"]
+        )
+
+    def test_parse_multiple_files_raises(self):
+        with self.assertRaises(ValueError):
+            parse_git_diff(MULTI_FILE_DIFF)
+
+    def test_deleted_lines_that_look_like_file_headers(self):
+        # `-- note` comments (SQL, Lua, Haskell) read `--- note` once deleted
+        diffs = parse_git_diff(
+            "--- a/q.sql\n+++ b/q.sql\n@@ -1,3 +1,3 @@\n SELECT 1;\n--- old note\n"
+            "+++ new note\n SELECT 2;\n"
+        )
+        self.assertEqual(diffs.old_file, "a/q.sql")
+        self.assertEqual(diffs.new_file, "b/q.sql")
+        self.assertEqual(
+            diffs.changes[0].lines,
+            [" SELECT 1;", "--- old note", "+++ new note", " SELECT 2;"],
+        )
+
+    def test_split_git_diff(self):
+        per_file = list(split_git_diff(MULTI_FILE_DIFF))
+        self.assertEqual(
+            [diff_file_path(d.new_file) for d in per_file],
+            ["/dev/null", "new.py", "x.py"],
+        )
+        x_diff = per_file[-1].changes[0]
+        self.assertEqual([s.content for s in x_diff.segments], [["a"], ["b"], ["B"]])
+
+    def test_split_paths_with_spaces(self):
+        self.assertEqual(
+            [path for path, _ in split_git_diff_lines(MULTI_FILE_DIFF)],
+            ["d.py", "new.py", "x.py"],
+        )
+        self.assertEqual(
+            [path for path, _ in split_git_diff_lines(SPACED_PATHS_DIFF)],
+            ["gone file.py", "my file.py", "new \u00e9.py"],
+        )
+
+    def test_segments_share_the_diff_lines(self):
+        diffs = parse_git_diff(
+            "--- a/x.py\n+++ b/x.py\n@@ -1,2 +1,2 @@\n a\n-b\n+B\n"
+            "@@ -9 +9,2 @@\n c\n+d\n"
+        )
+        first, second = diffs.changes
+        self.assertIs(first.lines, second.lines)
+        self.assertEqual(first.lines, [" a", "-b", "+B", " c", "+d"])
+        self.assertEqual([(s.start, s.end) for s in second.segments], [(3, 4), (4, 5)])
+        self.assertEqual(first.raw_code_diff, " a\n-b\n+B\n")
+        self.assertEqual(second.segments[1].text, "d")
+        self.assertFalse(hasattr(second.segments[1], "__dict__"))
+
+
+class TestStreamingParser(unittest.TestCase):
+    def test_hunks_are_yielded_as_they_close(self):
+        read = []
+
+        def pipe():
+            for line in ["--- a/x.py\n", "+++ b/x.py\n", "@@ -1 +1 @@\n", "-a\n"]:
+                read.append(line)
+                yield line
+            for line in ["+A\n", "@@ -9 +9 @@\n", "-b\n", "+B\n"]:
+                read.append(line)
+                yield line
+
+        code_diffs = CodeDiffs(old_file="", new_file="", changes=[])
+        hunks = iter_git_diff(pipe(), code_diffs)
+        first = next(hunks)
+        self.assertEqual(len(read), 6)  # The second hunk is not read yet
+        self.assertEqual([s.content for s in first.segments], [["a"], ["A"]])
+        self.assertEqual(code_diffs.new_file, "b/x.py")
+        self.assertEqual(len(list(hunks)), 1)
+        self.assertEqual(len(code_diffs.changes), 2)
+
+    def test_stream_git_diff_matches_run_git_diff(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            old_file, new_file = Path(tmp) / "old.py", Path(tmp) / "new.py"
+            old_file.write_text("a\nb\nc\n")
+            new_file.write_text("a\nB\nc")
+            streamed = parse_git_diff(stream_git_diff(old_file, new_file))
+            buffered = parse_git_diff(run_git_diff(old_file, new_file))
+        self.assertEqual(
+            [d.raw_code_diff for d in streamed.changes],
+            [d.raw_code_diff for d in buffered.changes],
+        )
+        self.assertEqual(streamed.new_file, buffered.new_file)
+
+    @unittest.skipUnless(os.name == "posix", "the fake git is a shell script")
+    def test_stream_git_diff_with_a_lot_of_stderr(self):
+        # More stderr than a pipe holds, written before any of the diff
+        script = (
+            "#!/bin/sh\nhead -c 1000000 /dev/zero | tr '\\0' w >&2\n"
+            "printf -- '--- a/x.py\\n+++ b/x.py\\n'\nexit 2\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            git = Path(tmp) / "git"
+            git.write_text(script)
+            git.chmod(0o755)
+            path = tmp + os.pathsep + os.environ.get("PATH", "")
+            lines, errors = [], []
+
+            def stream():
+                try:
+                    lines.extend(stream_git_diff(None, "x.py"))
+                except subprocess.CalledProcessError as e:
+                    errors.append(e)
+
+            with mock.patch.dict(os.environ, {"PATH": path}):
+                thread = threading.Thread(target=stream, daemon=True)
+                thread.start()
+                thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(lines, ["--- a/x.py\n", "+++ b/x.py\n"])
+        self.assertEqual(errors[0].returncode, 2)
+        self.assertEqual(len(errors[0].stderr), 1_000_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.codediff.git_wrappers import is_git_installed
+from justbuild.codediff.hook import scan_staged
+from justbuild.codediff.merging import merge_code
+from justbuild.config import Config
+
+# Wall time of `lfg-hook` (python startup included) on a typical commit
+HOOK_LATENCY_BUDGET_S = 0.3
+
+OLD_CODE = (
+    "def f():\n" + "".join(f"    x{i} = {i}\n" for i in range(8)) + "    return 1\n"
+)
+NEW_CODE = (
+    "def f():\n    # ... (rest of the previous code remains the same)\n    return 1\n"
+)
+
+GIT = ["git", "-c", "user.name=lfg", "-c", "user.email=lfg@example.com"]
+
+
+@unittest.skipUnless(is_git_installed(), "git is not installed")
+class TestHook(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = {**os.environ, "XDG_CACHE_HOME": str(Path(self.tmp.name) / "cache")}
+        self.repo = Path(self.tmp.name) / "repo"
+        self.repo.mkdir()
+        os.chdir(self.repo)
+        subprocess.run(GIT + ["init", "-q"], check=True)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def _commit(self, files: dict):
+        for name, code in files.items():
+            Path(name).write_text(code)
+        subprocess.run(GIT + ["add", "."], check=True)
+        subprocess.run(GIT + ["commit", "-q", "-m", "update"], check=True)
+
+    def _stage(self, files: dict):
+        for name, code in files.items():
+            Path(name).write_text(code)
+        subprocess.run(GIT + ["add", "."], check=True)
+
+    def _config(self, **kwargs) -> Config:
+        cache = Path(self.tmp.name) / "cache"
+        return Config(
+            cache_path=str(cache / "llm.sqlite3"),
+            hunk_memo_path=str(cache / "hunks.sqlite3"),
+            **kwargs,
+        )
+
+    def test_reports_staged_omissions(self):
+        self._commit({"a.py": OLD_CODE, "b.py": OLD_CODE})
+        self._stage({"a.py": NEW_CODE, "b.py": OLD_CODE.replace("1\n", "2\n")})
+
+        findings = scan_staged(self._config())
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0]["file"], "a.py")
+        self.assertEqual(findings[0]["line"], 2)
+        self.assertEqual(findings[0]["omitted_lines"], 8)
+        self.assertEqual(findings[0]["source"], "greedy")
+        self.assertEqual(scan_staged(self._config(), files=["b.py"]), [])
+
+    def test_deleted_sql_comment_does_not_crash(self):
+        sql = "SELECT 1;\n-- old note\nSELECT 2;\n"
+        self._commit({"q.sql": sql, "a.py": OLD_CODE})
+        self._stage({"q.sql": sql.replace("-- old note\n", ""), "a.py": NEW_CODE})
+
+        findings = scan_staged(self._config())
+        self.assertEqual([finding["file"] for finding in findings], ["a.py"])
+
+    def test_path_with_spaces(self):
+        self._commit({"my file.py": OLD_CODE})
+        self._stage({"my file.py": NEW_CODE})
+
+        findings = scan_staged(self._config())
+        self.assertEqual([finding["file"] for finding in findings], ["my file.py"])
+
+    def test_unreadable_file_is_skipped(self):
+        diff = "diff --git a/x.py b/x.py\n--- a/x.py\n+++ b/x.py\n@@ nonsense @@\n+x\n"
+        with mock.patch("sys.stderr") as stderr:
+            self.assertEqual(scan_staged(self._config(), diff_lines=diff), [])
+        self.assertIn(
+            "skipped x.py", "".join(c.args[0] for c in stderr.write.call_args_list)
+        )
+
+    def test_remembered_human_label_wins(self):
+        self._commit({"a.py": OLD_CODE})
+        self._stage({"a.py": NEW_CODE})
+
+        # A human said this placeholder is fine in an earlier merge
+        config = self._config()
+
+        def reject(inputs, label, default_confidence):
+            return [
+                {"_id": row["_id"], "is_code_omission": False, "confidence": 1.0}
+                for row in inputs
+            ]
+
+        with mock.patch("justbuild.codediff.merging.labeling", side_effect=reject):
+            merge_code(OLD_CODE, NEW_CODE, config=config, fast=True)
+        self.assertEqual(scan_staged(config), [])
+        self.assertEqual(len(scan_staged(self._config(cache_enabled=False))), 1)
+
+    def test_nothing_is_written(self):
+        self._commit({"a.py": OLD_CODE})
+        self._stage({"a.py": NEW_CODE})
+        cache = Path(self.tmp.name) / "cache"
+
+        scan_staged(self._config())
+        self.assertFalse(cache.exists())  # No merge ran yet, nothing to read
+
+        merge_code(OLD_CODE, NEW_CODE, config=self._config(), fast=True, yes=True)
+        before = {p: (p.stat().st_mtime_ns, p.read_bytes()) for p in cache.iterdir()}
+        self.assertEqual(scan_staged(self._config())[0]["source"], "memo")
+        after = {p: (p.stat().st_mtime_ns, p.read_bytes()) for p in cache.iterdir()}
+        self.assertEqual(after, before)
+
+    def test_exit_code_and_latency_budget(self):
+        # A typical commit: a few files with a few hundred lines each
+        pairs = [synthetic_pair(300, seed=seed) for seed in range(5)]
+        self._commit({f"f{i}.py": old for i, (old, _) in enumerate(pairs)})
+        self._stage({f"f{i}.py": new for i, (_, new) in enumerate(pairs)})
+
+        command = [sys.executable, "-m", "justbuild.codediff.hook"]
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            result = subprocess.run(
+                command, capture_output=True, text=True, env=self.env
+            )
+            timings.append(time.perf_counter() - start)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("likely code omissions", result.stderr)
+        self.assertLess(min(timings), HOOK_LATENCY_BUDGET_S)
+
+        self._stage({f"f{i}.py": old for i, (old, _) in enumerate(pairs)})
+        result = subprocess.run(command, capture_output=True, env=self.env)
+        self.assertEqual(result.returncode, 0)
+
+    def test_hook_does_not_import_the_llm_client(self):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, justbuild.codediff.hook; "
+                "print(sorted({'openai', 'rich', 'tqdm'} & set(sys.modules)))",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
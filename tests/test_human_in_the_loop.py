@@ -0,0 +1,52 @@
+import io
+import unittest
+from unittest import mock
+
+from rich.console import Console
+
+from justbuild.codediff.human_in_the_loop import labeling
+
+
+class TestLabeling(unittest.TestCase):
+    def setUp(self):
+        self.output = io.StringIO()
+        self.console = Console(file=self.output, width=80)
+
+    def test_labels_a_stream_of_diffs(self):
+        def samples():
+            for i in range(3):
+                yield {"_id": i, "_diff": f"-old {i}\n+new {i}\n"}
+
+        answers = [True, False, True]
+        with mock.patch("typer.confirm", side_effect=answers), mock.patch.object(
+            self.console, "clear", wraps=self.console.clear
+        ) as clear:
+            labels = labeling(samples(), label="is_code_omission", console=self.console)
+        self.assertEqual([row["_id"] for row in labels], [0, 1, 2])
+        self.assertEqual([row["is_code_omission"] for row in labels], answers)
+        # The screen is cleared once, each diff is printed below the previous one
+        self.assertEqual(clear.call_count, 1)
+        text = self.output.getvalue()
+        self.assertEqual(text.count("Please Label"), 1)
+        for i in range(3):
+            self.assertIn(f"Reviewing diff {i + 1}", text)
+            self.assertIn(f"+new {i}", text)
+
+    def test_counts_a_list_of_diffs(self):
+        samples = [{"_id": 0, "_diff": "-a\n+b\n"}, {"_id": 1, "_diff": "-c\n+d\n"}]
+        with mock.patch("typer.confirm", return_value=False):
+            labeling(samples, console=self.console)
+        self.assertIn("Reviewing diff 2 of 2", self.output.getvalue())
+
+    def test_errors_of_the_stream_are_raised(self):
+        def samples():
+            yield {"_id": 0, "_diff": "-a\n+b\n"}
+            raise RuntimeError("classification failed")
+
+        with mock.patch("typer.confirm", return_value=False):
+            with self.assertRaisesRegex(RuntimeError, "classification failed"):
+                labeling(samples(), console=self.console)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""Guards the CLI startup time: `lfg --help` must not pay for the merge pipeline"""
+
+import subprocess
+import sys
+import unittest
+
+# Cumulative `python -X importtime` budget for `import justbuild.lfg_cli`
+# (typer and rich alone take ~150 ms on a laptop, openai adds ~300 ms)
+IMPORT_TIME_BUDGET_US = 600_000
+
+HEAVY_MODULES = [
+    "openai",
+    "dotenv",
+    "pyperclip",
+    "tqdm",
+    "justbuild.codediff.merging",
+]
+
+
+def _import_times(module: str) -> dict:
+    """Cumulative import time in microseconds of every module imported by `module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_cli_does_not_import_heavy_modules(self):
+        for module in ["justbuild.lfg_cli", "justbuild.cli"]:
+            times = _import_times(module)
+            with self.subTest(module=module):
+                self.assertEqual([m for m in HEAVY_MODULES if m in times], [])
+
+    def test_cli_import_time_budget(self):
+        times = _import_times("justbuild.lfg_cli")
+        self.assertLess(times["justbuild.lfg_cli"], IMPORT_TIME_BUDGET_US)
+
+
+if __name__ == "__main__":
+    unittest.main()
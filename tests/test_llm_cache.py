@@ -0,0 +1,88 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from justbuild.codediff.llm_cache import VerdictCache, verdict_key
+from justbuild.codediff.models_llm import LLMModel
+from justbuild.config import Config
+
+
+class FakeClient:
+    """Stands in for `OpenAI` and always answers 'yes'"""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content="Ellipsis comment. yes")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")]
+        )
+
+
+class TestVerdictCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "cache.sqlite3"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_every_part(self):
+        key = verdict_key("system", "gpt", 0.0, "diff")
+        self.assertEqual(key, verdict_key("system", "gpt", 0, "diff"))
+        self.assertNotEqual(key, verdict_key("system", "gpt", 0.5, "diff"))
+        self.assertNotEqual(key, verdict_key("system", "gpt-4", 0.0, "diff"))
+        self.assertNotEqual(key, verdict_key("system2", "gpt", 0.0, "diff"))
+
+    def test_get_set_and_counters(self):
+        cache = VerdictCache(self.path)
+        self.assertIsNone(cache.get("k"))
+        cache.set("k", {"is_code_omission": True, "confidence": 0.95})
+        self.assertEqual(cache.get("k")["is_code_omission"], True)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_eviction(self):
+        cache = VerdictCache(self.path)
+        for i in range(5):
+            cache.set(f"k{i}", {"i": i})
+            time.sleep(0.01)
+        cache.close()
+
+        cache = VerdictCache(self.path, max_entries=2)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get("k4"))
+        cache.close()
+
+        cache = VerdictCache(self.path, max_age_days=0)
+        self.assertEqual(len(cache), 0)
+
+    def test_llm_model_reuses_verdicts(self):
+        client = FakeClient()
+        config = Config(client=client, cache_path=str(self.path))
+        feature = {"_id": 0, "_diff": "-a\n-b\n+# ...", "_curr_segment": "# ..."}
+
+        model = LLMModel(config=config)
+        self.assertTrue(
+            model.predict([feature], code_diffs=None)[0]["is_code_omission"]
+        )
+        model = LLMModel(config=config)
+        self.assertTrue(
+            model.predict([feature], code_diffs=None)[0]["is_code_omission"]
+        )
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(model.cache_stats(), {"hits": 1, "misses": 0})
+
+        config.cache_enabled = False
+        LLMModel(config=config).predict([feature], code_diffs=None)
+        self.assertEqual(client.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from unittest import mock
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.bench.fake_openai import FakeOpenAIServer
+from justbuild.codediff import merge_all, merge_code, merging
+from justbuild.codediff.git_diff_calculations import parse_git_diff
+from justbuild.codediff.git_wrappers import is_git_installed
+from justbuild.config import Config
+
+OLD_CODE = (
+    "def f():\n" + "".join(f"    x{i} = {i}\n" for i in range(8)) + "    return 1\n"
+)
+NEW_CODE = (
+    "def f():\n    # ... (rest of the previous code remains the same)\n    return 1\n"
+)
+
+
+class TestMergeCode(unittest.TestCase):
+    def test_fast_merge_reverts_placeholder(self):
+        output, updates = merge_code(
+            OLD_CODE, NEW_CODE, config=Config(cache_enabled=False), fast=True, yes=True
+        )
+        self.assertEqual(output, OLD_CODE)
+        self.assertEqual(len(updates["changes"]), 1)
+
+    def test_fast_merge_keeps_real_changes(self):
+        new_code = OLD_CODE.replace("return 1", "return 2")
+        output, updates = merge_code(
+            OLD_CODE, new_code, config=Config(cache_enabled=False), fast=True, yes=True
+        )
+        self.assertEqual(output, new_code)
+        self.assertEqual(updates["changes"], [])
+
+    def test_fast_merge_with_repeated_placeholders(self):
+        old_code = OLD_CODE + "\n\n" + OLD_CODE.replace("def f", "def g")
+        new_code = NEW_CODE + "\n\n" + NEW_CODE.replace("def f", "def g")
+        output, updates = merge_code(
+            old_code, new_code, config=Config(cache_enabled=False), fast=True, yes=True
+        )
+        self.assertEqual(output, old_code)
+        self.assertEqual(len(updates["changes"]), 2)
+
+    def test_context_is_only_rendered_for_reverted_segments(self):
+        old_code, new_code = synthetic_pair(2_000)
+        with mock.patch.object(
+            merging,
+            "code_diff_around_segment",
+            wraps=merging.code_diff_around_segment,
+        ) as rendered:
+            output, updates = merge_code(
+                old_code,
+                new_code,
+                config=Config(cache_enabled=False),
+                fast=True,
+                yes=True,
+            )
+        self.assertTrue(updates["changes"])
+        self.assertEqual(rendered.call_count, len(updates["changes"]))
+        self.assertLess(len(updates["changes"]), 100)
+
+    def test_segment_input_renders_on_demand(self):
+        diffs = merging.diff_code(OLD_CODE, NEW_CODE)
+        segment_input = merging.build_inputs(diffs)[1]  # The placeholder
+        self.assertNotIn("_diff", segment_input._fields)
+        self.assertEqual(segment_input.get("_curr_segment"), NEW_CODE.split("\n")[1])
+        self.assertIn("_diff", segment_input)
+        self.assertTrue(dict(segment_input)["_diff"].startswith(" def f():"))
+
+
+class TestPipelinedReview(unittest.TestCase):
+    def _merge(self, config: Config, interactive=False) -> list:
+        """Merge, returning (seconds since the start, sample) of each reviewed diff"""
+        reviewed = []
+        start = time.perf_counter()
+
+        def review(samples, label, default_confidence):
+            for sample in samples:
+                reviewed.append((time.perf_counter() - start, sample))
+            return [
+                {"_id": sample["_id"], label: False, "confidence": default_confidence}
+                for _, sample in reviewed
+            ]
+
+        old_code, new_code = synthetic_pair(300)
+        with mock.patch.object(merging, "labeling", side_effect=review):
+            _, updates = merge_code(
+                old_code, new_code, config=config, interactive=interactive
+            )
+        self.assertEqual(len(updates["labels"]), len(reviewed))
+        return reviewed
+
+    def test_review_starts_before_the_llm_is_done(self):
+        from openai import OpenAI
+
+        with FakeOpenAIServer(latency=0.5) as server:
+            client = OpenAI(api_key="fake", base_url=server.base_url)
+            config = Config(client=client, cache_enabled=False)
+            start = time.perf_counter()
+            reviewed = self._merge(config, interactive=True)
+            elapsed = time.perf_counter() - start
+        self.assertTrue(reviewed)
+        self.assertGreater(elapsed, 0.5)
+        self.assertLess(reviewed[0][0], 0.4)
+
+    def test_same_diffs_as_after_classification(self):
+        from openai import OpenAI
+
+        with FakeOpenAIServer() as server:
+            client = OpenAI(api_key="fake", base_url=server.base_url)
+            config = Config(client=client, cache_enabled=False)
+            for interactive in (False, True):
+                with self.subTest(interactive=interactive):
+                    pipelined = self._merge(config, interactive=interactive)
+                    serial = self._merge(
+                        replace(config, pipelined_review=False),
+                        interactive=interactive,
+                    )
+                    self.assertEqual(
+                        sorted(sample["_id"] for _, sample in pipelined),
+                        sorted(sample["_id"] for _, sample in serial),
+                    )
+
+
+@unittest.skipUnless(is_git_installed(), "git is not installed")
+class TestMergeAll(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        git = ["git", "-c", "user.name=lfg", "-c", "user.email=lfg@example.com"]
+        subprocess.run(git + ["init", "-q"], check=True)
+        for name in ["a.py", "b.py", "c.py"]:
+            Path(name).write_text(OLD_CODE)
+        subprocess.run(git + ["add", "."], check=True)
+        subprocess.run(git + ["commit", "-q", "-m", "init"], check=True)
+        Path("a.py").write_text(NEW_CODE)
+        Path("c.py").write_text(NEW_CODE)
+        subprocess.run(git + ["add", "."], check=True)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_merge_all_in_parallel(self):
+        config = Config(git_installed=True, cache_enabled=False)
+        results = merge_all(config=config, fast=True, yes=True, jobs=2)
+        self.assertEqual(list(results), ["a.py", "c.py"])
+        for file, updates in results.items():
+            self.assertEqual(len(updates["changes"]), 1)
+            self.assertEqual(Path(file).read_text(), OLD_CODE)
+
+    def test_a_file_that_fails_to_parse_does_not_stop_the_others(self):
+        def parse(file_lines):
+            if file_lines[0] == "--- a/a.py":
+                raise ValueError("Multiple old files detected")
+            return parse_git_diff(file_lines)
+
+        config = Config(git_installed=True, cache_enabled=False)
+        for jobs in (1, 2):
+            Path("c.py").write_text(NEW_CODE)
+            with self.subTest(jobs=jobs), mock.patch.object(
+                merging, "parse_git_diff", side_effect=parse
+            ):
+                results = merge_all(config=config, fast=True, yes=True, jobs=jobs)
+            self.assertEqual(results["a.py"], {"error": "Multiple old files detected"})
+            self.assertEqual(len(results["c.py"]["changes"]), 1)
+            self.assertEqual(Path("a.py").read_text(), NEW_CODE)
+            self.assertEqual(Path("c.py").read_text(), OLD_CODE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.bench.fake_openai import FakeOpenAIServer
+from justbuild.codediff.merging import merge, merge_code
+from justbuild.codediff.metrics import Metrics
+from justbuild.config import Config
+
+
+class TestMetrics(unittest.TestCase):
+    def test_stages_counters_and_histograms(self):
+        metrics = Metrics()
+        for _ in range(3):
+            with metrics.stage("diff"):
+                pass
+        metrics.count("llm.requests", 2)
+        for latency in (0.01, 0.2, 3.0):
+            metrics.observe("llm.latency", latency)
+
+        summary = metrics.as_dict()
+        self.assertEqual(summary["stages"]["diff"]["calls"], 3)
+        self.assertEqual(summary["counters"], {"llm.requests": 2})
+        latency = summary["histograms"]["llm.latency"]
+        self.assertEqual((latency["count"], latency["p50"]), (3, 0.2))
+        self.assertEqual(latency["buckets"]["<=0.05"], 1)
+        self.assertEqual(latency["buckets"]["<=5.0"], 1)
+        self.assertEqual(json.loads(json.dumps(summary)), summary)
+
+    def test_iter_stage_times_the_producer(self):
+        metrics = Metrics()
+        self.assertEqual(list(metrics.iter_stage("diff", range(3))), [0, 1, 2])
+        # One span per item, and one for the end of the stream
+        self.assertEqual(metrics.as_dict()["stages"]["diff"]["calls"], 4)
+
+    def test_children_record_in_parent(self):
+        run = Metrics()
+        files = [run.child(f"f{i}.py") for i in range(4)]
+
+        def work(metrics):
+            with metrics.stage("llm"):
+                metrics.count("segments", 5)
+
+        threads = [threading.Thread(target=work, args=(m,)) for m in files]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(run.as_dict()["counters"], {"segments": 20})
+        self.assertEqual(files[0].as_dict()["counters"], {"segments": 5})
+
+        trace = run.chrome_trace()
+        self.assertEqual(len(trace["traceEvents"]), 4)
+        self.assertEqual(
+            {event["args"]["file"] for event in trace["traceEvents"]},
+            {f"f{i}.py" for i in range(4)},
+        )
+        self.assertTrue(all(event["ph"] == "X" for event in trace["traceEvents"]))
+
+
+class TestMergeMetrics(unittest.TestCase):
+    def test_merge_code_reports_stages(self):
+        old_code, new_code = synthetic_pair(200)
+        output, updates = merge_code(
+            old_code, new_code, config=Config(cache_enabled=False), fast=True, yes=True
+        )
+        stages = updates["metrics"]["stages"]
+        for stage in ("diff", "features", "greedy", "merge"):
+            self.assertIn(stage, stages)
+        self.assertNotIn("llm", stages)
+        self.assertGreater(updates["metrics"]["counters"]["segments"], 0)
+
+    def test_merge_reports_llm_usage(self):
+        from openai import OpenAI
+
+        old_code, new_code = synthetic_pair(200)
+        with tempfile.TemporaryDirectory() as tmp:
+            old_file, new_file = Path(tmp) / "old.py", Path(tmp) / "new.py"
+            old_file.write_text(old_code)
+            new_file.write_text(new_code)
+            trace_file = Path(tmp) / "trace.json"
+            with FakeOpenAIServer() as server:
+                config = Config(
+                    client=OpenAI(api_key="fake", base_url=server.base_url),
+                    cache_enabled=False,
+                    diff_backend="python",
+                )
+                metrics = Metrics()
+                updates = merge(
+                    old_file, new_file, config=config, yes=True, metrics=metrics
+                )
+                requests = server.requests
+            metrics.dump(trace_file)
+            trace = json.loads(trace_file.read_text())
+
+        counters = updates["metrics"]["counters"]
+        self.assertEqual(counters["llm.requests"], requests)
+        self.assertGreater(counters["llm.prompt_tokens"], 0)
+        self.assertEqual(counters["llm.cache_misses"], 0)  # The cache is disabled
+        self.assertEqual(
+            updates["metrics"]["histograms"]["llm.latency"]["count"], requests
+        )
+        for stage in ("diff", "features", "llm", "write"):
+            self.assertIn(stage, updates["metrics"]["stages"])
+        self.assertEqual(trace["otherData"], updates["metrics"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.codediff.diff_engine import diff_code
+from justbuild.codediff.features import build_feature_table, build_features
+from justbuild.codediff.merging import build_inputs
+from justbuild.codediff.models import GreedyModel
+
+
+class TestGreedyModel(unittest.TestCase):
+    def test_predict_batch_matches_predict(self):
+        diffs = diff_code(*synthetic_pair(2_000))
+        build_features(diffs)
+        predictions = GreedyModel().predict(build_inputs(diffs))
+        columns = GreedyModel().predict_batch(build_feature_table(diffs))
+
+        self.assertTrue(any(columns["is_code_omission"]))
+        self.assertEqual(
+            columns["is_code_omission"], [p["is_code_omission"] for p in predictions]
+        )
+        self.assertEqual(columns["confidence"], [p["confidence"] for p in predictions])
+
+    def test_predict_and_predict_batch_agree_on_a_mixed_corpus(self):
+        old = (
+            "def f():\n"
+            + "".join(f"    x{i} = {i}\n" for i in range(8))
+            + "    return 1\n"
+        )
+        pairs = [synthetic_pair(300, seed=seed) for seed in range(4)] + [
+            (old, old.replace("    x1 = 1\n", "")),  # Deletion only
+            (old, old.replace("    x1 = 1\n", "    x1 = 1\n    y = 2\n")),  # Insertion
+            (old, old.replace("    x1 = 1\n    x2 = 2\n", "    # ...\n")),  # Short
+            (old, old.replace("    x1 = 1\n", "    x1 = 10\n    x9 = 9\n    z = 0\n")),
+            (old, "def f():\n    ...\n    return 1\n"),  # Ellipsis, no comment
+            (old, "def f():\n    pass\n    return 1\n"),  # Neither
+        ]
+        confidences = set()
+        for old_code, new_code in pairs:
+            diffs = diff_code(old_code, new_code)
+            build_features(diffs)
+            predictions = GreedyModel().predict(build_inputs(diffs))
+            columns = GreedyModel().predict_batch(build_feature_table(diffs))
+            for row, prediction in enumerate(predictions):
+                with self.subTest(new_code=new_code[:40], row=row):
+                    self.assertEqual(
+                        columns["is_code_omission"][row],
+                        prediction["is_code_omission"],
+                    )
+                    self.assertEqual(
+                        columns["confidence"][row], prediction["confidence"]
+                    )
+                confidences.add(round(prediction["confidence"], 2))
+        # Every branch of the rule is covered
+        self.assertEqual(confidences, {0.3, 0.9, 0.95})
+
+
+if __name__ == "__main__":
+    unittest.main()
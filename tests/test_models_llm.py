@@ -0,0 +1,123 @@
+import json
+import math
+import re
+import unittest
+from types import SimpleNamespace
+
+from justbuild.codediff.models_llm import BATCH_SYSTEM_PROMPT, LLMModel
+from justbuild.config import Config
+
+
+def _completion(content):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message, finish_reason="stop")]
+    )
+
+
+class BatchingClient:
+    """Stands in for `OpenAI`: a diff is a placeholder when it contains '...'"""
+
+    def __init__(self, broken_json=False):
+        self.broken_json = broken_json
+        self.batch_calls = 0
+        self.single_calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        user_message = messages[-1]["content"]
+        if messages[0]["content"] != BATCH_SYSTEM_PROMPT:
+            self.single_calls += 1
+            return _completion("yes" if "..." in user_message else "no")
+
+        self.batch_calls += 1
+        if self.broken_json:
+            return _completion("Sure! Here are the answers: 1 yes, 2 no")
+        diffs = re.split(r"^Diff (\d+):$", user_message, flags=re.MULTILINE)[1:]
+        answers = {
+            number: "yes" if "..." in diff else "no"
+            for number, diff in zip(diffs[::2], diffs[1::2])
+        }
+        return _completion(json.dumps(answers))
+
+
+def _features(n):
+    return [
+        {
+            "_id": i,
+            "_diff": f"-x{i} = {i}\n+" + ("# ..." if i % 2 else f"x{i} = 0"),
+            "_curr_segment": "# ..." if i % 2 else f"x{i} = 0",
+        }
+        for i in range(n)
+    ]
+
+
+class TestBatchedLLMModel(unittest.TestCase):
+    def test_batches_respect_size_and_budget(self):
+        config = Config(llm_batching=True, llm_max_batch_size=4, cache_enabled=False)
+        model = LLMModel(config=config)
+        self.assertEqual([len(b) for b in model._batches(_features(10))], [4, 4, 2])
+
+        config.llm_batch_token_budget = 1
+        self.assertEqual([len(b) for b in model._batches(_features(3))], [1, 1, 1])
+
+    def test_batched_predictions(self):
+        client = BatchingClient()
+        config = Config(client=client, llm_batching=True, cache_enabled=False)
+        predictions = LLMModel(config=config).predict(_features(6), code_diffs=None)
+        by_id = {p["_id"]: p["is_code_omission"] for p in predictions}
+        self.assertEqual(by_id, {i: bool(i % 2) for i in range(6)})
+        self.assertEqual((client.batch_calls, client.single_calls), (1, 0))
+
+    def test_unparseable_batch_falls_back_to_single_requests(self):
+        client = BatchingClient(broken_json=True)
+        config = Config(client=client, llm_batching=True, cache_enabled=False)
+        predictions = LLMModel(config=config).predict(_features(4), code_diffs=None)
+        by_id = {p["_id"]: p["is_code_omission"] for p in predictions}
+        self.assertEqual(by_id, {i: bool(i % 2) for i in range(4)})
+        self.assertEqual((client.batch_calls, client.single_calls), (1, 4))
+
+
+class TestAnswerMode(unittest.TestCase):
+    def setUp(self):
+        self.feature = {"_id": 0, "_diff": "-a\n+# ...", "_curr_segment": "# ..."}
+
+    def test_single_token_request(self):
+        model = LLMModel(config=Config(cache_enabled=False))
+        kwargs = model._completion_kwargs(model._user_message(self.feature))
+        self.assertEqual(kwargs["max_tokens"], 1)
+        self.assertTrue(kwargs["logprobs"])
+
+        model.config.llm_verbose = True
+        kwargs = model._completion_kwargs(model._user_message(self.feature))
+        self.assertEqual(kwargs["max_tokens"], 1000)
+        self.assertNotIn("logprobs", kwargs)
+
+    def test_confidence_from_logprobs(self):
+        top_logprobs = [
+            SimpleNamespace(token="Yes", logprob=math.log(0.6)),
+            SimpleNamespace(token=" yes", logprob=math.log(0.2)),
+            SimpleNamespace(token="No", logprob=math.log(0.2)),
+        ]
+        logprobs = SimpleNamespace(
+            content=[SimpleNamespace(token="Yes", top_logprobs=top_logprobs)]
+        )
+        choice = SimpleNamespace(
+            message=SimpleNamespace(content="Yes"),
+            finish_reason="length",
+            logprobs=logprobs,
+        )
+        model = LLMModel(config=Config(cache_enabled=False))
+        verdict = model._parse_completion(SimpleNamespace(choices=[choice]))
+        self.assertTrue(verdict["is_code_omission"])
+        self.assertAlmostEqual(verdict["confidence"], 0.8)
+
+    def test_answer_without_logprobs(self):
+        model = LLMModel(config=Config(cache_enabled=False))
+        verdict = model._parse_completion(_completion("no"))
+        self.assertFalse(verdict["is_code_omission"])
+        self.assertEqual(verdict["confidence"], 0.95)
+
+
+if __name__ == "__main__":
+    unittest.main()
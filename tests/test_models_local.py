@@ -0,0 +1,154 @@
+import tempfile
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from unittest import mock
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.bench.fake_openai import FakeOpenAIServer
+from justbuild.codediff.diff_engine import diff_code
+from justbuild.codediff.features import build_feature_table
+from justbuild.codediff.merging import build_inputs, merge_code
+from justbuild.codediff.models import GreedyModel
+from justbuild.codediff.models_local import (
+    LabelStore,
+    LocalModel,
+    get_local_model,
+    vectorize,
+)
+from justbuild.config import Config
+
+
+def _labeled_segments(seeds=range(8)):
+    """Features of the segments of synthetic diffs, labeled by the Greedy model"""
+    features, labels = [], []
+    for seed in seeds:
+        diffs = diff_code(*synthetic_pair(300, seed=seed))
+        table = build_feature_table(diffs)
+        inputs = build_inputs(diffs)
+        predictions = GreedyModel().predict_batch(table)
+        for i, label in enumerate(predictions["is_code_omission"]):
+            features.append(
+                {**table.row(i), "_curr_segment": inputs[i]["_curr_segment"]}
+            )
+            labels.append(label)
+    return features, labels
+
+
+class TestLocalModel(unittest.TestCase):
+    def test_vectorize(self):
+        feature = {
+            "change_sequence_type": "replaced_previous",
+            "segment_size": 1,
+            "prev_segment_size": 8,
+            "has_comment": True,
+            "_curr_segment": "    # ... (rest of the previous code remains the same)",
+        }
+        vector = vectorize(feature)
+        self.assertEqual(vector, vectorize(dict(feature)))
+        self.assertEqual(vector[0], 1.0)
+        # Indentation and case do not change the n-grams
+        self.assertEqual(
+            vector,
+            vectorize({**feature, "_curr_segment": feature["_curr_segment"].upper()}),
+        )
+
+    def test_untrained_until_enough_labels(self):
+        features, labels = _labeled_segments(seeds=[0])
+        model = LocalModel(min_labels=len(labels) + 1)
+        model.fit(features, labels)
+        self.assertFalse(model.trained)
+        model.fit(features, [False] * len(labels))  # A single class
+        self.assertFalse(model.trained)
+
+    def test_fit_and_predict(self):
+        features, labels = _labeled_segments()
+        model = LocalModel()
+        model.fit(features, labels)
+        self.assertTrue(model.trained)
+
+        test_features, test_labels = _labeled_segments(seeds=[100, 101])
+        predictions = model.predict(test_features)
+        accuracy = sum(
+            p["is_code_omission"] == label for p, label in zip(predictions, test_labels)
+        ) / len(test_labels)
+        self.assertGreater(accuracy, 0.9)
+
+    def test_learn_persists_labels_and_weights(self):
+        features, labels = _labeled_segments()
+        with tempfile.TemporaryDirectory() as tmp:
+            store = LabelStore(Path(tmp) / "labels.sqlite3")
+            model = LocalModel(store=store, path=Path(tmp) / "model.json")
+            model.learn(features, labels)
+            model.learn(features[:5], labels[:5])  # Known segments are replaced
+            self.assertEqual(len(store), len({str(f) for f in features}))
+
+            reloaded = LocalModel()
+            reloaded.load(Path(tmp) / "model.json")
+            self.assertEqual(
+                reloaded.predict_proba(features[0]), model.predict_proba(features[0])
+            )
+
+    def test_learn_updates_with_the_new_labels_only(self):
+        features, labels = _labeled_segments()
+        new_features, new_labels = _labeled_segments(seeds=[50])
+        flipped = [not label for label in new_labels]
+        with tempfile.TemporaryDirectory() as tmp:
+            model = LocalModel(store=LabelStore(Path(tmp) / "labels.sqlite3"))
+            model.learn(features, labels)
+            self.assertTrue(model.trained)
+            before = [model.predict_proba(f) for f in new_features]
+
+            with mock.patch.object(model, "fit") as fit:
+                model.learn(new_features, flipped)
+            fit.assert_not_called()
+            after = [model.predict_proba(f) for f in new_features]
+            # Every prediction moved towards its new label
+            for p_before, p_after, label in zip(before, after, flipped):
+                self.assertEqual(p_after > p_before, label)
+
+    def test_learn_with_a_single_class_in_the_store(self):
+        features, labels = _labeled_segments()
+        with tempfile.TemporaryDirectory() as tmp:
+            labels_path = Path(tmp) / "labels.sqlite3"
+            model = LocalModel(store=LabelStore(labels_path), path=Path(tmp) / "m.json")
+            model.learn(features, labels)
+            model.store.clear()  # The saved weights outlive their labels
+
+            reloaded = LocalModel(store=LabelStore(labels_path))
+            reloaded.load(Path(tmp) / "m.json")
+            before = reloaded.predict_proba(features[0])
+            reloaded.learn(features[:1], [not labels[0]])
+            self.assertTrue(reloaded.trained)
+            self.assertNotEqual(reloaded.predict_proba(features[0]), before)
+
+    def test_middle_tier_skips_the_llm(self):
+        from openai import OpenAI
+
+        features, labels = _labeled_segments()
+        old_code, new_code = synthetic_pair(300, seed=200)
+        with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer() as server:
+            config = Config(
+                client=OpenAI(api_key="fake", base_url=server.base_url),
+                cache_path=str(Path(tmp) / "llm.sqlite3"),
+                labels_path=str(Path(tmp) / "labels.sqlite3"),
+            )
+            merge_code(old_code, new_code, config=config, yes=True)
+            llm_requests = server.requests
+            self.assertGreater(llm_requests, 0)
+
+            get_local_model(config).learn(features, labels)
+            # Nothing cached or remembered from the first merge
+            config = replace(
+                config,
+                cache_path=str(Path(tmp) / "llm2.sqlite3"),
+                hunk_memo_path=str(Path(tmp) / "hunks2.sqlite3"),
+            )
+            _, updates = merge_code(old_code, new_code, config=config, yes=True)
+            counters = updates["metrics"]["counters"]
+            self.assertGreater(counters["local.segments"], 0)
+            self.assertLess(server.requests - llm_requests, llm_requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from typer.testing import CliRunner
+
+from justbuild import lfg_cli
+from justbuild.codediff import merge_pasted
+from justbuild.codediff.git_wrappers import is_git_installed
+from justbuild.codediff.paste import parse_code_blocks
+from justbuild.config import Config
+
+OLD_CODE = (
+    "def f():\n" + "".join(f"    x{i} = {i}\n" for i in range(8)) + "    return 1\n"
+)
+NEW_CODE = (
+    "def f():\n    # ... (rest of the previous code remains the same)\n    return 1\n"
+)
+
+G_CODE = "\n\ndef g():\n    return 2\n"
+
+ANSWER = f"""Here are the updated files.
+
+### `a.py`
+```python
+{NEW_CODE}```
+
+```python pkg/b.py
+{NEW_CODE}{G_CODE}```
+
+Then run:
+```bash
+python -m pytest
+```
+
+```python
+# pkg/c.py
+C = 3
+```
+"""
+
+
+class TestParseCodeBlocks(unittest.TestCase):
+    def test_paths_of_the_blocks(self):
+        files = parse_code_blocks(ANSWER)
+        self.assertEqual([path for path, _ in files], ["a.py", "pkg/b.py", "pkg/c.py"])
+        self.assertEqual(files[0][1], NEW_CODE)
+        self.assertEqual(files[2][1], "C = 3\n")  # Without the path comment
+
+    def test_labels(self):
+        for label in ["**a.py**", "File: `a.py`", "a.py:", "## a.py"]:
+            with self.subTest(label):
+                self.assertEqual(
+                    parse_code_blocks(f"{label}\n```\nA = 1\n```\n"),
+                    [("a.py", "A = 1\n")],
+                )
+        for info in ["python a.py", 'python title="a.py"', "a.py"]:
+            with self.subTest(info):
+                self.assertEqual(
+                    parse_code_blocks(f"```{info}\nA = 1\n```\n"), [("a.py", "A = 1\n")]
+                )
+
+    def test_unlabeled_blocks_are_skipped(self):
+        text = "Then update `setup.py` and run:\n```bash\npip install .\n```\n"
+        self.assertEqual(parse_code_blocks(text), [])
+        self.assertEqual(parse_code_blocks("```python3.11\nprint()\n```\n"), [])
+
+    def test_nested_fences_and_last_revision(self):
+        text = (
+            "````markdown README.md\n# Title\n```bash\nls\n```\n````\n"
+            "```a.py\nA = 1\n```\n```a.py\nA = 2\n```\n"
+        )
+        self.assertEqual(
+            parse_code_blocks(text),
+            [("README.md", "# Title\n```bash\nls\n```\n"), ("a.py", "A = 2\n")],
+        )
+
+
+class TestMergePasted(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "pkg").mkdir()
+        (self.root / "a.py").write_text(OLD_CODE)
+        (self.root / "pkg" / "b.py").write_text(OLD_CODE)
+        self.config = Config(cache_enabled=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_merges_and_creates_files(self):
+        results = merge_pasted(
+            parse_code_blocks(ANSWER),
+            root=self.root,
+            config=self.config,
+            fast=True,
+            yes=True,
+        )
+        self.assertEqual(list(results), ["a.py", "pkg/b.py", "pkg/c.py"])
+        self.assertEqual(len(results["a.py"]["changes"]), 1)
+        self.assertTrue(results["pkg/c.py"]["created"])
+        self.assertTrue(all(updates["written"] for updates in results.values()))
+        for updates in results.values():
+            self.assertGreaterEqual(updates["seconds"], 0)
+
+        self.assertEqual((self.root / "a.py").read_text(), OLD_CODE)
+        self.assertEqual(
+            (self.root / "pkg" / "b.py").read_text(),
+            OLD_CODE + G_CODE,
+        )
+        self.assertEqual((self.root / "pkg" / "c.py").read_text(), "C = 3\n")
+        self.assertEqual(
+            sorted(p.name for p in self.root.rglob("*")),
+            ["a.py", "b.py", "c.py", "pkg"],
+        )
+
+    @unittest.skipUnless(is_git_installed(), "git is not installed")
+    def test_diff_backends(self):
+        changes = {}
+        for backend in ("git", "python"):
+            results = merge_pasted(
+                parse_code_blocks(ANSWER),
+                root=self.root,
+                config=self.config,
+                fast=True,
+                yes=True,
+                dry_run=True,
+                diff_backend=backend,
+            )
+            changes[backend] = {
+                path: updates["changes"] for path, updates in results.items()
+            }
+        self.assertEqual(changes["git"], changes["python"])
+        self.assertEqual(len(changes["git"]["a.py"]), 1)
+
+        results = merge_pasted(
+            parse_code_blocks(ANSWER),
+            root=self.root,
+            config=self.config,
+            fast=True,
+            yes=True,
+            diff_backend="svn",
+        )
+        self.assertIn("Unknown diff backend", results["a.py"]["error"])
+        self.assertEqual((self.root / "a.py").read_text(), OLD_CODE)
+
+    def test_nothing_is_written_on_error(self):
+        files = parse_code_blocks(ANSWER) + [("../outside.py", "X = 1\n")]
+        results = merge_pasted(
+            files, root=self.root, config=self.config, fast=True, yes=True
+        )
+        self.assertIn("outside", results["../outside.py"]["error"])
+        self.assertFalse(results["a.py"]["written"])
+        self.assertEqual((self.root / "a.py").read_text(), OLD_CODE)
+        self.assertFalse((self.root / "pkg" / "c.py").exists())
+
+    def test_cli(self):
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        try:
+            with mock.patch("pyperclip.paste", return_value=ANSWER):
+                result = CliRunner().invoke(
+                    lfg_cli.app, ["paste", "--fast", "--yes", "--no-cache"]
+                )
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("pkg/c.py", result.output)
+        self.assertEqual((self.root / "a.py").read_text(), OLD_CODE)
+
+
+if __name__ == "__main__":
+    unittest.main()
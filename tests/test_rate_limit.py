@@ -0,0 +1,77 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import openai
+
+from justbuild.codediff.models_llm import LLMModel
+from justbuild.codediff.rate_limit import TokenBucket, backoff_delay
+from justbuild.config import Config
+
+
+class FlakyAsyncClient:
+    """Stands in for `AsyncOpenAI`: answers 429 `failures` times, then 'yes'"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat")
+            response = httpx.Response(429, request=request)
+            raise openai.RateLimitError("rate limited", response=response, body=None)
+        message = SimpleNamespace(content="yes")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")]
+        )
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_backoff_delay_is_jittered_and_capped(self):
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base=1.0, maximum=8.0)
+            cap = min(8.0, 2**attempt)
+            self.assertGreaterEqual(delay, cap / 2)
+            self.assertLessEqual(delay, cap)
+
+    def test_token_bucket_waits_for_refill(self):
+        async def take_twice():
+            bucket = TokenBucket(rate=10, period=1.0)
+            await bucket.take(10)
+            start = time.monotonic()
+            await bucket.take(2)
+            return time.monotonic() - start
+
+        self.assertGreater(asyncio.run(take_twice()), 0.15)
+
+    def test_async_predict_retries_rate_limits(self):
+        client = FlakyAsyncClient(failures=2)
+        config = Config(async_client=client, cache_enabled=False)
+        features = [
+            {"_id": i, "_diff": f"-a{i}\n+# ...", "_curr_segment": "# ..."}
+            for i in range(3)
+        ]
+        with mock.patch("justbuild.codediff.models_llm.backoff_delay", return_value=0):
+            predictions = LLMModel(config=config).predict(features, code_diffs=None)
+        self.assertEqual(sorted(p["_id"] for p in predictions), [0, 1, 2])
+        self.assertTrue(all(p["is_code_omission"] for p in predictions))
+        self.assertEqual(client.calls, 5)
+
+    def test_async_predict_gives_up_after_max_retries(self):
+        client = FlakyAsyncClient(failures=10)
+        config = Config(async_client=client, cache_enabled=False, max_retries=1)
+        feature = {"_id": 0, "_diff": "-a\n+# ...", "_curr_segment": "# ..."}
+        with mock.patch("justbuild.codediff.models_llm.backoff_delay", return_value=0):
+            with self.assertRaises(openai.RateLimitError):
+                LLMModel(config=config).predict([feature], code_diffs=None)
+        self.assertEqual(client.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
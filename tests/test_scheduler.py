@@ -0,0 +1,137 @@
+import tempfile
+import time
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+from justbuild.bench.corpus import synthetic_pair
+from justbuild.bench.fake_openai import FakeOpenAIServer
+from justbuild.codediff.diff_engine import diff_code
+from justbuild.codediff.features import build_feature_table
+from justbuild.codediff.merging import build_inputs, merge_code
+from justbuild.codediff.models import GreedyModel
+from justbuild.codediff.scheduler import expected_value, rank_segments
+from justbuild.config import Config
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        from openai import OpenAI
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = FakeOpenAIServer().__enter__()
+        self.config = self._config(
+            client=OpenAI(api_key="fake", base_url=self.server.base_url)
+        )
+        self.old_code, self.new_code = synthetic_pair(300)
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self.tmp.cleanup()
+
+    def _config(self, config=None, **kwargs) -> Config:
+        """Fresh LLM cache, hunk memo and labels for every config"""
+        tmp = Path(tempfile.mkdtemp(dir=self.tmp.name))
+        paths = dict(
+            cache_path=str(tmp / "llm.sqlite3"),
+            hunk_memo_path=str(tmp / "hunks.sqlite3"),
+            labels_path=str(tmp / "labels.sqlite3"),
+        )
+        if config is None:
+            return Config(**paths, **kwargs)
+        return replace(config, **paths, **kwargs)
+
+    def _merge(self, config: Config) -> dict:
+        _, updates = merge_code(self.old_code, self.new_code, config=config, yes=True)
+        return updates
+
+    def test_expected_value(self):
+        self.assertGreater(expected_value(0.3, 10), expected_value(0.3, 1))
+        self.assertGreater(expected_value(0.3, 1), expected_value(0.9, 1))
+        self.assertEqual(expected_value(0.9, 0), expected_value(0.9, 1))
+
+    def test_rank_segments(self):
+        diffs = diff_code(self.old_code, self.new_code)
+        table = build_feature_table(diffs)
+        predictions = GreedyModel().predict_batch(table)
+        outputs = {
+            i: {"naive": {"confidence": confidence}}
+            for i, confidence in enumerate(predictions["confidence"])
+        }
+        ranked = rank_segments(build_inputs(diffs), outputs, table)
+
+        values = [
+            expected_value(
+                outputs[s["_id"]]["naive"]["confidence"],
+                max(table.segment_size[s["_id"]], table.prev_segment_size[s["_id"]]),
+            )
+            for s in ranked
+        ]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+    def test_unlimited_by_default(self):
+        updates = self._merge(self.config)
+        counters = updates["metrics"]["counters"]
+        self.assertEqual(counters["llm.deferred"], 0)
+        self.assertEqual(self.server.requests, counters["llm.segments"])
+        self.assertFalse(any(change["deferred"] for change in updates["changes"]))
+
+    def test_max_llm_calls(self):
+        candidates = self._merge(self.config)["metrics"]["counters"]["llm.segments"]
+        self.assertGreater(candidates, 2)
+        requests = self.server.requests
+
+        updates = self._merge(self._config(self.config, llm_max_calls=2))
+        counters = updates["metrics"]["counters"]
+        self.assertEqual(self.server.requests - requests, 2)
+        self.assertEqual(counters["llm.deferred"], candidates - 2)
+        self.assertTrue(any(change["deferred"] for change in updates["changes"]))
+
+    def test_max_cost_spares_cached_verdicts(self):
+        config = self._config(self.config, llm_max_cost=0.0)
+        updates = self._merge(config)
+        self.assertEqual(self.server.requests, 0)
+        deferred = updates["metrics"]["counters"]["llm.deferred"]
+        self.assertGreater(deferred, 0)
+
+        # Once cached, the verdicts are free
+        self._merge(replace(config, llm_max_cost=None))
+        requests = self.server.requests
+        memo_path = str(Path(self.tmp.name) / "other_hunks.sqlite3")
+        updates = self._merge(replace(config, hunk_memo_path=memo_path))
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual(updates["metrics"]["counters"]["llm.deferred"], 0)
+
+    def test_deferred_hunks_are_not_remembered(self):
+        config = self._config(self.config, llm_max_calls=0)
+        self._merge(config)
+        self.assertEqual(self.server.requests, 0)
+        updates = self._merge(replace(config, llm_max_calls=None))
+        self.assertGreater(self.server.requests, 0)
+        self.assertLess(
+            updates["hunks"]["reused"], updates["metrics"]["counters"]["hunks"]
+        )
+
+    def test_deadline(self):
+        from openai import AsyncOpenAI, OpenAI
+
+        with FakeOpenAIServer(latency=2.0) as server:
+            clients = {
+                "client": OpenAI(api_key="fake", base_url=server.base_url),
+                "async_client": AsyncOpenAI(api_key="fake", base_url=server.base_url),
+            }
+            for name, client in clients.items():
+                with self.subTest(name):
+                    config = self._config(
+                        self.config, **{name: client}, llm_deadline=0.2
+                    )
+                    start = time.perf_counter()
+                    updates = self._merge(config)
+                    self.assertLess(time.perf_counter() - start, 1.5)
+                    counters = updates["metrics"]["counters"]
+                    self.assertEqual(counters["llm.deadline_exceeded"], 1)
+                    self.assertEqual(counters["llm.deferred"], counters["llm.segments"])
+
+
+if __name__ == "__main__":
+    unittest.main()
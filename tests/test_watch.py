@@ -0,0 +1,212 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from justbuild.codediff.git_wrappers import is_git_installed, list_files
+from justbuild.codediff.hunk_memo import HunkMemo, get_hunk_memo
+from justbuild.codediff.merging import merge_code
+from justbuild.codediff.watch import Watcher
+from justbuild.config import Config
+
+OLD_CODE = (
+    "def f():\n" + "".join(f"    x{i} = {i}\n" for i in range(8)) + "    return 1\n"
+)
+NEW_CODE = (
+    "def f():\n    # ... (rest of the previous code remains the same)\n    return 1\n"
+)
+
+
+class TestHunkMemo(unittest.TestCase):
+    def test_known_hunks_are_reused(self):
+        memo = HunkMemo()
+        config = Config(cache_enabled=False)
+        filler = "".join(f"y{i} = {i}\n" for i in range(10))
+        old_code = "import os\n" + filler + OLD_CODE
+        first, updates = merge_code(
+            old_code,
+            "import os\n" + filler + NEW_CODE,
+            config=config,
+            fast=True,
+            yes=True,
+            memo=memo,
+        )
+        self.assertEqual(updates["hunks"], {"reused": 0, "classified": 1})
+
+        # Only the new hunk at the top is classified, the placeholder is known
+        second, updates = merge_code(
+            old_code,
+            "import sys\n" + filler + NEW_CODE,
+            config=config,
+            fast=True,
+            yes=True,
+            memo=memo,
+        )
+        self.assertEqual(updates["hunks"], {"reused": 1, "classified": 1})
+        self.assertEqual(second, first.replace("import os", "import sys"))
+        self.assertEqual(len(updates["changes"]), 1)
+
+    def test_human_labels_persist_across_runs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = Config(
+                hunk_memo_path=str(Path(tmp) / "hunks.sqlite3"),
+                labels_path=str(Path(tmp) / "labels.sqlite3"),
+            )
+
+            def reject(inputs, label, default_confidence):
+                return [
+                    {"_id": row["_id"], "is_code_omission": False, "confidence": 1.0}
+                    for row in inputs
+                ]
+
+            with mock.patch("justbuild.codediff.merging.labeling", side_effect=reject):
+                output, updates = merge_code(
+                    OLD_CODE, NEW_CODE, config=config, fast=True
+                )
+            self.assertEqual(output, NEW_CODE)
+            self.assertEqual(updates["hunks"], {"reused": 0, "classified": 1})
+
+            # A later run (a new memo on the same file) keeps the human's verdict
+            memo = get_hunk_memo(config)
+            with mock.patch("justbuild.codediff.merging.labeling", return_value=[]):
+                output, updates = merge_code(
+                    OLD_CODE, NEW_CODE, config=config, fast=True, memo=memo
+                )
+            self.assertEqual(output, NEW_CODE)
+            self.assertEqual(updates["hunks"], {"reused": 1, "classified": 0})
+            self.assertTrue((Path(tmp) / "hunks.sqlite3").exists())
+
+    def test_unattended_verdicts_are_reviewed_when_interactive(self):
+        memo = HunkMemo()
+        config = Config(cache_enabled=False)
+        merge_code(OLD_CODE, NEW_CODE, config=config, fast=True, yes=True, memo=memo)
+        reviewed = []
+
+        def reject(inputs, label, default_confidence):
+            reviewed[:] = list(inputs)
+            return [
+                {"_id": row["_id"], "is_code_omission": False, "confidence": 1.0}
+                for row in reviewed
+            ]
+
+        for reused in (0, 1):  # Once the human went through it, the hunk is reused
+            with mock.patch("justbuild.codediff.merging.labeling", side_effect=reject):
+                output, updates = merge_code(
+                    OLD_CODE,
+                    NEW_CODE,
+                    config=config,
+                    fast=True,
+                    interactive=True,
+                    memo=memo,
+                )
+            self.assertEqual(updates["hunks"]["reused"], reused)
+            self.assertEqual(len(reviewed), 1 - reused)
+            self.assertEqual(output, NEW_CODE)
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = Path(self.tmp.name) / "f.py"
+        self.file.write_text(OLD_CODE)
+        self.merges = []
+        self.watcher = Watcher(
+            [Path(self.tmp.name)],
+            config=Config(cache_enabled=False),
+            fast=True,
+            debounce=0.5,
+            on_merge=lambda file, updates: self.merges.append(updates),
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_saved_placeholders_are_reverted(self):
+        self.file.write_text(NEW_CODE)
+        self.assertEqual(self.watcher.poll(now=100.0), {})  # Still debouncing
+        results = self.watcher.poll(now=101.0)
+        self.assertEqual(len(results[self.file]["changes"]), 1)
+        self.assertEqual(self.file.read_text(), OLD_CODE)
+
+        # Our own write does not trigger another merge
+        self.assertEqual(self.watcher.poll(now=102.0), {})
+
+        # Pasting the same placeholder again reuses the hunk's verdict
+        self.file.write_text(NEW_CODE)
+        self.watcher.poll(now=103.0)
+        results = self.watcher.poll(now=104.0)
+        self.assertEqual(results[self.file]["hunks"]["reused"], 1)
+        self.assertEqual(self.file.read_text(), OLD_CODE)
+        self.assertEqual(len(self.merges), 2)
+
+    def test_new_files_become_baselines(self):
+        other = Path(self.tmp.name) / "g.py"
+        other.write_text(NEW_CODE)
+        self.watcher.poll(now=100.0)
+        self.assertEqual(self.watcher.poll(now=101.0), {})
+        self.assertEqual(other.read_text(), NEW_CODE)
+
+
+@unittest.skipUnless(is_git_installed(), "git is not installed")
+class TestGitWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        git = ["git", "-c", "user.name=lfg", "-c", "user.email=lfg@example.com"]
+        subprocess.run(git + ["init", "-q", self.tmp.name], check=True)
+        (self.root / ".gitignore").write_text("build/\n")
+        (self.root / "build").mkdir()
+        (self.root / "build" / "out.py").write_text(OLD_CODE)
+        (self.root / "a.py").write_text(OLD_CODE)
+        (self.root / "b.py").write_text(OLD_CODE)
+        subprocess.run(git + ["-C", self.tmp.name, "add", "."], check=True)
+        subprocess.run(git + ["-C", self.tmp.name, "commit", "-qm", "init"], check=True)
+        (self.root / "b.py").write_text(OLD_CODE + "\nB = 1\n")  # Not committed
+        self.watcher = Watcher(
+            [self.root], config=Config(cache_enabled=False), fast=True, debounce=0.5
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_the_files_git_sees_are_watched(self):
+        self.assertEqual(
+            sorted(file.name for file in self.watcher.signatures),
+            [".gitignore", "a.py", "b.py"],
+        )
+        # Unmodified tracked files are not read, git has their last version
+        self.assertEqual(sorted(file.name for file in self.watcher.snapshots), ["b.py"])
+
+    def test_index_version_is_the_baseline(self):
+        (self.root / "a.py").write_text(NEW_CODE)
+        self.watcher.poll(now=100.0)
+        results = self.watcher.poll(now=101.0)
+        self.assertEqual(len(results[self.root / "a.py"]["changes"]), 1)
+        self.assertEqual((self.root / "a.py").read_text(), OLD_CODE)
+
+    def test_git_lists_the_files_only_when_the_tree_changed(self):
+        with mock.patch(
+            "justbuild.codediff.watch.list_files", wraps=list_files
+        ) as listed:
+            for now in range(100, 110):
+                self.watcher.poll(now=float(now))
+            self.assertEqual(listed.call_count, 0)
+
+            # A new file changes its directory (moved forward in case the file
+            # system's timestamps are too coarse to tell)
+            new_file = self.root / "c.py"
+            new_file.write_text(OLD_CODE)
+            stat = self.root.stat()
+            os.utime(self.root, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.watcher.poll(now=110.0)
+            self.assertEqual(listed.call_count, 3)
+            self.assertIn(new_file, self.watcher.signatures)
+
+            self.watcher.poll(now=111.0)
+            self.assertEqual(listed.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()